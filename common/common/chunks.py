@@ -0,0 +1,71 @@
+"""
+Splitting large submissions into paragraph-range chunks.
+
+When chunking is enabled, the paragraphs service publishes one work item per
+chunk to the vocabulary and summaries queues, instead of relying on the S3
+notification for the whole paragraphs file. Work items look like S3 event
+records (so `S3Upload` downloads the paragraphs file as usual) with an extra
+`chunk` entry saying which paragraphs to process.
+"""
+import json
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+from common.sqs_client import QueueClient
+
+CHUNK_EVENT_NAME = 'ParagraphChunk'
+
+
+@dataclass
+class ParagraphChunk:
+    """Paragraphs [start, end) of a submission; chunk `index` of `count`."""
+    index: int
+    count: int
+    start: int
+    end: int
+
+    @staticmethod
+    def from_record(record: Dict[str, Any]) -> Optional['ParagraphChunk']:
+        chunk = record.get('chunk')
+        if not chunk:
+            return None
+        return ParagraphChunk(
+            index=int(chunk['index']),
+            count=int(chunk['count']),
+            start=int(chunk['start']),
+            end=int(chunk['end']),
+        )
+
+
+def plan_chunks(paragraph_count: int, chunk_size: int) -> List[ParagraphChunk]:
+    """
+    Split paragraphs [0, paragraph_count) into chunks of at most chunk_size paragraphs.
+
+    An empty document still gets one (empty) chunk, so that every stage gets to mark it done.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"Chunk size must be positive, got {chunk_size}")
+    starts = list(range(0, paragraph_count, chunk_size)) or [0]
+    return [
+        ParagraphChunk(index=i, count=len(starts), start=start, end=min(start + chunk_size, paragraph_count))
+        for i, start in enumerate(starts)
+    ]
+
+
+def chunk_record(bucket: str, key: str, chunk: ParagraphChunk) -> Dict[str, Any]:
+    """Build the SQS record for one chunk of the paragraphs file at bucket/key."""
+    return {
+        'eventName': CHUNK_EVENT_NAME,
+        's3': {
+            'bucket': {'name': bucket},
+            'object': {'key': key},
+        },
+        'chunk': asdict(chunk),
+    }
+
+
+def publish_chunks(queue_clients: List[QueueClient], bucket: str, key: str, chunks: List[ParagraphChunk]) -> None:
+    """Send one message per chunk to each of the given queues."""
+    bodies = [json.dumps({'Records': [chunk_record(bucket, key, chunk)]}) for chunk in chunks]
+    for queue_client in queue_clients:
+        queue_client.send_messages(bodies)
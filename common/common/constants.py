@@ -2,6 +2,10 @@ USERS_TABLE = "history_learning_users"
 SUBMISSIONS_TABLE = "history_learning_submissions"
 VOCABULARY_TABLE = "history_learning_vocabulary"
 SUMMARIES_TABLE = "history_learning_summaries"
+SUMMARY_CACHE_TABLE = "history_learning_summary_cache"
+RATE_LIMIT_TABLE = "history_learning_rate_limits"
+USAGE_TABLE = "history_learning_usage"
+VOCABULARY_CACHE_TABLE = "history_learning_vocabulary_cache"
 
 PARAGRAPHS_QUEUE = 'history-learning-paragraphs'
 VOCABULARY_QUEUE = 'history-learning-vocabulary'
@@ -10,7 +14,16 @@ SUMMARIES_QUEUE = 'history-learning-summaries'
 # Maximum number of items that can be inserted/updated at once
 DYNAMODB_MAX_BATCH_SIZE = 25
 
+# Maximum number of messages that can be sent to SQS at once
+SQS_MAX_BATCH_SIZE = 10
+
 # Limit the paragraphs we'll summarize for any document
 SUMMARIES_PER_SUBMISSION_LIMIT = 100
 
 PARAGRAPH_INTRO_WORDS = 10
+
+# Words less frequent than this in the language are shown as vocabulary, unless the user picks another threshold
+VOCABULARY_COMMON_THRESHOLD = 0.00002
+# Words less frequent than this are saved with their frequency, so that any threshold up to it
+# can be shown without extracting the vocabulary again
+VOCABULARY_STORED_THRESHOLD = 0.0001
@@ -0,0 +1,427 @@
+"""
+HTML main-content paragraph extraction.
+
+Parses HTML with lxml's C-backed parser in streaming (target) mode, so no
+document tree is ever built, and splits the page into text blocks at block-level
+element boundaries. Blocks are then scored by content density (text length,
+link density, boilerplate containers) and only the main body is kept.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from lxml import etree
+
+# Elements that always start a new text block
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'body', 'dd', 'details', 'dialog', 'div', 'dl', 'dt',
+    'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header',
+    'hr', 'html', 'li', 'main', 'menu', 'nav', 'ol', 'p', 'pre', 'section', 'summary', 'table', 'tbody',
+    'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+}
+
+# Block elements whose text is a paragraph on its own. Text sitting directly in any other
+# block (typically a <div> per line, as in poems) is joined with its neighbours.
+PARAGRAPH_TAGS = {'blockquote', 'dd', 'figcaption', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'p', 'pre', 'td', 'th'}
+
+# Elements whose content is never text
+SKIP_TAGS = {'button', 'canvas', 'head', 'iframe', 'noscript', 'object', 'script', 'select', 'style', 'svg',
+             'template', 'textarea', 'title'}
+
+# Elements whose content is page furniture rather than the main text
+BOILERPLATE_TAGS = {'aside', 'footer', 'form', 'header', 'menu', 'nav'}
+
+# class/id tokens that mark page furniture
+BOILERPLATE_TOKENS = {
+    'ad', 'ads', 'advert', 'advertisement', 'banner', 'breadcrumb', 'breadcrumbs', 'comment', 'comments',
+    'cookie', 'cookies', 'footer', 'masthead', 'menu', 'nav', 'navbar', 'navigation', 'newsletter', 'popup',
+    'promo', 'related', 'share', 'sidebar', 'social', 'sponsored', 'subscribe', 'toolbar',
+}
+
+TOKEN_SPLIT_REGEX = re.compile(r'[^a-z0-9]+')
+WHITESPACE_REGEX = re.compile(r'\s+')
+
+# Text directly in a non-paragraph block that is at least this long is not treated as a line
+LINE_MAX_CHARS = 120
+
+# Paragraphs with a larger share of their text inside links are navigation
+MAX_LINK_DENSITY = 0.33
+
+# How much of a paragraph's length is credited to each of its ancestors, nearest first
+ANCESTOR_WEIGHTS = (1.0, 0.5, 0.25)
+
+READ_CHUNK_SIZE = 64 * 1024
+
+HtmlSource = Union[str, bytes, Iterable[Union[str, bytes]], Any]
+
+
+@dataclass
+class TextBlock:
+    """A run of text between two block-level boundaries."""
+    text: str
+    link_chars: int
+    boilerplate: bool
+    # Ids of the enclosing block elements, nearest first
+    path: Tuple[int, ...]
+    # True if this block is a paragraph element rather than loose text in a container
+    standalone: bool
+    in_selection: bool
+
+    @property
+    def link_density(self) -> float:
+        return self.link_chars / len(self.text) if self.text else 1.0
+
+    def is_content(self) -> bool:
+        return not self.boilerplate and self.link_density <= MAX_LINK_DENSITY
+
+
+@dataclass
+class _Frame:
+    tag: str
+    block_id: int
+    boilerplate: bool
+    in_selection: bool
+    parts: List[str] = field(default_factory=list)
+    link_chars: int = 0
+
+
+def _class_tokens(attrib) -> set:
+    value = f"{attrib.get('class', '')} {attrib.get('id', '')}".lower()
+    return set(TOKEN_SPLIT_REGEX.split(value))
+
+
+# Tokens of the CSS selectors understood here: selector lists, the descendant and child
+# combinators, and compound selectors of a type, classes, ids and attributes
+SELECTOR_TOKEN_REGEX = re.compile(r"""
+    (?P<comma>\s*,\s*)
+  | (?P<child>\s*>\s*)
+  | (?P<descendant>\s+)
+  | (?P<tag>[a-zA-Z][\w-]*|\*)
+  | \.(?P<class_>[\w-]+)
+  | \#(?P<id>[\w-]+)
+  | \[\s*(?P<attribute>[\w-]+)\s*
+        (?:(?P<operator>[~|^$*]?=)\s*(?:"(?P<double_quoted>[^"]*)"|'(?P<single_quoted>[^']*)'|(?P<bare>[\w-]+))\s*)?
+    \]
+""", re.VERBOSE)
+
+
+@dataclass
+class _Compound:
+    """The conditions on one element, as in `div.entry-content[lang=en]`."""
+    tag: str = ''
+    classes: set = field(default_factory=set)
+    id: str = ''
+    # (name, operator, value); an empty operator only asks for the attribute to be there
+    attributes: List[Tuple[str, str, str]] = field(default_factory=list)
+
+    def matches(self, tag: str, attrib) -> bool:
+        if self.tag and tag != self.tag:
+            return False
+        if self.id and attrib.get('id') != self.id:
+            return False
+        if not self.classes <= set(attrib.get('class', '').split()):
+            return False
+        return all(_matches_attribute(attrib.get(name), operator, value)
+                   for name, operator, value in self.attributes)
+
+
+def _matches_attribute(actual: Optional[str], operator: str, value: str) -> bool:
+    if actual is None:
+        return False
+    if operator == '=':
+        return actual == value
+    if operator == '~=':
+        return value in actual.split()
+    if operator == '|=':
+        return actual == value or actual.startswith(f"{value}-")
+    if operator == '^=':
+        return bool(value) and actual.startswith(value)
+    if operator == '$=':
+        return bool(value) and actual.endswith(value)
+    if operator == '*=':
+        return bool(value) and value in actual
+    return True
+
+
+# A complex selector: its compounds with the combinator before each (' ' or '>'), outermost first
+Selector = List[Tuple[str, _Compound]]
+
+
+def _parse_selector(selector: Optional[str]) -> Optional[List[Selector]]:
+    """
+    Parse a CSS selector list, like `div.entry-content`, `main article > div[role=main]`
+    or `#content, .post-body`.
+
+    Supported are type, class, id and attribute selectors (`[attr]`, and `=`, `~=`, `|=`,
+    `^=`, `$=` and `*=` on a value), the descendant and child combinators, and lists of
+    selectors separated by commas. Pseudo-classes and the sibling combinators are not.
+
+    Raises:
+        ValueError: If the selector uses anything else
+    """
+    if not selector or not selector.strip():
+        return None
+    selectors: List[Selector] = []
+    current: Selector = []
+    compound: Optional[_Compound] = None
+    combinator = ' '
+    position = 0
+    text = selector.strip()
+    while position < len(text):
+        match = SELECTOR_TOKEN_REGEX.match(text, position)
+        if not match:
+            raise ValueError(f"Unsupported selector: {selector}")
+        position = match.end()
+        kind = next(name for name in ('comma', 'child', 'descendant', 'tag', 'class_', 'id', 'attribute')
+                    if match[name] is not None)
+        if kind in ('comma', 'child', 'descendant'):
+            if compound is None:
+                raise ValueError(f"Unsupported selector: {selector}")
+            current.append((combinator, compound))
+            compound = None
+            combinator = '>' if kind == 'child' else ' '
+            if kind == 'comma':
+                selectors.append(current)
+                current = []
+            continue
+
+        if kind == 'tag':
+            if compound is not None:
+                raise ValueError(f"Unsupported selector: {selector}")
+            compound = _Compound(tag='' if match['tag'] == '*' else match['tag'].lower())
+            continue
+        compound = compound or _Compound()
+        if kind == 'class_':
+            compound.classes.add(match['class_'])
+        elif kind == 'id':
+            compound.id = match['id']
+        else:
+            value = next((v for v in (match['double_quoted'], match['single_quoted'], match['bare'])
+                          if v is not None), '')
+            compound.attributes.append((match['attribute'].lower(), match['operator'] or '', value))
+
+    if compound is None:
+        raise ValueError(f"Unsupported selector: {selector}")
+    current.append((combinator, compound))
+    selectors.append(current)
+    return selectors
+
+
+def _matches_selector(elements: List[Tuple[str, Any]], selector: Selector) -> bool:
+    """Whether the last of the open elements, with the others as its ancestors, matches the selector."""
+
+    def match(compound_index: int, element_index: int) -> bool:
+        combinator, compound = selector[compound_index]
+        if not compound.matches(*elements[element_index]):
+            return False
+        if compound_index == 0:
+            return True
+        if combinator == '>':
+            return element_index > 0 and match(compound_index - 1, element_index - 1)
+        return any(match(compound_index - 1, ancestor) for ancestor in range(element_index - 1, -1, -1))
+
+    return match(len(selector) - 1, len(elements) - 1)
+
+
+class _BlockCollector:
+    """lxml parser target that turns a stream of parse events into TextBlocks."""
+
+    def __init__(self, selectors: Optional[List[Selector]] = None):
+        self.selectors = selectors
+        self.blocks: List[TextBlock] = []
+        self.frames: List[_Frame] = [_Frame('#root', 0, False, False)]
+        # Open elements (block or inline), so end events can be matched to their start
+        self.open_tags: List[Tuple[str, bool]] = []
+        # Tags and attributes of the open elements outside skipped ones, for selectors with ancestors
+        self.open_elements: List[Tuple[str, Any]] = []
+        self.skip_depth = 0
+        self.link_depth = 0
+        self.next_block_id = 1
+
+    def _flush(self, frame: _Frame, standalone: bool) -> None:
+        text = WHITESPACE_REGEX.sub(' ', ''.join(frame.parts)).strip()
+        self.blocks.append(TextBlock(
+            text=text,
+            link_chars=min(frame.link_chars, len(text)),
+            boilerplate=frame.boilerplate,
+            path=tuple(f.block_id for f in reversed(self.frames)),
+            standalone=standalone,
+            in_selection=frame.in_selection,
+        ))
+        frame.parts = []
+        frame.link_chars = 0
+
+    def start(self, tag, attrib):
+        tag = tag.lower() if isinstance(tag, str) else ''
+        if self.skip_depth or tag in SKIP_TAGS:
+            self.skip_depth += 1
+            self.open_tags.append((tag, False))
+            return
+
+        if tag == 'a':
+            self.link_depth += 1
+        elif tag == 'br':
+            self.frames[-1].parts.append('\n')
+        if self.selectors:
+            self.open_elements.append((tag, attrib))
+
+        is_block = tag in BLOCK_TAGS
+        self.open_tags.append((tag, is_block))
+        if not is_block:
+            return
+
+        parent = self.frames[-1]
+        if ''.join(parent.parts).strip():
+            # Text before a nested block is a block of its own
+            self._flush(parent, standalone=parent.tag in PARAGRAPH_TAGS)
+        else:
+            parent.parts = []
+        boilerplate = (parent.boilerplate
+                       or tag in BOILERPLATE_TAGS
+                       or bool(_class_tokens(attrib) & BOILERPLATE_TOKENS))
+        in_selection = parent.in_selection or bool(
+            self.selectors and any(_matches_selector(self.open_elements, selector) for selector in self.selectors))
+        self.frames.append(_Frame(tag, self.next_block_id, boilerplate, in_selection))
+        self.next_block_id += 1
+
+    def end(self, tag):
+        if not self.open_tags:
+            return
+        tag, is_block = self.open_tags.pop()
+        if self.skip_depth:
+            self.skip_depth -= 1
+            return
+        if tag == 'a':
+            self.link_depth = max(0, self.link_depth - 1)
+        if self.selectors:
+            self.open_elements.pop()
+        if is_block:
+            frame = self.frames[-1]
+            # Always flush, even when empty: a blank block (e.g. `<div><br></div>`) ends a group of lines
+            self._flush(frame, standalone=tag in PARAGRAPH_TAGS)
+            self.frames.pop()
+
+    def data(self, data):
+        if self.skip_depth:
+            return
+        frame = self.frames[-1]
+        frame.parts.append(data)
+        if self.link_depth:
+            frame.link_chars += len(data.strip())
+
+    def close(self) -> List[TextBlock]:
+        while len(self.frames) > 1:
+            self._flush(self.frames[-1], standalone=False)
+            self.frames.pop()
+        return self.blocks
+
+
+def _chunks(source: HtmlSource, chunk_size: int) -> Iterator[Union[str, bytes]]:
+    if isinstance(source, (str, bytes)):
+        for i in range(0, len(source), chunk_size):
+            yield source[i:i + chunk_size]
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+
+def text_blocks_from_html(source: HtmlSource, selector: Optional[str] = None,
+                          chunk_size: int = READ_CHUNK_SIZE) -> List[TextBlock]:
+    """
+    Split an HTML document into text blocks, without building a document tree.
+
+    Args:
+        source: HTML as str/bytes, a file-like object, or an iterable of str/bytes chunks
+        selector: Optional CSS selector of the block element that holds the main text; see
+                  _parse_selector for the selectors supported
+        chunk_size: How much to read at a time from strings and file-like objects
+
+    Returns:
+        Text blocks in document order, including empty ones; none for an empty document
+    """
+    parser = etree.HTMLParser(target=_BlockCollector(_parse_selector(selector)), remove_comments=True,
+                              remove_pis=True, no_network=True)
+    fed = False
+    for chunk in _chunks(source, chunk_size):
+        if chunk:
+            parser.feed(chunk)
+            fed = True
+    if not fed:
+        # lxml refuses to close a parser that was given nothing ("no element found")
+        return []
+    return parser.close()
+
+
+def _join_lines(blocks: List[TextBlock]) -> List[TextBlock]:
+    """
+    Join runs of short loose-text blocks in the same container into paragraphs,
+    so that e.g. a poem laid out one `<div>` per line comes out one stanza per paragraph.
+    """
+    paragraphs: List[TextBlock] = []
+    current: Optional[TextBlock] = None
+    for block in blocks:
+        is_line = not block.standalone and 0 < len(block.text) < LINE_MAX_CHARS
+        if is_line and current is not None and current.path[1:] == block.path[1:]:
+            current.text = f"{current.text} {block.text}"
+            current.link_chars += block.link_chars
+            continue
+
+        if current is not None:
+            paragraphs.append(current)
+            current = None
+        if is_line:
+            current = TextBlock(block.text, block.link_chars, block.boilerplate, block.path,
+                                standalone=False, in_selection=block.in_selection)
+        elif block.text:
+            paragraphs.append(block)
+
+    if current is not None:
+        paragraphs.append(current)
+    return paragraphs
+
+
+def main_content(paragraphs: List[TextBlock]) -> List[TextBlock]:
+    """
+    Keep the paragraphs that belong to the main body of the page.
+
+    Every content paragraph credits its length to its nearest ancestors; the
+    best-scoring element is taken to be the main text container.
+    """
+    selected = [p for p in paragraphs if p.in_selection and p.is_content()]
+    if selected:
+        return selected
+
+    candidates = [p for p in paragraphs if p.is_content()]
+    if not candidates:
+        return []
+
+    scores: Dict[int, float] = {}
+    for paragraph in candidates:
+        # path[0] is the paragraph's own element (or its first line's), which says nothing about the page layout
+        for block_id, weight in zip(paragraph.path[1:], ANCESTOR_WEIGHTS):
+            scores[block_id] = scores.get(block_id, 0.0) + weight * len(paragraph.text)
+
+    top = max(scores, key=scores.get)
+    return [p for p in candidates if top in p.path]
+
+
+def paragraphs_from_html(source: HtmlSource, selector: Optional[str] = None) -> List[str]:
+    """
+    Extract the main-body paragraphs of an HTML document.
+
+    Args:
+        source: HTML as str/bytes, a file-like object, or an iterable of str/bytes chunks
+        selector: Optional CSS selector for the element holding the main text, e.g.
+                  `div.entry-content` or `main article > div[role=main]`. If nothing
+                  usable matches, the main text is found by content density.
+
+    Returns:
+        List of paragraph strings, in document order
+    """
+    blocks = text_blocks_from_html(source, selector)
+    return [p.text for p in main_content(_join_lines(blocks))]
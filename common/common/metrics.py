@@ -0,0 +1,230 @@
+"""
+Process metrics: counters, histograms and stage timers
+
+Metrics are kept in memory, per process, with labels such as the service, the stage of
+a job and its outcome. They are exported in the Prometheus text format on a local
+/metrics endpoint (serve_metrics), and timed stages can also be logged as one JSON line
+each, for log-based dashboards.
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from common.envvar import environment
+from common.logger import logger
+
+# Upper bounds of histogram buckets, in seconds: from quick DynamoDB calls to whole documents
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    type_name = ''
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} takes labels {self.label_names}, not {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str]):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return super().render() + [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                                   for key, value in values]
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str],
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: the count in each bucket (not cumulative, the last for +Inf), and the sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[bucket] += 1
+            self._sums[key] += value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            return sum(self._counts.get(self._label_values(labels), []))
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines = super().render()
+        bucket_label_names = self.label_names + ('le',)
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for upper_bound, count in zip([*map(_format_value, self.buckets), '+Inf'], counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_label_names, key + (upper_bound,))} "
+                             f"{cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics of a process, by name. Asking again for a metric returns the same one."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_class, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already a {metric.type_name}")
+            return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str]) -> Counter:
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str],
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets)
+
+    def render(self) -> str:
+        """All metrics, in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    'worker_stage_seconds', 'Time spent in each stage of processing a job', ('service', 'stage', 'outcome'))
+STAGE_ITEMS = registry.counter(
+    'worker_stage_items_total', 'Items (paragraphs, words, summaries) handled by each stage of a job',
+    ('service', 'stage', 'item'))
+
+_service = 'unknown'
+_log_stages = False
+
+
+def configure_metrics(service: str) -> None:
+    """
+    Label this process's metrics with its service, and export them as configured:
+    on METRICS_PORT if set, and as one JSON log line per stage if METRICS_LOG is set.
+    """
+    global _service, _log_stages
+    _service = service
+    _log_stages = environment.has('METRICS_LOG')
+    if environment.has('METRICS_PORT'):
+        serve_metrics(int(environment.require('METRICS_PORT')))
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a stage of a job, labelled with its outcome: "ok", or "error" if it raises."""
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except BaseException:
+        outcome = 'error'
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, service=_service, stage=name, outcome=outcome)
+        if _log_stages:
+            logger.info(json.dumps({'metric': 'stage', 'service': _service, 'stage': name,
+                                    'outcome': outcome, 'seconds': round(seconds, 4)}))
+
+
+def count_items(stage_name: str, item: str, amount: int = 1) -> None:
+    """Count items handled by a stage, e.g. the paragraphs summarized, for throughput."""
+    STAGE_ITEMS.inc(amount, service=_service, stage=stage_name, item=item)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent; keep them out of the service's log
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def serve_metrics(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """Serve /metrics on a background thread. Only the first call starts a server."""
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_server.serve_forever, name='metrics', daemon=True).start()
+        logger.info(f"Serving metrics on port {_server.server_address[1]}")
+    return _server
@@ -2,6 +2,7 @@ import boto3
 import logging
 import json
 from typing import Optional, Dict, Any, List, Generator
+from common.constants import SQS_MAX_BATCH_SIZE
 from common.envvar import environment
 
 logger = logging.getLogger(__name__)
@@ -52,6 +53,18 @@ class QueueClient:
             params['MessageAttributes'] = message_attributes
         return self.client.send_message(**params)
 
+    def send_messages(self, message_bodies: List[str]) -> None:
+        """Send many messages, in batches of at most SQS_MAX_BATCH_SIZE."""
+        for i in range(0, len(message_bodies), SQS_MAX_BATCH_SIZE):
+            batch = message_bodies[i:i + SQS_MAX_BATCH_SIZE]
+            response = self.client.send_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{'Id': str(j), 'MessageBody': body} for j, body in enumerate(batch)]
+            )
+            if response.get('Failed'):
+                raise RuntimeError(f"Failed to send {len(response['Failed'])} messages to {self.queue_name}: "
+                                   f"{response['Failed']}")
+
     def receive_messages(self, max_messages: int = 1, wait_time_seconds: int = 20) -> List[Dict[str, Any]]:
         """Receive messages from the queue."""
         response = self.client.receive_message(
@@ -2,10 +2,11 @@ import time
 from enum import Enum
 
 import boto3
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable
 from dataclasses import dataclass
 from boto3.dynamodb.conditions import Key
 
+from common.chunks import ParagraphChunk
 from common.constants import SUBMISSIONS_TABLE
 from common.logger import logger
 
@@ -27,6 +28,8 @@ class BaseSubmission:
     state: int
     filename: Optional[str] = None
     paragraph_count: Optional[int] = None
+    # Paragraphs per work item, if the submission was split into chunks
+    chunk_size: Optional[int] = None
 
     def s3_base_path(self) -> str:
         return f"uploads/{self.user_id}/{self.submission_id}"
@@ -38,6 +41,8 @@ class NewSubmission(BaseSubmission):
 @dataclass
 class Submission(BaseSubmission):
     created_at: int = int(time.time())
+    # How many paragraphs have a summary saved so far
+    summarized_count: int = 0
 
 class SubmissionRepo:
     def __init__(self, table):
@@ -56,7 +61,9 @@ class SubmissionRepo:
                 state=item.get('state'),
                 filename=item.get('filename'),
                 paragraph_count=item.get('paragraph_count'),
+                chunk_size=item.get('chunk_size'),
                 created_at=item.get('created_at'),
+                summarized_count=len(item.get('summarized_paragraphs', ())),
             )
         except Exception as _e:
             logger.error(f"Bad item in submissions table: {item.get('submission_id', None)}")
@@ -74,6 +81,8 @@ class SubmissionRepo:
             item['filename'] = base_record.filename
         if base_record.paragraph_count is not None:
             item['paragraph_count'] = base_record.paragraph_count
+        if base_record.chunk_size is not None:
+            item['chunk_size'] = base_record.chunk_size
 
         return item
 
@@ -171,6 +180,134 @@ class SubmissionRepo:
             }
         )
 
+    def update_chunk_size(self, user_id: str, submission_id: str, chunk_size: int) -> None:
+        """Record that the submission is processed in chunks of chunk_size paragraphs."""
+        logger.info(f"Updating submission {submission_id} with chunk_size {chunk_size}")
+        self.table.update_item(
+            Key={
+                'user_id': user_id,
+                'submission_id': submission_id
+            },
+            UpdateExpression="SET chunk_size = :chunk_size",
+            ExpressionAttributeValues={
+                ':chunk_size': chunk_size
+            }
+        )
+
+    def is_chunked(self, user_id: str, submission_id: str) -> bool:
+        """Whether the submission is processed in chunks, rather than as a whole file."""
+        submission = self.get_by_id(user_id, submission_id)
+        return bool(submission and submission.chunk_size)
+
+    def mark_chunk_done(self, user_id: str, submission_id: str, stage: SubmissionState, chunk: ParagraphChunk) -> bool:
+        """
+        Record that a stage has finished one chunk of the submission.
+
+        Chunks are recorded in a set, so redelivered work items are not counted twice.
+
+        Returns:
+            True if this call completed the last outstanding chunk of the stage
+        """
+        attribute = f"{stage.name.lower()}_chunks"
+        response = self.table.update_item(
+            Key={
+                'user_id': user_id,
+                'submission_id': submission_id
+            },
+            UpdateExpression="ADD #chunks :chunk",
+            ExpressionAttributeNames={
+                '#chunks': attribute
+            },
+            ExpressionAttributeValues={
+                ':chunk': {chunk.index}
+            },
+            ReturnValues='UPDATED_OLD'
+        )
+        done_before = response.get('Attributes', {}).get(attribute, set())
+        if chunk.index in done_before:
+            return False
+
+        logger.info(f"Submission {submission_id}: {stage.name} chunk {chunk.index + 1} of {chunk.count} "
+                    f"done ({len(done_before) + 1} complete)")
+        return len(done_before) + 1 == chunk.count
+
+    def mark_paragraphs_summarized(self, user_id: str, submission_id: str, paragraph_numbers: Iterable[int]) -> None:
+        """
+        Record progress: these paragraphs of the submission have their summaries saved.
+
+        Paragraph numbers are kept in a set, so retried work is not counted twice.
+        """
+        paragraph_numbers = set(paragraph_numbers)
+        if not paragraph_numbers:
+            return
+        self.table.update_item(
+            Key={
+                'user_id': user_id,
+                'submission_id': submission_id
+            },
+            UpdateExpression="ADD summarized_paragraphs :paragraphs",
+            ExpressionAttributeValues={
+                ':paragraphs': paragraph_numbers
+            }
+        )
+
+    def reserve_summary_tokens(self, user_id: str, submission_id: str, tokens: int, limit: int) -> bool:
+        """
+        Add to the tokens the submission's summaries are estimated to use, if the total stays within limit.
+
+        Chunks of one submission are summarized by different jobs; this keeps them to one budget.
+
+        Returns:
+            False, with nothing added, if the total would go over the limit
+        """
+        if tokens > limit:
+            return False
+        try:
+            self.table.update_item(
+                Key={
+                    'user_id': user_id,
+                    'submission_id': submission_id
+                },
+                UpdateExpression="ADD summary_tokens :tokens",
+                ConditionExpression="attribute_not_exists(summary_tokens) OR summary_tokens <= :max_tokens",
+                ExpressionAttributeValues={
+                    ':tokens': tokens,
+                    ':max_tokens': limit - tokens
+                }
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def release_summary_tokens(self, user_id: str, submission_id: str, tokens: int) -> None:
+        """Give back tokens reserved for the submission's summaries that will not be spent."""
+        try:
+            self.table.update_item(
+                Key={
+                    'user_id': user_id,
+                    'submission_id': submission_id
+                },
+                UpdateExpression="ADD summary_tokens :tokens",
+                ConditionExpression="attribute_exists(summary_tokens)",
+                ExpressionAttributeValues={
+                    ':tokens': -tokens
+                }
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            logger.warning(f"Submission {submission_id} has no summary tokens reserved to release")
+
+    def get_summary_tokens(self, user_id: str, submission_id: str) -> int:
+        """The tokens reserved for the submission's summaries so far."""
+        response = self.table.get_item(
+            Key={
+                'user_id': user_id,
+                'submission_id': submission_id
+            },
+            ProjectionExpression='summary_tokens',
+            ConsistentRead=True
+        )
+        return int(response.get('Item', {}).get('summary_tokens', 0))
+
     def delete(self, user_id: str, submission_id: str) -> None:
         """Delete a submission record."""
         logger.info(f"Deleting submission {submission_id} for user {user_id}")
@@ -1,6 +1,6 @@
 import time
 import boto3
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set
 from dataclasses import dataclass
 from boto3.dynamodb.conditions import Key
 
@@ -65,14 +65,38 @@ class SummaryRepo:
         self.table.put_item(Item=item)
         return item
 
-    def get_by_submission(self, user_id, submission_id) -> List[Summary]:
-        response = self.table.query(
-            KeyConditionExpression=Key('user_id').eq(user_id) &
-                                   Key('submission_paragraph').begins_with(f"SUMMARY#{submission_id}#")
-        )
+    def save_many(self, new_summaries: List[NewSummary]):
+        """Write summaries in batches; an existing summary for the same paragraph is replaced."""
+        items = []
+        with self.table.batch_writer(overwrite_by_pkeys=['user_id', 'submission_paragraph']) as batch:
+            for new_summary in new_summaries:
+                item = self.item_from_new_record_for_insert(new_summary)
+                batch.put_item(Item=item)
+                items.append(item)
+        return items
+
+    def _query_all_items(self, user_id, submission_id, **query_args) -> List[Dict[str, Any]]:
+        query = {
+            'KeyConditionExpression': Key('user_id').eq(user_id) &
+                                      Key('submission_paragraph').begins_with(f"SUMMARY#{submission_id}#"),
+            **query_args,
+        }
+        items = []
+        while True:
+            response = self.table.query(**query)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def get_paragraph_numbers(self, user_id, submission_id) -> Set[int]:
+        """The paragraph numbers of a submission that have a summary saved already."""
+        items = self._query_all_items(user_id, submission_id, ProjectionExpression='submission_paragraph')
+        return {int(item['submission_paragraph'].rsplit('#', 1)[1]) for item in items}
 
+    def get_by_submission(self, user_id, submission_id) -> List[Summary]:
         summaries = []
-        for item in response.get('Items', []):
+        for item in self._query_all_items(user_id, submission_id):
             summary = self.record_from_item(item)
             if summary:
                 summaries.append(summary)
@@ -0,0 +1,177 @@
+"""
+Tiered key-value caches with expiry
+
+Values are strings, cached by key in tiers: a local SQLite file per host, and a
+DynamoDB table shared by all workers. Lookups go through the tiers fastest first and
+copy hits into the faster ones; writes go to every tier. Both tiers expire entries
+after a TTL. The services cache their own values in them, e.g. paragraph summaries
+and paragraph vocabularies, under their own table and column names.
+"""
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional
+
+from common.logger import logger
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+
+# Maximum number of keys in one DynamoDB BatchGetItem call
+DYNAMODB_MAX_BATCH_GET_SIZE = 100
+
+# Keys per SQLite query, well under its limit on query parameters
+SQLITE_MAX_QUERY_KEYS = 500
+
+
+class KeyValueCache(ABC):
+    """Interface for cache tiers."""
+
+    @abstractmethod
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Return the cached values for whichever of the keys are cached."""
+
+    @abstractmethod
+    def put_many(self, entries: Dict[str, str]) -> None:
+        """Cache values by key."""
+
+
+class SqliteCache(KeyValueCache):
+    """Local, per-host cache tier: one table of a SQLite file, with the values in value_column."""
+
+    def __init__(self, path: str, table_name: str, value_column: str, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.table_name = table_name
+        self.value_column = value_column
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table_name} "
+                f"(cache_key TEXT PRIMARY KEY, {value_column} TEXT NOT NULL, expires_at INTEGER NOT NULL)"
+            )
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        keys = list(keys)
+        found: Dict[str, str] = {}
+        now = int(time.time())
+        with self._lock:
+            for i in range(0, len(keys), SQLITE_MAX_QUERY_KEYS):
+                batch = keys[i:i + SQLITE_MAX_QUERY_KEYS]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT cache_key, {self.value_column} FROM {self.table_name} "
+                    f"WHERE expires_at > ? AND cache_key IN ({placeholders})",
+                    [now, *batch]
+                )
+                found.update(rows)
+        return found
+
+    def put_many(self, entries: Dict[str, str]) -> None:
+        now = int(time.time())
+        expires_at = now + self.ttl_seconds
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {self.table_name} (cache_key, {self.value_column}, expires_at) "
+                f"VALUES (?, ?, ?)",
+                [(key, value, expires_at) for key, value in entries.items()]
+            )
+            self._connection.execute(f"DELETE FROM {self.table_name} WHERE expires_at <= ?", (now,))
+
+
+class DynamoCache(KeyValueCache):
+    """
+    Cache tier shared by all workers: a DynamoDB table keyed by `cache_key`, with the values in value_attribute.
+
+    Items carry an `expires_at` epoch time, which the table's TTL setting uses to delete them.
+    """
+
+    def __init__(self, table, value_attribute: str, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.table = table
+        self.value_attribute = value_attribute
+        self.ttl_seconds = ttl_seconds
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        # BatchGetItem refuses duplicate keys, which repeated paragraphs give
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, str] = {}
+        now = int(time.time())
+        client = self.table.meta.client
+        for i in range(0, len(keys), DYNAMODB_MAX_BATCH_GET_SIZE):
+            request = {self.table.name: {'Keys': [{'cache_key': key} for key in keys[i:i + DYNAMODB_MAX_BATCH_GET_SIZE]]}}
+            while request:
+                response = client.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(self.table.name, []):
+                    # TTL deletion is lazy, so expired items may still be returned
+                    if int(item.get('expires_at', 0)) > now:
+                        found[item['cache_key']] = item[self.value_attribute]
+                request = response.get('UnprocessedKeys')
+        return found
+
+    def put_many(self, entries: Dict[str, str]) -> None:
+        expires_at = int(time.time()) + self.ttl_seconds
+        with self.table.batch_writer() as batch:
+            for key, value in entries.items():
+                batch.put_item(Item={'cache_key': key, self.value_attribute: value, 'expires_at': expires_at})
+
+
+class TieredCache(KeyValueCache):
+    """
+    Looks keys up in each tier in turn, fastest first, and copies hits from
+    slower tiers into the faster ones. Writes go to every tier.
+
+    A failing tier is logged and skipped, so an outage only costs cache misses.
+    """
+
+    def __init__(self, tiers: List[KeyValueCache], name: str = 'Cache'):
+        self.tiers = tiers
+        # For logs, e.g. "Summary cache"
+        self.name = name
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        missing = list(keys)
+        found: Dict[str, str] = {}
+        for i, tier in enumerate(self.tiers):
+            if not missing:
+                break
+            try:
+                hits = tier.get_many(missing)
+            except Exception as e:
+                logger.error(f"{self.name} tier {type(tier).__name__} failed on read: {e}")
+                continue
+            if hits:
+                found.update(hits)
+                missing = [key for key in missing if key not in hits]
+                self._put_tiers(self.tiers[:i], hits)
+        return found
+
+    def put_many(self, entries: Dict[str, str]) -> None:
+        self._put_tiers(self.tiers, entries)
+
+    def _put_tiers(self, tiers: List[KeyValueCache], entries: Dict[str, str]) -> None:
+        for tier in tiers:
+            try:
+                tier.put_many(entries)
+            except Exception as e:
+                logger.error(f"{self.name} tier {type(tier).__name__} failed on write: {e}")
+
+
+def build_tiered_cache(name: str, value_name: str, sqlite_path: Optional[str], sqlite_table: str,
+                       dynamodb_table=None, ttl_seconds: int = DEFAULT_TTL_SECONDS) -> Optional[TieredCache]:
+    """
+    Build a tiered cache from whichever tiers are configured; None if there are none.
+
+    Args:
+        name: What the cache holds, for logs
+        value_name: The SQLite column and DynamoDB attribute of the values
+        sqlite_path: The local SQLite file, if any
+        sqlite_table: The table of the SQLite file
+        dynamodb_table: The shared DynamoDB table, if any
+        ttl_seconds: How long entries are kept in either tier
+    """
+    tiers: List[KeyValueCache] = []
+    if sqlite_path:
+        tiers.append(SqliteCache(sqlite_path, sqlite_table, value_name, ttl_seconds))
+    if dynamodb_table is not None:
+        tiers.append(DynamoCache(dynamodb_table, value_name, ttl_seconds))
+    return TieredCache(tiers, name) if tiers else None
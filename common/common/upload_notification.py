@@ -6,7 +6,9 @@ from typing import Iterator
 
 import boto3
 
+from common.chunks import CHUNK_EVENT_NAME, ParagraphChunk
 from common.logger import logger
+from common.metrics import stage
 from common.sqs_client import QueueClient, records_from_sqs_message
 
 sqs = boto3.client('sqs')
@@ -30,9 +32,11 @@ class S3Upload:
         self.key = sqs_record['s3']['object']['key']
         self.filename = self.key.split('/')[-1]
         self.user_id, self.file_hash = submission_id_from_s3_key(self.key)
+        # Set when this is one chunk of a large submission, rather than the whole file
+        self.chunk = ParagraphChunk.from_record(sqs_record)
 
         logger.info(f"S3 bucket {self.bucket} key {self.key}")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{self.filename}") as tmp:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{self.filename}") as tmp, stage('s3_download'):
             s3.download_file(self.bucket, self.key, tmp.name)
             self.tmp_file_path = tmp.name
             logger.info(f"Downloaded to {self.tmp_file_path}")
@@ -44,7 +48,8 @@ class S3Upload:
 def poll_sqs_for_s3_file(queue_client: QueueClient) -> Iterator[S3Upload]:
     while True:
         logger.info('Requesting now...')
-        messages = queue_client.receive_messages(max_messages=1, wait_time_seconds=10)
+        with stage('sqs_receive'):
+            messages = queue_client.receive_messages(max_messages=1, wait_time_seconds=10)
         if not messages:
             logger.info('No messages found, requesting again...')
             continue
@@ -55,13 +60,16 @@ def poll_sqs_for_s3_file(queue_client: QueueClient) -> Iterator[S3Upload]:
 
         try:
             for record in records_from_sqs_message(msg):
-                if record.get('eventName') != 'ObjectCreated:Put':
+                # Put for single uploads, CompleteMultipartUpload for large paragraph files
+                event_name = record.get('eventName', '')
+                if not event_name.startswith('ObjectCreated:') and event_name != CHUNK_EVENT_NAME:
                     continue
 
                 upload = S3Upload(record)
                 yield upload
 
-                queue_client.delete_message(receipt_handle)
+                with stage('sqs_delete'):
+                    queue_client.delete_message(receipt_handle)
                 return  # Exit after processing one file
 
         except Exception as e:
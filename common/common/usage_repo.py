@@ -0,0 +1,123 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Optional
+
+import boto3
+
+from common.constants import USAGE_TABLE
+from common.envvar import environment
+from common.logger import logger
+
+# Daily usage items are kept a while for reporting, then expire
+USAGE_RETENTION_DAYS = 35
+
+
+def usage_day(now: Optional[float] = None) -> str:
+    """The quota day (UTC) that a time falls in, like "2025-01-31"."""
+    return datetime.fromtimestamp(time.time() if now is None else now, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def seconds_until_next_day(now: Optional[float] = None) -> int:
+    """How long until the quotas reset, at midnight UTC."""
+    now = time.time() if now is None else now
+    today = datetime.fromtimestamp(now, tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1, int((today + timedelta(days=1)).timestamp() - now))
+
+
+@dataclass(frozen=True)
+class DailyUsage:
+    """Summary tokens and their cost, as estimated before the API calls, for one user on one day."""
+    tokens: int = 0
+    cost_usd: float = 0.0
+
+
+@dataclass(frozen=True)
+class UsageQuota:
+    """Daily limits per user. None means unlimited."""
+    daily_tokens: Optional[int] = None
+    daily_cost_usd: Optional[float] = None
+
+    @staticmethod
+    def from_environment() -> 'UsageQuota':
+        """Quotas from USER_DAILY_TOKEN_QUOTA and USER_DAILY_COST_QUOTA_USD, shared by all services."""
+        return UsageQuota(
+            daily_tokens=(int(environment.require('USER_DAILY_TOKEN_QUOTA'))
+                          if environment.has('USER_DAILY_TOKEN_QUOTA') else None),
+            daily_cost_usd=(float(environment.require('USER_DAILY_COST_QUOTA_USD'))
+                            if environment.has('USER_DAILY_COST_QUOTA_USD') else None),
+        )
+
+    @property
+    def unlimited(self) -> bool:
+        return self.daily_tokens is None and self.daily_cost_usd is None
+
+    def exhausted(self, usage: DailyUsage) -> bool:
+        return ((self.daily_tokens is not None and usage.tokens >= self.daily_tokens)
+                or (self.daily_cost_usd is not None and usage.cost_usd >= self.daily_cost_usd))
+
+
+class UsageRepo:
+    def __init__(self, table):
+        self.table = table
+
+    def get(self, user_id: str, day: Optional[str] = None) -> DailyUsage:
+        response = self.table.get_item(Key={'user_id': user_id, 'day': day or usage_day()}, ConsistentRead=True)
+        item = response.get('Item') or {}
+        return DailyUsage(tokens=int(item.get('tokens', 0)), cost_usd=float(item.get('cost_usd', 0)))
+
+    def reserve(self, user_id: str, tokens: int, cost_usd: float, quota: UsageQuota,
+                day: Optional[str] = None) -> bool:
+        """
+        Add to a user's usage for the day, but only if the total stays within the quota.
+
+        The check and the addition are one conditional update, so concurrent workers
+        cannot both take the last of a quota.
+
+        Returns:
+            False, with nothing added, if the usage would go over the quota
+        """
+        if (quota.daily_tokens is not None and tokens > quota.daily_tokens) or \
+                (quota.daily_cost_usd is not None and cost_usd > quota.daily_cost_usd):
+            return False
+        day = day or usage_day()
+        conditions = []
+        values = {
+            ':tokens': tokens,
+            ':cost': Decimal(str(cost_usd)),
+            ':expires_at': int(time.time()) + USAGE_RETENTION_DAYS * 24 * 60 * 60,
+        }
+        if quota.daily_tokens is not None:
+            conditions.append('(attribute_not_exists(tokens) OR tokens <= :max_tokens)')
+            values[':max_tokens'] = quota.daily_tokens - tokens
+        if quota.daily_cost_usd is not None:
+            conditions.append('(attribute_not_exists(cost_usd) OR cost_usd <= :max_cost)')
+            values[':max_cost'] = Decimal(str(quota.daily_cost_usd)) - values[':cost']
+
+        update = {
+            'Key': {'user_id': user_id, 'day': day},
+            'UpdateExpression': 'ADD tokens :tokens, cost_usd :cost SET expires_at = :expires_at',
+            'ExpressionAttributeValues': values,
+        }
+        if conditions:
+            update['ConditionExpression'] = ' AND '.join(conditions)
+        try:
+            self.table.update_item(**update)
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            logger.info(f"Daily quota of user {user_id} does not fit another {tokens} tokens")
+            return False
+        return True
+
+    def release(self, user_id: str, tokens: int, cost_usd: float, day: str) -> None:
+        """Give back usage that was reserved but will not be spent."""
+        self.table.update_item(
+            Key={'user_id': user_id, 'day': day},
+            UpdateExpression='ADD tokens :tokens, cost_usd :cost',
+            ExpressionAttributeValues={':tokens': -tokens, ':cost': -Decimal(str(cost_usd))},
+        )
+
+
+dynamodb = boto3.resource('dynamodb')
+usage_table = dynamodb.Table(USAGE_TABLE)
+usage_repo = UsageRepo(usage_table)
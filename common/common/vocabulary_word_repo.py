@@ -1,8 +1,10 @@
+import json
 import time
 import boto3
+from decimal import Decimal
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
 
 from common.constants import VOCABULARY_TABLE
 from common.logger import logger
@@ -13,6 +15,10 @@ class BaseVocabularyWord:
     submission_id: str
     paragraph_number: int
     word: str
+    # The word's frequency in the language; None for words saved before frequencies were
+    language_frequency: Optional[float] = None
+    # Occurrences in the submission
+    count: int = 1
 
 @dataclass
 class NewVocabularyWord(BaseVocabularyWord):
@@ -23,6 +29,12 @@ class VocabularyWord(BaseVocabularyWord):
     created_at: int = int(time.time())
 
 class VocabularyWordRepo:
+    """
+    The vocabulary words of submissions, one item per word, under VOCAB#<submission>#<paragraph>#<word>.
+
+    Words past a paragraph's cap are kept compactly instead, all in one item per paragraph,
+    under VOCAB_MORE#<submission>#<paragraph>.
+    """
     def __init__(self, table):
         self.table = table
 
@@ -38,6 +50,9 @@ class VocabularyWordRepo:
             submission_id=submission_id,
             paragraph_number=int(paragraph_number),
             word=word,
+            language_frequency=(float(item['language_frequency'])
+                                if item.get('language_frequency') is not None else None),
+            count=int(item.get('count', 1)),
             created_at=item.get('created_at'),
         )
 
@@ -49,13 +64,38 @@ class VocabularyWordRepo:
             'submission_paragraph_word': key,
         }
 
+    @staticmethod
+    def _counts(base_record: BaseVocabularyWord) -> Dict[str, Any]:
+        counts: Dict[str, Any] = {'count': base_record.count}
+        if base_record.language_frequency is not None:
+            counts['language_frequency'] = Decimal(str(base_record.language_frequency))
+        return counts
+
+    @staticmethod
+    def _more_key(submission_id: str, paragraph_number: int) -> str:
+        return f"VOCAB_MORE#{submission_id}#{paragraph_number}"
+
+    def _more_items(self, more_words: List[BaseVocabularyWord]) -> List[Dict[str, Any]]:
+        """One item per paragraph, listing its words as [word, language frequency, count]."""
+        by_paragraph: Dict[tuple, List[BaseVocabularyWord]] = {}
+        for word in more_words:
+            by_paragraph.setdefault((word.user_id, word.submission_id, word.paragraph_number), []).append(word)
+        return [{
+            'user_id': user_id,
+            'submission_paragraph_word': self._more_key(submission_id, paragraph_number),
+            'words': json.dumps([[w.word, w.language_frequency, w.count] for w in words], separators=(',', ':')),
+            'created_at': int(time.time()),
+        } for (user_id, submission_id, paragraph_number), words in by_paragraph.items()]
+
     def item_from_new_record_for_insert(self, new_record: NewVocabularyWord) -> Dict[str, Any]:
         item = self._item_from_base_record(new_record)
+        item.update(self._counts(new_record))
         item.update({'created_at': int(time.time())})
         return item
 
     def item_from_record(self, record: VocabularyWord) -> Dict[str, Any]:
         item = self._item_from_base_record(record)
+        item.update(self._counts(record))
         item.update({'created_at': record.created_at})
         return item
 
@@ -64,22 +104,33 @@ class VocabularyWordRepo:
         self.table.put_item(Item=item)
         return item
 
-    def create_many(self, new_vocabulary_words: list[NewVocabularyWord]):
+    def create_many(self, new_vocabulary_words: list[NewVocabularyWord],
+                    more_words: Optional[List[NewVocabularyWord]] = None):
+        """
+        Args:
+            new_vocabulary_words: Words to save one by one
+            more_words: Words past their paragraph's cap, to save in one compact list per paragraph
+        """
         items = []
         with self.table.batch_writer() as batch:
             for new_vocabulary_word in new_vocabulary_words:
                 item = self.item_from_new_record_for_insert(new_vocabulary_word)
                 batch.put_item(Item=item)
                 items.append(item)
+            for item in self._more_items(more_words or []):
+                batch.put_item(Item=item)
 
-    def get_by_submission(self, user_id, submission_id) -> List[VocabularyWord]:
-        response = self.table.query(
-            KeyConditionExpression=Key('user_id').eq(user_id) &
-                                   Key('submission_paragraph_word').begins_with(f"VOCAB#{submission_id}#")
-        )
+    def get_by_submission(self, user_id, submission_id,
+                          max_frequency: Optional[float] = None) -> List[VocabularyWord]:
+        """
+        The vocabulary words of a submission.
 
+        Args:
+            max_frequency: Only return words less frequent than this in the language; words
+                saved without a frequency are always returned
+        """
         vocabulary_words = []
-        for item in response.get('Items', []):
+        for item in self._query_all_items(user_id, submission_id, max_frequency):
             vocabulary_word = self.record_from_item(item)
             if vocabulary_word:
                 vocabulary_words.append(vocabulary_word)
@@ -87,13 +138,103 @@ class VocabularyWordRepo:
                 logger.error(f"Invalid vocabulary_word {item.get('user_id')}/{item.get('submission_paragraph_word')}")
         return vocabulary_words
 
-    def delete_by_submission(self, user_id, submission_id):
-        response = self.table.query(
-            KeyConditionExpression=Key('user_id').eq(user_id) &
-                                   Key('submission_paragraph_word').begins_with(f"VOCAB#{submission_id}#")
-        )
+    def get_more_by_submission(self, user_id, submission_id,
+                               max_frequency: Optional[float] = None) -> List[VocabularyWord]:
+        """
+        The words of a submission past their paragraph's cap.
+
+        Args:
+            max_frequency: Only return words less frequent than this in the language
+        """
+        more_words = []
+        for item in self._query_all_items(user_id, submission_id, prefix='VOCAB_MORE'):
+            paragraph_number = int(item['submission_paragraph_word'].split('#')[2])
+            for word, language_frequency, count in json.loads(item['words']):
+                if max_frequency is None or language_frequency is None or language_frequency < max_frequency:
+                    more_words.append(VocabularyWord(
+                        user_id=item.get('user_id'),
+                        submission_id=submission_id,
+                        paragraph_number=paragraph_number,
+                        word=word,
+                        language_frequency=language_frequency,
+                        count=count,
+                        created_at=item.get('created_at'),
+                    ))
+        return more_words
+
+    def _query_all_items(self, user_id, submission_id,
+                         max_frequency: Optional[float] = None, prefix: str = 'VOCAB') -> List[Dict[str, Any]]:
+        query = {
+            'KeyConditionExpression': Key('user_id').eq(user_id) &
+                                      Key('submission_paragraph_word').begins_with(f"{prefix}#{submission_id}#")
+        }
+        if max_frequency is not None:
+            # Filtered by DynamoDB, so the words above the threshold are not sent back
+            query['FilterExpression'] = (Attr('language_frequency').lt(Decimal(str(max_frequency)))
+                                         | Attr('language_frequency').not_exists())
+        items = []
+        while True:
+            response = self.table.query(**query)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def keep_first_occurrences(self, user_id, submission_id) -> int:
+        """
+        Delete all but the first (lowest paragraph) occurrence of each word in a submission.
+
+        Chunks of a submission are processed independently, so a word can be saved once per chunk;
+        this leaves the same words a whole-file run would have saved, with the counts of all chunks.
+
+        Words past their paragraph's cap count as occurrences too: a word is only kept where
+        it first appears, whether in a paragraph's words or in its "more" list.
+
+        Returns:
+            The number of duplicates deleted
+        """
+        first_paragraph: Dict[str, int] = {}
+        records = [self.record_from_item(item) for item in self._query_all_items(user_id, submission_id)]
+        records = [record for record in records if record]
+        more_words = self.get_more_by_submission(user_id, submission_id)
+        total_counts: Dict[str, int] = {}
+        for record in records + more_words:
+            if record.word not in first_paragraph or record.paragraph_number < first_paragraph[record.word]:
+                first_paragraph[record.word] = record.paragraph_number
+            total_counts[record.word] = total_counts.get(record.word, 0) + record.count
+
+        duplicates = [record for record in records if record.paragraph_number != first_paragraph[record.word]]
+        more_duplicates = [word for word in more_words if word.paragraph_number != first_paragraph[word.word]]
+        duplicated_words = {record.word for record in duplicates + more_duplicates}
+        with self.table.batch_writer() as batch:
+            for record in duplicates:
+                batch.delete_item(Key=self._item_from_base_record(record))
+            for record in records:
+                if record.word in duplicated_words and record.paragraph_number == first_paragraph[record.word]:
+                    record.count = total_counts[record.word]
+                    batch.put_item(Item=self.item_from_record(record))
+
+            # Rewrite the "more" lists that lost or gained occurrences
+            changed_paragraphs = {word.paragraph_number for word in more_words if word.word in duplicated_words}
+            kept_more_words = []
+            for word in more_words:
+                if word.paragraph_number in changed_paragraphs and word.paragraph_number == first_paragraph[word.word]:
+                    word.count = total_counts[word.word]
+                    kept_more_words.append(word)
+            # A batch may not both delete and put the same item: lists that keep words are replaced
+            for paragraph_number in changed_paragraphs - {word.paragraph_number for word in kept_more_words}:
+                batch.delete_item(Key={'user_id': user_id,
+                                       'submission_paragraph_word': self._more_key(submission_id, paragraph_number)})
+            for item in self._more_items(kept_more_words):
+                batch.put_item(Item=item)
+
+        deleted = len(duplicates) + len(more_duplicates)
+        logger.info(f"Deleted {deleted} duplicate vocabulary words from submission {submission_id}")
+        return deleted
 
-        items_to_delete = response.get('Items', [])
+    def delete_by_submission(self, user_id, submission_id):
+        items_to_delete = (self._query_all_items(user_id, submission_id)
+                           + self._query_all_items(user_id, submission_id, prefix='VOCAB_MORE'))
         with self.table.batch_writer() as batch:
             for item in items_to_delete:
                 batch.delete_item(
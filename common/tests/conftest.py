@@ -0,0 +1,41 @@
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from common.constants import SUBMISSIONS_TABLE, VOCABULARY_TABLE
+
+
+def create_table(dynamodb_resource, name, hash_key, range_key=None):
+    key_names = [hash_key] + ([range_key] if range_key else [])
+    return dynamodb_resource.create_table(
+        TableName=name,
+        KeySchema=[{'AttributeName': key, 'KeyType': key_type} for key, key_type in zip(key_names, ['HASH', 'RANGE'])],
+        AttributeDefinitions=[{'AttributeName': key, 'AttributeType': 'S'} for key in key_names],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+@pytest.fixture
+def dynamodb_resource():
+    """A mocked DynamoDB, empty for each test."""
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        yield boto3.resource('dynamodb', region_name='us-east-1')
+
+
+@pytest.fixture
+def submissions_table(dynamodb_resource):
+    return create_table(dynamodb_resource, SUBMISSIONS_TABLE, 'user_id', 'submission_id')
+
+
+@pytest.fixture
+def vocabulary_table(dynamodb_resource):
+    return create_table(dynamodb_resource, VOCABULARY_TABLE, 'user_id', 'submission_paragraph_word')
+
+
+@pytest.fixture
+def cache_table(dynamodb_resource):
+    return create_table(dynamodb_resource, 'cache', 'cache_key')
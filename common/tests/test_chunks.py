@@ -0,0 +1,52 @@
+from common.chunks import ParagraphChunk, plan_chunks, chunk_record, CHUNK_EVENT_NAME
+from common.submission_repo import SubmissionRepo, SubmissionState
+from common.vocabulary_word_repo import VocabularyWordRepo, NewVocabularyWord
+
+
+def test_plan_chunks():
+    chunks = plan_chunks(120, 50)
+    assert [(c.start, c.end) for c in chunks] == [(0, 50), (50, 100), (100, 120)]
+    assert [c.index for c in chunks] == [0, 1, 2]
+    assert all(c.count == 3 for c in chunks)
+
+
+def test_plan_chunks_empty_document():
+    assert plan_chunks(0, 50) == [ParagraphChunk(index=0, count=1, start=0, end=0)]
+
+
+def test_chunk_record_round_trip():
+    chunk = ParagraphChunk(index=1, count=3, start=50, end=100)
+    record = chunk_record('bucket', 'uploads/user/sub.json', chunk)
+    assert record['eventName'] == CHUNK_EVENT_NAME
+    assert record['s3']['object']['key'] == 'uploads/user/sub.json'
+    assert ParagraphChunk.from_record(record) == chunk
+    assert ParagraphChunk.from_record({'s3': {}}) is None
+
+
+def test_mark_chunk_done_completes_once(submissions_table):
+    repo = SubmissionRepo(submissions_table)
+    chunks = plan_chunks(120, 50)
+    stage = SubmissionState.SUMMARIZED
+
+    assert repo.mark_chunk_done('user', 'sub', stage, chunks[2]) is False
+    assert repo.mark_chunk_done('user', 'sub', stage, chunks[0]) is False
+    # Redelivered work item
+    assert repo.mark_chunk_done('user', 'sub', stage, chunks[0]) is False
+    assert repo.mark_chunk_done('user', 'sub', stage, chunks[1]) is True
+    assert repo.mark_chunk_done('user', 'sub', stage, chunks[1]) is False
+    # Stages are tracked separately
+    assert repo.mark_chunk_done('user', 'sub', SubmissionState.VOCABULARIZED, chunks[1]) is False
+
+
+def test_keep_first_occurrences(vocabulary_table):
+    repo = VocabularyWordRepo(vocabulary_table)
+    repo.create_many([
+        NewVocabularyWord(user_id='user', submission_id='sub', paragraph_number=paragraph, word=word)
+        for paragraph, word in [(3, 'arcane'), (60, 'arcane'), (110, 'arcane'), (61, 'zephyr'), (4, 'other')]
+    ] + [NewVocabularyWord(user_id='user', submission_id='sub2', paragraph_number=0, word='arcane')])
+
+    assert repo.keep_first_occurrences('user', 'sub') == 2
+
+    remaining = sorted((w.word, w.paragraph_number) for w in repo.get_by_submission('user', 'sub'))
+    assert remaining == [('arcane', 3), ('other', 4), ('zephyr', 61)]
+    assert len(repo.get_by_submission('user', 'sub2')) == 1
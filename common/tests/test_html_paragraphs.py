@@ -0,0 +1,104 @@
+import io
+
+import pytest
+
+from common.html_paragraphs import paragraphs_from_html, text_blocks_from_html
+
+ARTICLE_PAGE = """
+<html>
+<head><title>Page title</title><style>p { color: red; }</style></head>
+<body>
+  <header><p>Site name and a tagline that should not be kept</p></header>
+  <nav><ul><li><a href="/">Home</a></li><li><a href="/about">About</a></li></ul></nav>
+  <div id="content">
+    <article>
+      <p>The first paragraph of the article explains what the article is about.</p>
+      <p>The second paragraph has a <a href="/x">link</a> in it, but is mostly text.</p>
+      <script>var tracking = "not text";</script>
+    </article>
+    <div class="sidebar"><p>Related reading that lives in the sidebar of the page.</p></div>
+  </div>
+  <div class="links"><p><a href="/a">One link</a> <a href="/b">Another link</a></p></div>
+  <footer><p>Copyright 2024, all rights reserved by the publisher.</p></footer>
+</body>
+</html>
+"""
+
+POEM_PAGE = """
+<html><body>
+<div class="poem">
+  <div>The first line of the poem,<br/></div>
+  <div>The second line of the poem.<br/></div>
+  <div><br/></div>
+  <div>A new stanza begins here,<br/></div>
+  <div>And ends right here.<br/></div>
+</div>
+</body></html>
+"""
+
+
+def test_keeps_main_article_paragraphs():
+    assert paragraphs_from_html(ARTICLE_PAGE) == [
+        "The first paragraph of the article explains what the article is about.",
+        "The second paragraph has a link in it, but is mostly text.",
+    ]
+
+
+def test_joins_lines_into_stanzas():
+    assert paragraphs_from_html(POEM_PAGE) == [
+        "The first line of the poem, The second line of the poem.",
+        "A new stanza begins here, And ends right here.",
+    ]
+
+
+def test_selector_restricts_to_matching_element():
+    paragraphs = paragraphs_from_html(ARTICLE_PAGE, selector='#content')
+    assert "Related reading that lives in the sidebar of the page." not in paragraphs
+    assert len(paragraphs) == 2
+
+
+def test_selector_without_content_falls_back_to_density():
+    assert paragraphs_from_html(ARTICLE_PAGE, selector='div.links') == paragraphs_from_html(ARTICLE_PAGE)
+
+
+@pytest.mark.parametrize("selector", [
+    'body div#content',
+    'body > div > article',
+    'div[id=content] article',
+    '[id^=cont] > article',
+    'nav, #content article',
+])
+def test_selector_with_combinators_and_attributes(selector):
+    assert paragraphs_from_html(ARTICLE_PAGE, selector=selector) == paragraphs_from_html(ARTICLE_PAGE, '#content')
+
+
+def test_selector_must_match_ancestors():
+    blocks = text_blocks_from_html(ARTICLE_PAGE, selector='nav > article, header div p, div.links > p')
+    selected = [block.text for block in blocks if block.in_selection and block.text]
+    assert selected == ["One link Another link"]
+
+
+@pytest.mark.parametrize("selector", ['div:first-child', 'h1 + p', 'div >', '> div', '[data-x=]'])
+def test_unsupported_selectors_are_refused(selector):
+    with pytest.raises(ValueError):
+        text_blocks_from_html(ARTICLE_PAGE, selector=selector)
+
+
+@pytest.mark.parametrize("source", ['', b'', io.BytesIO(b''), io.StringIO(''), iter(['', b''])])
+def test_empty_document_has_no_paragraphs(source):
+    assert paragraphs_from_html(source) == []
+
+
+def test_accepts_file_handles_and_chunks():
+    expected = paragraphs_from_html(ARTICLE_PAGE)
+    assert paragraphs_from_html(io.BytesIO(ARTICLE_PAGE.encode('utf-8'))) == expected
+
+    chunks = [ARTICLE_PAGE[i:i + 7] for i in range(0, len(ARTICLE_PAGE), 7)]
+    assert paragraphs_from_html(iter(chunks)) == expected
+
+
+def test_text_blocks_mark_boilerplate_and_links():
+    blocks = {b.text: b for b in text_blocks_from_html(ARTICLE_PAGE) if b.text}
+    assert blocks["Copyright 2024, all rights reserved by the publisher."].boilerplate
+    assert not blocks["One link Another link"].is_content()
+    assert "var tracking" not in " ".join(blocks)
@@ -0,0 +1,69 @@
+import json
+import logging
+import urllib.request
+
+import pytest
+
+from common import metrics
+from common.metrics import MetricsRegistry
+
+
+def test_counter_renders_in_prometheus_format():
+    registry = MetricsRegistry()
+    counter = registry.counter('jobs_total', 'Jobs done', ('service', 'outcome'))
+    counter.inc(service='vocabulary', outcome='ok')
+    counter.inc(2, service='vocabulary', outcome='ok')
+    counter.inc(service='say "hi"\n', outcome='error')
+    assert registry.counter('jobs_total', 'Jobs done', ('service', 'outcome')) is counter
+    assert registry.render().splitlines() == [
+        '# HELP jobs_total Jobs done',
+        '# TYPE jobs_total counter',
+        'jobs_total{service="say \\"hi\\"\\n",outcome="error"} 1',
+        'jobs_total{service="vocabulary",outcome="ok"} 3',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('job_seconds', 'Job time', ('stage',), buckets=(0.1, 1))
+    for seconds in (0.05, 0.1, 0.5, 3):
+        histogram.observe(seconds, stage='tagging')
+    assert registry.render().splitlines()[2:] == [
+        'job_seconds_bucket{stage="tagging",le="0.1"} 2',
+        'job_seconds_bucket{stage="tagging",le="1"} 3',
+        'job_seconds_bucket{stage="tagging",le="+Inf"} 4',
+        'job_seconds_sum{stage="tagging"} 3.65',
+        'job_seconds_count{stage="tagging"} 4',
+    ]
+
+
+def test_labels_must_match():
+    counter = MetricsRegistry().counter('jobs_total', 'Jobs done', ('service',))
+    with pytest.raises(ValueError):
+        counter.inc(stage='tagging')
+
+
+def test_stage_records_outcome_and_logs(monkeypatch, caplog):
+    monkeypatch.setenv('METRICS_LOG', '1')
+    caplog.set_level(logging.INFO)
+    metrics.configure_metrics('test-service')
+    with metrics.stage('ok_stage'):
+        pass
+    with pytest.raises(RuntimeError):
+        with metrics.stage('failing_stage'):
+            raise RuntimeError("boom")
+
+    assert metrics.STAGE_SECONDS.count(service='test-service', stage='ok_stage', outcome='ok') == 1
+    assert metrics.STAGE_SECONDS.count(service='test-service', stage='failing_stage', outcome='error') == 1
+    logged = [json.loads(record.getMessage()) for record in caplog.records if record.getMessage().startswith('{')]
+    assert [(line['stage'], line['outcome']) for line in logged] == [('ok_stage', 'ok'), ('failing_stage', 'error')]
+
+
+def test_metrics_endpoint():
+    metrics.configure_metrics('test-service')
+    metrics.count_items('extract_vocabulary', 'words', 7)
+    server = metrics.serve_metrics(0, host='127.0.0.1')
+    with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+        assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        body = response.read().decode('utf-8')
+    assert 'worker_stage_items_total{service="test-service",stage="extract_vocabulary",item="words"} 7' in body
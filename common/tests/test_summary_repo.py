@@ -6,7 +6,6 @@ from common.summary_repo import SummaryRepo, NewSummary, Summary
 from common.constants import SUMMARIES_TABLE
 
 @pytest.fixture(scope="module")
-@mock_aws
 def aws_credentials():
     """Mocked AWS Credentials for boto3."""
     os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
@@ -14,7 +13,8 @@ def aws_credentials():
     os.environ['AWS_SECURITY_TOKEN'] = 'testing'
     os.environ['AWS_SESSION_TOKEN'] = 'testing'
     os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
-    yield
+    with mock_aws():
+        yield
     # Clean up
     del os.environ['AWS_ACCESS_KEY_ID']
     del os.environ['AWS_SECRET_ACCESS_KEY']
@@ -193,4 +193,15 @@ def test_get_by_submission(dynamodb_table):
         assert summary.paragraph_start == f'Start {i}'
         assert summary.summary == f'Summary {i}'
 
+
+def test_get_paragraph_numbers(summary_repo):
+    summary_repo.save_many([
+        NewSummary(user_id=1, submission_id='sub1', paragraph_number=i, paragraph_start='', summary=f'Summary {i}')
+        for i in (0, 2, 11)
+    ])
+    summary_repo.create(NewSummary(user_id=1, submission_id='sub2', paragraph_number=5, paragraph_start='', summary=''))
+
+    assert summary_repo.get_paragraph_numbers(1, 'sub1') == {0, 2, 11}
+    assert summary_repo.get_paragraph_numbers(1, 'nope') == set()
+
 # Additional tests for other methods can be added here following a similar pattern.
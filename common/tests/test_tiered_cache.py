@@ -0,0 +1,84 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from common.tiered_cache import DynamoCache, KeyValueCache, SqliteCache, TieredCache, build_tiered_cache
+
+
+class BrokenCache(KeyValueCache):
+    def get_many(self, keys):
+        raise RuntimeError("unavailable")
+
+    def put_many(self, entries):
+        raise RuntimeError("unavailable")
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    return SqliteCache(str(tmp_path / "cache.sqlite3"), 'summaries', 'summary')
+
+
+def test_sqlite_cache_expires_entries(sqlite_cache):
+    sqlite_cache.put_many({"a": "summary a"})
+    assert sqlite_cache.get_many(["a", "b"]) == {"a": "summary a"}
+
+    with patch("common.tiered_cache.time.time", return_value=time.time() + sqlite_cache.ttl_seconds + 1):
+        assert sqlite_cache.get_many(["a"]) == {}
+
+
+def test_sqlite_caches_share_a_file_by_table(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    summaries = SqliteCache(path, 'summaries', 'summary')
+    words = SqliteCache(path, 'paragraph_words', 'words')
+    summaries.put_many({"a": "summary a"})
+    words.put_many({"a": "[]"})
+    assert summaries.get_many(["a"]) == {"a": "summary a"}
+    assert words.get_many(["a"]) == {"a": "[]"}
+
+
+def test_dynamo_cache(cache_table):
+    cache = DynamoCache(cache_table, 'summary')
+    cache.put_many({f"key{i}": f"summary {i}" for i in range(150)})
+
+    found = cache.get_many([f"key{i}" for i in range(0, 200, 10)])
+    assert found == {f"key{i}": f"summary {i}" for i in range(0, 150, 10)}
+    assert cache_table.get_item(Key={'cache_key': 'key0'})['Item']['summary'] == "summary 0"
+
+
+def test_dynamo_cache_with_repeated_keys(cache_table):
+    cache = DynamoCache(cache_table, 'summary')
+    cache.put_many({"a": "summary a"})
+    assert cache.get_many(["a", "b", "a"]) == {"a": "summary a"}
+
+
+def test_tiered_cache_backfills_faster_tiers(sqlite_cache, cache_table):
+    shared = DynamoCache(cache_table, 'summary')
+    shared.put_many({"a": "summary a"})
+    cache = TieredCache([sqlite_cache, shared])
+
+    assert cache.get_many(["a", "b"]) == {"a": "summary a"}
+    assert sqlite_cache.get_many(["a"]) == {"a": "summary a"}
+
+
+def test_tiered_cache_survives_broken_tier(sqlite_cache):
+    cache = TieredCache([BrokenCache(), sqlite_cache])
+    cache.put_many({"a": "summary a"})
+    assert cache.get_many(["a"]) == {"a": "summary a"}
+
+
+def test_build_tiered_cache(tmp_path, cache_table):
+    assert build_tiered_cache('Summary cache', 'summary', None, 'summaries') is None
+    cache = build_tiered_cache('Summary cache', 'summary', str(tmp_path / "cache.sqlite3"), 'summaries',
+                               cache_table, ttl_seconds=60)
+    assert [type(tier) for tier in cache.tiers] == [SqliteCache, DynamoCache]
+    assert all(tier.ttl_seconds == 60 for tier in cache.tiers)
+
+
+def test_incomplete_tier_cannot_be_created():
+    class WriteOnlyCache(KeyValueCache):
+        def put_many(self, entries):
+            pass
+
+    with pytest.raises(TypeError):
+        WriteOnlyCache()
@@ -0,0 +1,67 @@
+import pytest
+
+from common.vocabulary_word_repo import VocabularyWordRepo, NewVocabularyWord
+
+
+@pytest.fixture
+def repo(vocabulary_table):
+    return VocabularyWordRepo(vocabulary_table)
+
+
+def new_word(paragraph, word, frequency=None, count=1):
+    return NewVocabularyWord(user_id='user', submission_id='sub', paragraph_number=paragraph, word=word,
+                             language_frequency=frequency, count=count)
+
+
+def test_frequency_and_count_round_trip(repo):
+    repo.create_many([new_word(0, 'arcane', 3.02e-06, 4)])
+    [word] = repo.get_by_submission('user', 'sub')
+    assert (word.word, word.language_frequency, word.count) == ('arcane', 3.02e-06, 4)
+
+
+def test_get_by_submission_below_threshold(repo):
+    repo.create_many([
+        new_word(0, 'arcane', 3.02e-06),
+        new_word(0, 'harbor', 5.5e-05),
+        new_word(1, 'market', 9.12e-05),
+        # Saved before frequencies were
+        new_word(1, 'zephyr'),
+    ])
+    assert sorted(w.word for w in repo.get_by_submission('user', 'sub', 2e-05)) == ['arcane', 'zephyr']
+    assert sorted(w.word for w in repo.get_by_submission('user', 'sub', 6e-05)) == ['arcane', 'harbor', 'zephyr']
+    assert len(repo.get_by_submission('user', 'sub')) == 4
+
+
+def test_keep_first_occurrences_sums_counts(repo):
+    repo.create_many([new_word(3, 'arcane', 3.02e-06, 2), new_word(60, 'arcane', 3.02e-06, 5),
+                      new_word(61, 'zephyr', 1e-06, 1)])
+    assert repo.keep_first_occurrences('user', 'sub') == 1
+    words = {w.word: (w.paragraph_number, w.count, w.language_frequency) for w in repo.get_by_submission('user', 'sub')}
+    assert words == {'arcane': (3, 7, 3.02e-06), 'zephyr': (61, 1, 1e-06)}
+
+
+def test_more_words_are_saved_compactly(repo):
+    repo.create_many([new_word(0, 'arcane', 3.02e-06)],
+                     more_words=[new_word(0, 'harbor', 5.5e-05, 2), new_word(0, 'zenith', 1e-05)])
+    assert [w.word for w in repo.get_by_submission('user', 'sub')] == ['arcane']
+    more = repo.get_more_by_submission('user', 'sub')
+    assert [(w.word, w.paragraph_number, w.language_frequency, w.count) for w in more] == [
+        ('harbor', 0, 5.5e-05, 2), ('zenith', 0, 1e-05, 1)]
+    assert [w.word for w in repo.get_more_by_submission('user', 'sub', 2e-05)] == ['zenith']
+
+    repo.delete_by_submission('user', 'sub')
+    assert repo.get_more_by_submission('user', 'sub') == []
+
+
+def test_keep_first_occurrences_across_more_lists(repo):
+    # Chunk 1 had too many words in paragraph 3; chunk 2 found some of them again
+    repo.create_many([new_word(3, 'arcane', 3.02e-06, 2)],
+                     more_words=[new_word(3, 'harbor', 5.5e-05, 1), new_word(3, 'zenith', 1e-05, 1)])
+    repo.create_many([new_word(60, 'harbor', 5.5e-05, 4), new_word(60, 'arcane', 3.02e-06, 1)],
+                     more_words=[new_word(60, 'zenith', 1e-05, 2), new_word(60, 'vortex', 2e-06, 1)])
+
+    assert repo.keep_first_occurrences('user', 'sub') == 3
+    assert {(w.word, w.paragraph_number, w.count) for w in repo.get_by_submission('user', 'sub')} == {
+        ('arcane', 3, 3)}
+    assert {(w.word, w.paragraph_number, w.count) for w in repo.get_more_by_submission('user', 'sub')} == {
+        ('harbor', 3, 5), ('zenith', 3, 3), ('vortex', 60, 1)}
@@ -102,3 +102,89 @@ resource "aws_dynamodb_table" "vocabulary_words" {
 
   tags = local.common_tags
 }
+
+# 5. Summary Cache Table
+resource "aws_dynamodb_table" "summary_cache" {
+  name         = "history_learning_summary_cache"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "cache_key"
+
+  attribute {
+    # sha256 of (normalized paragraph, subject, model, prompt version)
+    name = "cache_key"
+    type = "S"
+  }
+
+  # `summary` is expected here also
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = local.common_tags
+}
+
+resource "aws_dynamodb_table" "rate_limits" {
+  name         = "history_learning_rate_limits"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "bucket_key"
+
+  attribute {
+    # One token bucket per rate-limited account/model, e.g. "openai"
+    name = "bucket_key"
+    type = "S"
+  }
+
+  # `requests`, `tokens`, `updated_at`, `blocked_until` and `version` are expected here also
+
+  tags = local.common_tags
+}
+
+resource "aws_dynamodb_table" "usage" {
+  name         = "history_learning_usage"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "user_id"
+  range_key    = "day"
+
+  attribute {
+    name = "user_id"
+    type = "S"
+  }
+
+  attribute {
+    # UTC date like "2025-01-31": daily quotas reset at midnight UTC
+    name = "day"
+    type = "S"
+  }
+
+  # `tokens` and `cost_usd` (estimated summary usage) are expected here also
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = local.common_tags
+}
+
+resource "aws_dynamodb_table" "vocabulary_cache" {
+  name         = "history_learning_vocabulary_cache"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "cache_key"
+
+  attribute {
+    # sha256 of (paragraph, language, threshold, tokenizer, extractor version)
+    name = "cache_key"
+    type = "S"
+  }
+
+  # `words` (the paragraph's vocabulary as JSON) is expected here also
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = local.common_tags
+}
@@ -16,12 +16,16 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from common.constants import SUBMISSIONS_TABLE, VOCABULARY_TABLE, SUMMARIES_TABLE
+from common.constants import SUBMISSIONS_TABLE, VOCABULARY_TABLE, SUMMARIES_TABLE, SUMMARIES_PER_SUBMISSION_LIMIT, \
+    VOCABULARY_COMMON_THRESHOLD, VOCABULARY_STORED_THRESHOLD
 from common.envvar import environment
 from common.logger import logger
 from common.summary_repo import SummaryRepo
 from common.vocabulary_word_repo import VocabularyWordRepo, VocabularyWord
 from common.submission_repo import submission_repo, NewSubmission, SubmissionState, SubmissionRepo, SUBMISSION_COMPLETED
+from common.usage_repo import UsageQuota, seconds_until_next_day, usage_repo
+from common.metrics import configure_metrics
+from request_metrics import init_request_metrics, instrument_boto_client, span
 
 # Flask app setup
 app = Flask(__name__)
@@ -34,6 +38,11 @@ app.config['COGNITO_CHECK_TOKEN_EXPIRATION'] = True
 
 cognito = CognitoAuth(app)
 
+# Time requests by route, with their DynamoDB, S3 and HTTP calls. Configured on import,
+# so that the metrics are exported however the app is served, not only by app.run below
+configure_metrics('api')
+init_request_metrics(app)
+
 IS_LOCAL = not environment.is_prod()
 AWS_REGION = environment.require('AWS_REGION')
 SUBMISSIONS_BUCKET = environment.require('SUBMISSIONS_BUCKET')
@@ -50,6 +59,9 @@ CORS(app, origins=CORS_ORIGINS,
 # Max file size
 MAX_BYTES = 100 * 1024 * 1024  # 100 MB
 
+# Daily summary quota per user; uploads are refused once it is used up
+USAGE_QUOTA = UsageQuota.from_environment()
+
 # Initialize AWS Clients
 dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
 s3_client = boto3.client("s3", region_name=AWS_REGION)
@@ -59,6 +71,10 @@ submissions_table = dynamodb.Table(SUBMISSIONS_TABLE)
 vocab_table = dynamodb.Table(VOCABULARY_TABLE)
 summary_table = dynamodb.Table(SUMMARIES_TABLE)
 
+# Including the clients of the shared repos, which have their own
+for client in (dynamodb.meta.client, s3_client, submission_repo.table.meta.client, usage_repo.table.meta.client):
+    instrument_boto_client(client)
+
 # decorator to only apply cognito in prod
 def conditional_cognito_auth(f):
     if not IS_LOCAL:
@@ -87,9 +103,11 @@ def submitted_file_content(req) -> tuple[bytes, None]|tuple[None, tuple[Response
         content_bytes = uploaded_file.read()
     elif input_url:
         try:
-            response = requests.get(input_url, timeout=10)
-            response.raise_for_status()
-            content_bytes = response.content
+            with span('url', 'GET') as call:
+                response = requests.get(input_url, timeout=10)
+                response.raise_for_status()
+                content_bytes = response.content
+                call.bytes = len(content_bytes)
         except Exception as e:
             return None, (jsonify({"error": f"Failed to download URL: {str(e)}"}), 400)
     elif input_text:
@@ -138,6 +156,15 @@ def generate_upload_url():
     if not user_id or not file_name or not file_hash:
         return jsonify({"error": "Missing required fields: user_id, file_name, content_preview"}), 400
 
+    # Refuse new work before it enters the pipeline, rather than leaving it unsummarized
+    if not USAGE_QUOTA.unlimited and USAGE_QUOTA.exhausted(usage_repo.get(user_id)):
+        retry_after = seconds_until_next_day()
+        logger.info(f"User {user_id} is over the daily summary quota; refusing upload")
+        response = jsonify({"error": "Daily summary quota used up, try again tomorrow",
+                            "retry_after": retry_after})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+
     # Compute deterministic hash using user_id + content preview
     s3_key = f"uploads/{user_id}/{file_hash}{file_extension}"
 
@@ -195,28 +222,66 @@ def get_submission_summaries(user_id, submission_id):
     return summaries
 
 def group_by_paragraph(vocabulary_words: List[VocabularyWord]) -> Dict[int, List[str]]:
+    """The words of each paragraph, by language frequency (highest first), as extracted."""
     grouped_by_paragraph = {}
     for vocabulary_word in vocabulary_words:
         if vocabulary_word.paragraph_number not in grouped_by_paragraph:
             grouped_by_paragraph[vocabulary_word.paragraph_number] = []
-        grouped_by_paragraph[vocabulary_word.paragraph_number].append(vocabulary_word.word)
-    return grouped_by_paragraph
+        grouped_by_paragraph[vocabulary_word.paragraph_number].append(vocabulary_word)
+    return {
+        # Words saved without a frequency were below the default threshold; they go last
+        paragraph_number: [w.word for w in sorted(words, key=lambda w: w.language_frequency or 0.0, reverse=True)]
+        for paragraph_number, words in grouped_by_paragraph.items()
+    }
+
+def requested_threshold(req) -> float|None:
+    """
+    The common-word threshold asked for with ?threshold=, or the default.
+
+    Words are only saved below VOCABULARY_STORED_THRESHOLD, so higher thresholds show the same words as it.
+    Returns None if the parameter is not a positive number.
+    """
+    value = req.args.get('threshold')
+    if value is None:
+        return VOCABULARY_COMMON_THRESHOLD
+    try:
+        threshold = float(value)
+    except ValueError:
+        return None
+    if not threshold > 0:
+        return None
+    return min(threshold, VOCABULARY_STORED_THRESHOLD)
 
 @app.route("/api/files/<submission_id>/details", methods=["GET"])
 @conditional_cognito_auth
 def get_submission_details(submission_id):
     logger.info(f'get_submission_details ${submission_id}')
 
-    """Returns the first 10 words, vocabulary, and summary for each paragraph of a submission."""
+    """
+    Returns the first 10 words, vocabulary, and summary for each paragraph of a submission.
+
+    The vocabulary is the words less frequent in the language than `threshold` (a query
+    parameter, up to `max_threshold`), by frequency, highest first. Paragraphs with more
+    words than the vocabulary service keeps per paragraph list the others in `more_vocabulary`.
+
+    While the submission is still being processed, returns whatever has been saved so far,
+    with `complete` false and the summarization progress.
+    """
     user_id = get_user_id()
+    threshold = requested_threshold(request)
+    if threshold is None:
+        return jsonify({"error": "threshold must be a positive number"}), 400
 
     submission = SubmissionRepo(submissions_table).get_by_id(user_id, submission_id)
-    if submission.state != SUBMISSION_COMPLETED:
-        return jsonify({"submission_id": submission_id, "error": f"Submission not ready yet. Try again later."}), 503
+    if not submission:
+        return jsonify({"error": "Submission not found"}), 404
+    complete = submission.state == SUBMISSION_COMPLETED
 
     # Fetch vocabulary from DynamoDB
     try:
-        vocab_data = VocabularyWordRepo(vocab_table).get_by_submission(user_id, submission_id)
+        vocabulary_word_repo = VocabularyWordRepo(vocab_table)
+        vocab_data = vocabulary_word_repo.get_by_submission(user_id, submission_id, threshold)
+        more_vocab_data = vocabulary_word_repo.get_more_by_submission(user_id, submission_id, threshold)
     except Exception as e:
         logger.error(e, exc_info=True)
         return jsonify({"submission_id": submission_id, "error": f"DynamoDB error: {str(e)}"}), 500
@@ -228,21 +293,35 @@ def get_submission_details(submission_id):
         return jsonify({"submission_id": submission_id, "error": f"DynamoDB error: {str(e)}"}), 500
 
     words_by_paragraph = group_by_paragraph(vocab_data)
+    more_words_by_paragraph = group_by_paragraph(more_vocab_data)
     summaries_by_paragraph = {}
     for summary in summaries:
         summaries_by_paragraph[summary.paragraph_number] = summary
 
-    # Combine data
+    # Combine data. Paragraphs may be missing from either, e.g. while chunks are still being processed
     details = []
-    paragraph_count = max(len(words_by_paragraph), len(summaries_by_paragraph.keys()))
+    paragraph_count = max([-1, *words_by_paragraph.keys(), *more_words_by_paragraph.keys(),
+                           *summaries_by_paragraph.keys()]) + 1
     for i in range(paragraph_count):
         details.append({
             "paragraph_index": i,
             "vocabulary": words_by_paragraph.get(i, []),
+            # Words past the paragraph's cap, ranked lower
+            "more_vocabulary": more_words_by_paragraph.get(i, []),
             "summary": summaries_by_paragraph[i].summary if i in summaries_by_paragraph else "",
             "paragraph_start": summaries_by_paragraph[i].paragraph_start if i in summaries_by_paragraph else "",
         })
-    return jsonify({"submission_id": submission_id, "details": details})
+
+    response = {"submission_id": submission_id, "details": details, "complete": complete,
+                "threshold": threshold, "max_threshold": VOCABULARY_STORED_THRESHOLD}
+    if not complete:
+        response["progress"] = {
+            "summarized": submission.summarized_count,
+            # Unknown until the paragraphs have been extracted
+            "to_summarize": (min(int(submission.paragraph_count), SUMMARIES_PER_SUBMISSION_LIMIT + 1)
+                             if submission.paragraph_count is not None else None),
+        }
+    return jsonify(response)
 
 @app.route("/api/files/<submission_id>/text", methods=["GET"])
 @conditional_cognito_auth
@@ -321,10 +400,12 @@ def get_submissions_list():
 def get_word_definition(word):
     """Proxy to dictionaryapi.dev to get the definition of a word."""
     try:
-        resp = requests.get(
-            f"https://api.dictionaryapi.dev/api/v2/entries/en/{word}",
-            timeout=10
-        )
+        with span('dictionaryapi', 'GET entries') as call:
+            resp = requests.get(
+                f"https://api.dictionaryapi.dev/api/v2/entries/en/{word}",
+                timeout=10
+            )
+            call.bytes = len(resp.content)
         if resp.status_code != 200:
             return jsonify({"error": f"DictionaryAPI error: {resp.status_code}"}), resp.status_code
         data = resp.json()
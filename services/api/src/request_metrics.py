@@ -0,0 +1,173 @@
+"""
+Per-route request timing for the API
+
+Every request is timed into a histogram labelled with its route (the URL rule, not the
+URL, so that submissions share one series), method and status. The downstream calls a
+request makes are timed as spans: DynamoDB and S3 calls through boto3's event hooks on
+the instrumented clients, other HTTP calls with span(). Each span records its duration
+and, where known, the items or bytes it returned, labelled with the route it served.
+
+Requests slower than SLOW_REQUEST_SECONDS are logged with their spans and the time
+spent outside them, as one JSON line. The metrics are exported with the rest of the
+process's on METRICS_PORT (see common.metrics).
+"""
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from flask import Flask, Response, g, has_request_context, request
+
+from common.envvar import environment
+from common.logger import logger
+from common.metrics import registry
+
+# Requests taking longer than this are logged with a breakdown of where the time went
+SLOW_REQUEST_SECONDS = (float(environment.require('SLOW_REQUEST_SECONDS'))
+                        if environment.has('SLOW_REQUEST_SECONDS') else 1.0)
+
+REQUEST_SECONDS = registry.histogram(
+    'api_request_seconds', 'Time to serve API requests', ('route', 'method', 'status'))
+DOWNSTREAM_SECONDS = registry.histogram(
+    'api_downstream_seconds', 'Time of the downstream calls made while serving API requests',
+    ('route', 'target', 'operation', 'outcome'))
+DOWNSTREAM_ITEMS = registry.counter(
+    'api_downstream_items_total', 'Items (e.g. DynamoDB items) returned by downstream calls',
+    ('route', 'target', 'operation'))
+DOWNSTREAM_BYTES = registry.counter(
+    'api_downstream_bytes_total', 'Bytes returned by downstream calls', ('route', 'target', 'operation'))
+
+
+@dataclass
+class Span:
+    """One downstream call. The caller may set items and bytes while it is timed."""
+    target: str
+    operation: str
+    seconds: float = 0.0
+    outcome: str = 'ok'
+    items: Optional[int] = None
+    bytes: Optional[int] = None
+
+    def as_dict(self) -> dict:
+        entry = {'target': self.target, 'operation': self.operation, 'seconds': round(self.seconds, 4)}
+        if self.outcome != 'ok':
+            entry['outcome'] = self.outcome
+        if self.items is not None:
+            entry['items'] = self.items
+        if self.bytes is not None:
+            entry['bytes'] = self.bytes
+        return entry
+
+
+def current_route() -> str:
+    """The URL rule of the request being served; "unmatched" for 404s, "none" outside requests."""
+    if not has_request_context():
+        return 'none'
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def record_span(call: Span) -> None:
+    route = current_route()
+    DOWNSTREAM_SECONDS.observe(call.seconds, route=route, target=call.target, operation=call.operation,
+                               outcome=call.outcome)
+    if call.items is not None:
+        DOWNSTREAM_ITEMS.inc(call.items, route=route, target=call.target, operation=call.operation)
+    if call.bytes is not None:
+        DOWNSTREAM_BYTES.inc(call.bytes, route=route, target=call.target, operation=call.operation)
+    if has_request_context() and 'request_spans' in g:
+        g.request_spans.append(call)
+
+
+@contextmanager
+def span(target: str, operation: str) -> Iterator[Span]:
+    """Time a downstream call, labelled with its outcome: "ok", or "error" if it raises."""
+    current = Span(target, operation)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.outcome = 'error'
+        raise
+    finally:
+        current.seconds = time.perf_counter() - started
+        record_span(current)
+
+
+def _returned_items(parsed: dict) -> Optional[int]:
+    if 'Count' in parsed:
+        return parsed['Count']
+    if 'Item' in parsed:
+        return 1
+    if 'Responses' in parsed:
+        return sum(len(items) for items in parsed['Responses'].values())
+    return None
+
+
+def _before_call(model, context, **_):
+    # after-call-error is emitted without the operation model, so the span is labelled from here
+    context['metrics_operation'] = (model.service_model.service_name, model.name)
+    context['metrics_started'] = time.perf_counter()
+
+
+def _after_call(http_response, parsed, model, context, **_):
+    started = context.pop('metrics_started', None)
+    context.pop('metrics_operation', None)
+    if started is None:
+        return
+    call = Span(model.service_model.service_name, model.name, time.perf_counter() - started,
+                outcome='ok' if http_response.status_code < 300 else 'error', items=_returned_items(parsed))
+    if model.has_streaming_output:
+        # The body has not been read yet: reading it is up to the caller
+        call.bytes = parsed.get('ContentLength')
+    else:
+        call.bytes = len(http_response.content)
+    record_span(call)
+
+
+def _after_call_error(context, **_):
+    """A call that failed without an HTTP response, e.g. on a connection error or timeout."""
+    started = context.pop('metrics_started', None)
+    target, operation = context.pop('metrics_operation', ('unknown', 'unknown'))
+    if started is None:
+        return
+    record_span(Span(target, operation, time.perf_counter() - started, outcome='error'))
+
+
+def instrument_boto_client(client) -> None:
+    """Time every call a boto3 client makes as a span. Instrumenting a client again has no effect."""
+    events = client.meta.events
+    events.register('before-call', _before_call, unique_id='request_metrics.before_call')
+    events.register('after-call', _after_call, unique_id='request_metrics.after_call')
+    events.register('after-call-error', _after_call_error, unique_id='request_metrics.after_call_error')
+
+
+def _start_request() -> None:
+    g.request_started = time.perf_counter()
+    g.request_spans = []
+
+
+def _finish_request(response: Response) -> Response:
+    started = g.pop('request_started', None)
+    spans: List[Span] = g.pop('request_spans', [])
+    if started is None:
+        return response
+    seconds = time.perf_counter() - started
+    route = current_route()
+    REQUEST_SECONDS.observe(seconds, route=route, method=request.method, status=str(response.status_code))
+    if seconds >= SLOW_REQUEST_SECONDS:
+        downstream_seconds = sum(s.seconds for s in spans)
+        logger.warning(json.dumps({
+            'metric': 'slow_request', 'route': route, 'method': request.method, 'path': request.path,
+            'status': response.status_code, 'seconds': round(seconds, 4),
+            'downstream_seconds': round(downstream_seconds, 4),
+            'other_seconds': round(max(seconds - downstream_seconds, 0.0), 4),
+            'spans': [s.as_dict() for s in spans],
+        }))
+    return response
+
+
+def init_request_metrics(app: Flask) -> None:
+    """Time every request of the app, and collect the spans of its downstream calls."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,48 @@
+import socket
+
+import boto3
+import pytest
+from botocore.config import Config
+from botocore.exceptions import EndpointConnectionError
+from flask import Flask, g
+
+from request_metrics import Span, init_request_metrics, instrument_boto_client, span
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    init_request_metrics(app)
+    return app
+
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_failed_boto_call_is_recorded_and_reraised(app):
+    client = boto3.client('dynamodb', region_name='us-east-1', endpoint_url=f"http://127.0.0.1:{closed_port()}",
+                          aws_access_key_id='testing', aws_secret_access_key='testing',
+                          config=Config(retries={'max_attempts': 0}, connect_timeout=1))
+    instrument_boto_client(client)
+
+    with app.test_request_context('/'):
+        g.request_spans = []
+        with pytest.raises(EndpointConnectionError):
+            client.get_item(TableName='submissions', Key={'user_id': {'S': 'u1'}})
+        [call] = g.request_spans
+    assert (call.target, call.operation, call.outcome) == ('dynamodb', 'GetItem', 'error')
+
+
+def test_span_records_errors(app):
+    with app.test_request_context('/'):
+        g.request_spans = []
+        with pytest.raises(ValueError):
+            with span('http', 'dictionary'):
+                raise ValueError("down")
+        with span('http', 'dictionary') as call:
+            call.bytes = 10
+        assert [(s.outcome, s.bytes) for s in g.request_spans] == [('error', None), ('ok', 10)]
+        assert all(isinstance(s, Span) and s.seconds >= 0 for s in g.request_spans)
@@ -0,0 +1,46 @@
+"""
+Benchmark HTML paragraph extraction on the Poetry Foundation fixture.
+
+Compares the shared lxml-based engine against the previous BeautifulSoup
+`html.parser` extraction of every `<p>` tag.
+
+Usage:
+    poetry run python benchmarks/html_paragraphs.py [path/to/page.html] [repeats]
+"""
+import os
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+from common.html_paragraphs import paragraphs_from_html
+
+here = os.path.dirname(__file__)
+DEFAULT_FIXTURE = f"{here}/../tests/fixtures/Eloisa to Abelard _ The Poetry Foundation.html"
+
+
+def soup_paragraphs(html: bytes):
+    soup = BeautifulSoup(html, "html.parser")
+    return [p.text for p in soup.find_all('p')]
+
+
+def report(name, fn, html: bytes, repeats: int):
+    paragraphs = fn(html)
+    seconds = min(timeit.repeat(lambda: fn(html), number=1, repeat=repeats))
+    chars = sum(len(p) for p in paragraphs)
+    print(f"{name:<24} {seconds * 1000:8.1f} ms  {len(paragraphs):4d} paragraphs  {chars:7d} chars")
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FIXTURE
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with open(path, 'rb') as file:
+        html = file.read()
+
+    print(f"{os.path.basename(path)}: {len(html)} bytes, best of {repeats}")
+    report("bs4 html.parser <p>", soup_paragraphs, html, repeats)
+    report("html_paragraphs (lxml)", paragraphs_from_html, html, repeats)
+
+
+if __name__ == '__main__':
+    main()
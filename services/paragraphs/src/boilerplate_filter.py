@@ -0,0 +1,70 @@
+"""
+Repeated boilerplate detection
+
+Publishers' PDFs repeat running headers, footers, copyright lines and figure
+captions on every page. Only the first occurrence of each such block is kept,
+so the copies are not summarized and scanned for vocabulary over and over.
+"""
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Set
+
+NON_WORD_REGEX = re.compile(r'[\W_]+')
+DIGITS_REGEX = re.compile(r'\d+')
+
+# Blocks up to this long are compared with their numbers masked out, so that e.g.
+# "Page 3 of 20 · © 2021 Publisher" and "Page 4 of 20 · © 2021 Publisher" match.
+# Longer blocks must match exactly (ignoring case, whitespace and punctuation).
+TEMPLATE_MAX_CHARS = 200
+
+# Rough characters-per-token ratio for English text, for reporting
+CHARS_PER_TOKEN = 4
+
+
+def boilerplate_key(paragraph: str) -> bytes:
+    """Hash of a paragraph, normalized so that near-repeats of the same block collide."""
+    normalized = NON_WORD_REGEX.sub(' ', paragraph.lower()).strip()
+    if len(paragraph) <= TEMPLATE_MAX_CHARS:
+        normalized = DIGITS_REGEX.sub('0', normalized)
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+
+@dataclass
+class BoilerplateStats:
+    paragraphs_kept: int = 0
+    paragraphs_dropped: int = 0
+    chars_dropped: int = 0
+
+    @property
+    def estimated_tokens_dropped(self) -> int:
+        return self.chars_dropped // CHARS_PER_TOKEN
+
+    def __str__(self) -> str:
+        total = self.paragraphs_kept + self.paragraphs_dropped
+        return (f"dropped {self.paragraphs_dropped} of {total} paragraphs as repeated boilerplate "
+                f"(~{self.estimated_tokens_dropped} tokens)")
+
+
+class BoilerplateFilter:
+    """
+    Drops repeats of paragraphs already seen in the same document.
+
+    Works on a stream of paragraphs, holding only one hash per distinct paragraph,
+    and keeps counts of what was dropped in `stats`.
+    """
+
+    def __init__(self):
+        self.seen: Set[bytes] = set()
+        self.stats = BoilerplateStats()
+
+    def filter(self, paragraphs: Iterable[str]) -> Iterator[str]:
+        for paragraph in paragraphs:
+            key = boilerplate_key(paragraph)
+            if key in self.seen:
+                self.stats.paragraphs_dropped += 1
+                self.stats.chars_dropped += len(paragraph)
+                continue
+            self.seen.add(key)
+            self.stats.paragraphs_kept += 1
+            yield paragraph
@@ -1,5 +1,4 @@
 import os
-import json
 import signal
 import sys
 import boto3
@@ -15,58 +14,81 @@ load_dotenv()
 ###
 # Load custom code after this point
 ###
-from common.constants import PARAGRAPHS_QUEUE, SUBMISSIONS_TABLE
+from common.chunks import plan_chunks, publish_chunks
+from common.constants import PARAGRAPHS_QUEUE, SUBMISSIONS_TABLE, VOCABULARY_QUEUE, SUMMARIES_QUEUE
 from common.envvar import environment
 from common.logger import logger
+from common.metrics import configure_metrics, count_items, stage
 from common.upload_notification import poll_sqs_for_s3_file_forever, S3Upload
 from common.submission_repo import submission_repo, SubmissionState
 
-from paragraph_extractor import extract_paragraphs
+from boilerplate_filter import BoilerplateFilter
+from paragraph_extractor import iter_extract_paragraphs
+from s3_json_writer import S3JsonArrayWriter
 from common.sqs_client import sqs_client
 
 # Configuration
 SUBMISSIONS_BUCKET = environment.require('SUBMISSIONS_BUCKET')
 PARAGRAPHS_BUCKET = environment.require('PARAGRAPHS_BUCKET')
+# If set, documents are split into work items of this many paragraphs, so several
+# vocabulary and summaries workers can process one document in parallel
+PARAGRAPH_CHUNK_SIZE = int(environment.require('PARAGRAPH_CHUNK_SIZE')) if environment.has('PARAGRAPH_CHUNK_SIZE') else 0
 
 # AWS clients
 s3 = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
 submissions_table = dynamodb.Table(SUBMISSIONS_TABLE)
 queue_client = sqs_client.for_queue(PARAGRAPHS_QUEUE)
+chunk_queue_clients = [sqs_client.for_queue(VOCABULARY_QUEUE), sqs_client.for_queue(SUMMARIES_QUEUE)]
 
-def upload_paragraphs(bucket, key, paragraphs):
-    """Upload paragraphs to S3."""
-    s3.put_object(
-        Bucket=bucket,
-        Key=key,
-        Body=json.dumps(paragraphs),
-        ContentType='application/json'
-    )
+def upload_paragraphs(bucket, key, paragraphs) -> int:
+    """Stream paragraphs to S3 as a JSON array. Returns the number of paragraphs uploaded."""
+    with S3JsonArrayWriter(s3, bucket, key) as writer:
+        for paragraph in paragraphs:
+            writer.write(paragraph)
+    return writer.count
 
 def process_record(s3_upload: S3Upload):
     logger.info(f"Processing file {s3_upload.user_id}/{s3_upload.file_hash}")
     # File hash functions as the submission_id
-    submission_repo.update_state(
-        s3_upload.user_id,
-        s3_upload.file_hash,
-        SubmissionState.RECEIVED.value
-    )
-    paragraphs = extract_paragraphs(s3_upload.tmp_file_path)
-
-    # Upload paragraphs to paragraphs bucket
+    with stage('dynamodb_write'):
+        submission_repo.update_state(
+            s3_upload.user_id,
+            s3_upload.file_hash,
+            SubmissionState.RECEIVED.value
+        )
+        if PARAGRAPH_CHUNK_SIZE:
+            # Must be recorded before the upload, so workers ignore the whole-file notification
+            submission_repo.update_chunk_size(s3_upload.user_id, s3_upload.file_hash, PARAGRAPH_CHUNK_SIZE)
+
+    boilerplate_filter = BoilerplateFilter()
+    paragraphs = boilerplate_filter.filter(iter_extract_paragraphs(s3_upload.tmp_file_path))
+
+    # Stream paragraphs to paragraphs bucket as they are extracted: the stage covers both
     output_key = f"{os.path.splitext(s3_upload.key)[0]}.json"
-    upload_paragraphs(PARAGRAPHS_BUCKET, output_key, paragraphs)
-    submission_repo.update_paragraph_count(
-        s3_upload.user_id,
-        s3_upload.file_hash,
-        len(paragraphs)
-    )
-
-    submission_repo.update_state(
-        s3_upload.user_id,
-        s3_upload.file_hash,
-        SubmissionState.PARAGRAPHED.value
-    )
+    with stage('extract_and_upload'):
+        paragraph_count = upload_paragraphs(PARAGRAPHS_BUCKET, output_key, paragraphs)
+    count_items('extract_and_upload', 'paragraphs', paragraph_count)
+    with stage('dynamodb_write'):
+        submission_repo.update_paragraph_count(
+            s3_upload.user_id,
+            s3_upload.file_hash,
+            paragraph_count
+        )
+    logger.info(f"Submission {s3_upload.file_hash}: {boilerplate_filter.stats}")
+
+    if PARAGRAPH_CHUNK_SIZE:
+        chunks = plan_chunks(paragraph_count, PARAGRAPH_CHUNK_SIZE)
+        with stage('publish_chunks'):
+            publish_chunks(chunk_queue_clients, PARAGRAPHS_BUCKET, output_key, chunks)
+        logger.info(f"Published {len(chunks)} chunks of {output_key}")
+
+    with stage('dynamodb_write'):
+        submission_repo.update_state(
+            s3_upload.user_id,
+            s3_upload.file_hash,
+            SubmissionState.PARAGRAPHED.value
+        )
 
     logger.info(f"Successfully processed {s3_upload.key} into {output_key}")
 
@@ -83,10 +105,13 @@ def main():
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
 
+    configure_metrics('paragraphs')
+
     for s3_upload in poll_sqs_for_s3_file_forever(queue_client, 5):
         logger.info(f"Processing file from bucket {s3_upload.bucket} with key {s3_upload.key}...")
         try:
-            process_record(s3_upload)
+            with stage('process_record'):
+                process_record(s3_upload)
         except Exception as e:
             logger.error(f"Error processing file {s3_upload.key}: {e}", exc_info=True)
 
@@ -1,18 +1,30 @@
 import re
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
 import docx
 import mammoth
-from bs4 import BeautifulSoup
 from striprtf.striprtf import rtf_to_text
 
 from common.envvar import environment
+from common import html_paragraphs
+from common.metrics import stage
 import document_ai_extract as document_ai
 
 GCP_LOCATION = environment.require('GCP_LOCATION')
 GCP_PROJECT_ID = environment.require('GCP_PROJECT_ID')
 GCP_LAYOUT_PARSER_PROCESSOR_ID = environment.require('GCP_LAYOUT_PARSER_PROCESSOR_ID')
 
+PLAIN_TEXT_EXTENSIONS = ['.txt', '.md', '.csv', '.json', '.xml']
+
+# How much of a plain text file to read at a time
+TEXT_CHUNK_SIZE = 1024 * 1024
+
+WHITESPACE_REGEX = re.compile(r'\s+')
+
+def normalize_paragraph(paragraph: str) -> str:
+    """Turn a paragraph into a single line, with all runs of whitespace collapsed to one space."""
+    return WHITESPACE_REGEX.sub(' ', paragraph).strip()
+
 def paragraphs_from_string(text: str):
     """Extract paragraphs from a string."""
     # FIXME: naively dividing on empty lines
@@ -23,11 +35,45 @@ def paragraphs_from_text(file_path):
     with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
         return paragraphs_from_string(file.read())
 
-def paragraphs_from_html(file_handle) -> List[str]:
-    soup = BeautifulSoup(file_handle, "html.parser")
+def iter_paragraphs_from_text(file_path, min_length: int = 0, chunk_size: int = TEXT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Stream normalized paragraphs from a plain text file, reading it in chunks.
 
-    # TODO: Find a better guess
-    return [p.text for p in soup.find_all('p')]
+    Yields the same paragraphs as `clean_paragraphs(paragraphs_from_text(file_path), min_length)`,
+    but only ever holds one chunk and the paragraph being read in memory.
+    """
+    def finish(parts: List[str]):
+        paragraph = normalize_paragraph(''.join(parts))
+        if paragraph and len(paragraph) >= min_length:
+            return paragraph
+        return None
+
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        parts: List[str] = []
+        # A trailing newline is held back, in case the next chunk starts with the other half of "\n\n"
+        carry = ''
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            pieces = (carry + chunk).split("\n\n")
+            last = pieces.pop()
+            carry = '\n' if last.endswith('\n') else ''
+            for piece in pieces:
+                parts.append(piece)
+                paragraph = finish(parts)
+                parts = []
+                if paragraph:
+                    yield paragraph
+            parts.append(last[:-1] if carry else last)
+
+        paragraph = finish(parts)
+        if paragraph:
+            yield paragraph
+
+def paragraphs_from_html(file_handle) -> List[str]:
+    """Extract the main-body paragraphs from HTML, skipping navigation, footers etc."""
+    return html_paragraphs.paragraphs_from_html(file_handle)
 
 def paragraphs_from_word(file_path):
     """Extract paragraphs from Word (.docx) files."""
@@ -54,12 +100,13 @@ def paragraphs_from_rtf(file_path):
 
 def paragraphs_from_pdf(file_path):
     """Extract text from PDF files using Document AI."""
-    return document_ai.extract_paragraphs(
-        file_path,
-        gcp_project_id=GCP_PROJECT_ID,
-        gcp_location=GCP_LOCATION,
-        gcp_processor_id=GCP_LAYOUT_PARSER_PROCESSOR_ID,
-    )
+    with stage('document_ai'):
+        return document_ai.extract_paragraphs(
+            file_path,
+            gcp_project_id=GCP_PROJECT_ID,
+            gcp_location=GCP_LOCATION,
+            gcp_processor_id=GCP_LAYOUT_PARSER_PROCESSOR_ID,
+        )
 
 def paragraphs_from_file(file_path):
     """Extract text from various file types."""
@@ -75,11 +122,12 @@ def paragraphs_from_file(file_path):
 
     # HTML
     elif file_extension in ['.html', '.htm']:
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        # Read bytes, so the parser can honour the page's declared encoding
+        with open(file_path, 'rb') as file:
             paragraphs = paragraphs_from_html(file)
 
     # Plain text files
-    elif file_extension in ['.txt', '.md', '.csv', '.json', '.xml']:
+    elif file_extension in PLAIN_TEXT_EXTENSIONS:
         paragraphs = paragraphs_from_text(file_path)
 
     # Excel files
@@ -116,5 +164,16 @@ def clean_paragraphs(raw_paragraphs: List[str], min_length: int):
 
     return paragraphs
 
+def iter_extract_paragraphs(file_path: str, min_length: int = 100) -> Iterator[str]:
+    """
+    Yield the cleaned paragraphs of a file. Plain text files are streamed in chunks,
+    so memory use does not grow with the size of the file.
+    """
+    if Path(file_path).suffix.lower() in PLAIN_TEXT_EXTENSIONS:
+        return iter_paragraphs_from_text(file_path, min_length)
+    return iter(extract_paragraphs(file_path, min_length))
+
 def extract_paragraphs(file_path: str, min_length: int = 100):
+    if Path(file_path).suffix.lower() in PLAIN_TEXT_EXTENSIONS:
+        return list(iter_paragraphs_from_text(file_path, min_length))
     return clean_paragraphs(paragraphs_from_file(file_path), min_length)
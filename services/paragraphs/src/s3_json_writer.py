@@ -0,0 +1,100 @@
+"""
+Streaming JSON array upload to S3.
+"""
+import io
+import json
+from typing import Any, Optional
+
+from common.logger import logger
+
+# S3 rejects multipart parts (other than the last) smaller than 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3JsonArrayWriter:
+    """
+    Writes a JSON array to S3 one item at a time, without holding the whole array in memory.
+
+    The serialized array is buffered until it reaches `part_size`, then sent as one part of a
+    multipart upload. Arrays that never fill a part are sent with a single `put_object`.
+    The uploaded object is byte-for-byte what `json.dumps(items)` would produce.
+
+    Use as a context manager: the upload is completed on a clean exit and aborted on error.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, part_size: int = MIN_PART_SIZE,
+                 content_type: str = 'application/json'):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.content_type = content_type
+        self.count = 0
+        self._buffer = io.BytesIO()
+        self._upload_id: Optional[str] = None
+        self._parts = []
+
+    def __enter__(self) -> 'S3JsonArrayWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, item: Any) -> None:
+        """Append an item to the array."""
+        separator = b'[' if self.count == 0 else b', '
+        self._buffer.write(separator + json.dumps(item).encode('utf-8'))
+        self.count += 1
+        if self._buffer.tell() >= self.part_size:
+            self._upload_part()
+
+    def close(self) -> None:
+        """Finish the array and complete the upload."""
+        self._buffer.write(b'[]' if self.count == 0 else b']')
+        if self._upload_id is None:
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=self._buffer.getvalue(),
+                ContentType=self.content_type
+            )
+        else:
+            self._upload_part()
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={'Parts': self._parts}
+            )
+            logger.info(f"Uploaded {self.count} items to {self.key} in {len(self._parts)} parts")
+
+    def abort(self) -> None:
+        """Discard anything uploaded so far."""
+        if self._upload_id is not None:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            self._upload_id = None
+
+    def _upload_part(self) -> None:
+        if self._upload_id is None:
+            response = self.s3.create_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                ContentType=self.content_type
+            )
+            self._upload_id = response['UploadId']
+
+        part_number = len(self._parts) + 1
+        response = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=self._buffer.getvalue()
+        )
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        self._buffer = io.BytesIO()
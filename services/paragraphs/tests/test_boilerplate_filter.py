@@ -0,0 +1,34 @@
+from boilerplate_filter import BoilerplateFilter
+
+BODY = [
+    "The first paragraph of the chapter introduces the industrial revolution and its causes in Britain.",
+    "The second paragraph describes the spread of factories to the United States after 1800.",
+]
+FOOTER = "History of the Modern World, 3rd edition. Copyright {} Example Press. All rights reserved. Page {}"
+
+
+def test_keeps_distinct_paragraphs():
+    boilerplate_filter = BoilerplateFilter()
+    assert list(boilerplate_filter.filter(BODY)) == BODY
+    assert boilerplate_filter.stats.paragraphs_dropped == 0
+
+
+def test_collapses_repeated_footers():
+    paragraphs = [
+        BODY[0], FOOTER.format(2021, 1),
+        BODY[1], FOOTER.format(2021, 2),
+        FOOTER.format(2021, 3).upper(),
+    ]
+    boilerplate_filter = BoilerplateFilter()
+
+    assert list(boilerplate_filter.filter(paragraphs)) == [BODY[0], FOOTER.format(2021, 1), BODY[1]]
+    assert boilerplate_filter.stats.paragraphs_kept == 3
+    assert boilerplate_filter.stats.paragraphs_dropped == 2
+    assert boilerplate_filter.stats.estimated_tokens_dropped > 0
+
+
+def test_long_paragraphs_differing_in_numbers_are_kept():
+    template = "In {} the population of the city grew to {} people, " + "as new arrivals found work in mills. " * 5
+    paragraphs = [template.format(1850, 30_000), template.format(1900, 250_000)]
+
+    assert list(BoilerplateFilter().filter(paragraphs)) == paragraphs
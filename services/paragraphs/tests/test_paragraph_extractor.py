@@ -1,5 +1,7 @@
 import os
-from paragraph_extractor import extract_paragraphs
+from paragraph_extractor import (
+    extract_paragraphs, clean_paragraphs, paragraphs_from_file, iter_paragraphs_from_text
+)
 
 here = os.path.dirname(__file__)
 
@@ -13,6 +15,15 @@ def test_extract_text_txt():
     assert paragraph in result
 
 
+def test_iter_paragraphs_from_text_matches_whole_file_split():
+    file_path = f"{here}/fixtures/the-tell-tale-heart.txt"
+    expected = clean_paragraphs(paragraphs_from_file(file_path), 100)
+
+    # Tiny chunks, so paragraph breaks regularly straddle two chunks
+    for chunk_size in [1, 2, 7, 4096]:
+        assert list(iter_paragraphs_from_text(file_path, 100, chunk_size)) == expected
+
+
 def test_extract_text_pdf():
     paragraph = """
     This report outlines the launch strategy for our new SmartHome Hub, a central device designed to connect and control all smart home devices seamlessly. Our goal is to revolutionize home automation and establish ourselves as market leaders in this growing sector.
@@ -20,3 +31,12 @@ def test_extract_text_pdf():
 
     result = extract_paragraphs(f"{here}/fixtures/sample-5-page-pdf-a4-size.pdf")
     assert paragraph in result
+
+
+def test_extract_text_html():
+    stanza_start = "In these deep solitudes and awful cells, Where heav'nly-pensive contemplation dwells,"
+
+    result = extract_paragraphs(f"{here}/fixtures/Eloisa to Abelard _ The Poetry Foundation.html")
+    assert result[0].startswith(stanza_start)
+    # Navigation and footer links are not part of the main text
+    assert not any("Advertise with Poetry" in p for p in result)
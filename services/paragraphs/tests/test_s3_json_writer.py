@@ -0,0 +1,63 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from s3_json_writer import S3JsonArrayWriter, MIN_PART_SIZE
+
+BUCKET = 'paragraphs-test'
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def read_object(s3, key):
+    return s3.get_object(Bucket=BUCKET, Key=key)['Body'].read().decode('utf-8')
+
+
+def test_small_array_is_single_put(s3):
+    paragraphs = ["First paragraph.", "Second \"quoted\" paragraph — with unicode."]
+    with S3JsonArrayWriter(s3, BUCKET, 'small.json') as writer:
+        for paragraph in paragraphs:
+            writer.write(paragraph)
+
+    assert writer.count == 2
+    assert read_object(s3, 'small.json') == json.dumps(paragraphs)
+
+
+def test_empty_array(s3):
+    with S3JsonArrayWriter(s3, BUCKET, 'empty.json'):
+        pass
+
+    assert read_object(s3, 'empty.json') == '[]'
+
+
+def test_large_array_is_multipart(s3):
+    paragraphs = [f"Paragraph {i} " + "x" * 10_000 for i in range(1200)]
+    with S3JsonArrayWriter(s3, BUCKET, 'large.json') as writer:
+        for paragraph in paragraphs:
+            writer.write(paragraph)
+
+    assert len(writer._parts) == 3
+    assert all(part['PartNumber'] == i + 1 for i, part in enumerate(writer._parts))
+    assert read_object(s3, 'large.json') == json.dumps(paragraphs)
+
+
+def test_error_aborts_upload(s3):
+    with pytest.raises(RuntimeError):
+        with S3JsonArrayWriter(s3, BUCKET, 'failed.json') as writer:
+            for i in range(MIN_PART_SIZE // 1000 + 10):
+                writer.write("y" * 1000)
+            raise RuntimeError("extraction failed")
+
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+    assert 'Contents' not in s3.list_objects_v2(Bucket=BUCKET)
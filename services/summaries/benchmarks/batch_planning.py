@@ -0,0 +1,88 @@
+"""
+Compare fixed-size and token-budget batch planning for summarization.
+
+No API calls are made: request latency is simulated with a simple model of a
+chat completion (fixed overhead, plus time per input token and per output token),
+and requests run MAX_CONCURRENT_BATCHES at a time as in `summarize_paragraphs`.
+
+Usage:
+    PYTHONPATH=src poetry run python benchmarks/batch_planning.py [paragraphs.json]
+
+With no argument, two synthetic documents are used: one of short paragraphs only,
+and a mix of short, medium and very long paragraphs.
+The JSON file, if given, is a paragraphs file as written by the paragraphs service.
+"""
+import heapq
+import json
+import random
+import sys
+from typing import List
+
+from batch_planner import PARAGRAPH_OVERHEAD_TOKENS, estimate_tokens, limits_for, plan_batches, plan_fixed_batches
+
+# Simulated latency model
+REQUEST_OVERHEAD_SECONDS = 0.6
+SECONDS_PER_INPUT_TOKEN = 0.00005
+SECONDS_PER_OUTPUT_TOKEN = 0.012
+OUTPUT_TOKENS_PER_SUMMARY = 40
+
+MAX_CONCURRENT_BATCHES = 4
+FIXED_BATCH_SIZE = 20
+MIN_PARAGRAPH_LENGTH = 300
+
+
+def synthetic_paragraphs(count: int = 400, long_share: float = 0.5, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    paragraphs = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind >= long_share:
+            length = rng.randint(300, 600)
+        elif kind < long_share * 0.8:
+            length = rng.randint(600, 2500)
+        else:
+            length = rng.randint(6000, 16000)
+        paragraphs.append("word " * (length // 5))
+    return paragraphs
+
+
+def request_seconds(batch: List[str]) -> float:
+    input_tokens = sum(estimate_tokens(p) + PARAGRAPH_OVERHEAD_TOKENS for p in batch)
+    return (REQUEST_OVERHEAD_SECONDS + input_tokens * SECONDS_PER_INPUT_TOKEN
+            + len(batch) * OUTPUT_TOKENS_PER_SUMMARY * SECONDS_PER_OUTPUT_TOKEN)
+
+
+def wall_seconds(durations: List[float], workers: int) -> float:
+    """Makespan of running the requests in order on `workers` concurrent slots."""
+    slots = [0.0] * workers
+    for duration in durations:
+        heapq.heappush(slots, heapq.heappop(slots) + duration)
+    return max(slots)
+
+
+def report(name: str, paragraphs: List[str], batches: List[List[int]]):
+    durations = [request_seconds([paragraphs[p] for p in batch]) for batch in batches]
+    input_tokens = [sum(estimate_tokens(paragraphs[p]) for p in batch) for batch in batches]
+    print(f"{name:<14} {len(batches):5d} requests  max {max(input_tokens):6d} input tokens/request  "
+          f"slowest {max(durations):5.1f} s  wall {wall_seconds(durations, MAX_CONCURRENT_BATCHES):6.1f} s")
+
+
+def compare(name: str, paragraphs: List[str]):
+    paragraphs = [p for p in paragraphs if len(p) >= MIN_PARAGRAPH_LENGTH]
+    print(f"{name}: {len(paragraphs)} paragraphs, ~{sum(map(estimate_tokens, paragraphs))} tokens, "
+          f"{MAX_CONCURRENT_BATCHES} concurrent requests")
+    report(f"fixed {FIXED_BATCH_SIZE}", paragraphs, plan_fixed_batches(paragraphs, FIXED_BATCH_SIZE))
+    report("token budget", paragraphs, plan_batches(paragraphs, limits_for("gpt-4o-mini")))
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as file:
+            compare(sys.argv[1], json.load(file))
+    else:
+        compare("short", synthetic_paragraphs(long_share=0.0))
+        compare("mixed", synthetic_paragraphs(long_share=0.5))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Throughput of the summarizer backends on the Tell-Tale Heart fixture.
+
+The extractive backend always runs. The OpenAI backend only runs with --remote,
+since it makes real API calls (and needs a real OPENAI_API_KEY).
+
+Usage:
+    PYTHONPATH=src poetry run python benchmarks/summarizer_backends.py [--remote] [path/to/text.txt]
+"""
+import os
+import re
+import sys
+import time
+
+# paragraph_summarizer needs an API key at import time, even when only the extractive backend is run
+os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+from paragraph_summarizer import ExtractiveBackend, OpenAIBackend, summarize_paragraphs
+
+here = os.path.dirname(__file__)
+DEFAULT_FIXTURE = f"{here}/../../paragraphs/tests/fixtures/the-tell-tale-heart.txt"
+MIN_PARAGRAPH_LENGTH = 300
+
+
+def load_paragraphs(path: str):
+    with open(path, encoding='utf-8') as file:
+        paragraphs = [re.sub(r'\s+', ' ', p).strip() for p in re.split(r'\n\s*\n', file.read())]
+    return [p for p in paragraphs if len(p) >= MIN_PARAGRAPH_LENGTH]
+
+
+def report(name: str, backend, paragraphs):
+    started = time.perf_counter()
+    summaries = summarize_paragraphs(paragraphs, backend=backend)
+    seconds = time.perf_counter() - started
+    print(f"{name:<12} {seconds * 1000:9.1f} ms  {len(paragraphs) / seconds:9.1f} paragraphs/s  "
+          f"{sum(map(len, summaries)) / len(summaries):6.0f} chars/summary")
+
+
+def main():
+    args = sys.argv[1:]
+    remote = '--remote' in args
+    args = [arg for arg in args if arg != '--remote']
+    paragraphs = load_paragraphs(args[0] if args else DEFAULT_FIXTURE)
+    print(f"{len(paragraphs)} paragraphs of at least {MIN_PARAGRAPH_LENGTH} chars")
+
+    backend = ExtractiveBackend()
+    # The first call pays for loading the sentence tokenizer
+    summarize_paragraphs(paragraphs[:1], backend=backend)
+    report("extractive", backend, paragraphs)
+    if remote:
+        report("openai", OpenAIBackend(), paragraphs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+"""
+Bulk summarization through provider batch jobs
+
+For work that does not need interactive latency (pre-loading a semester's readings,
+re-summarizing after a prompt change), requests from many submissions are written
+to one batch-job file, which the provider works through at its own pace (within 24
+hours, at a lower price). When the job is done, its results are fanned back out into
+the summaries table.
+
+`OpenAIBatchProvider` uses the OpenAI Batch API; `LocalBatchProvider` is a
+file-backed stand-in that answers jobs locally, so the whole flow can run offline.
+"""
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from batch_planner import limits_for, plan_batches
+from budget import SummaryBudget
+from common.constants import PARAGRAPH_INTRO_WORDS, SUMMARIES_PER_SUBMISSION_LIMIT
+from common.submission_repo import SubmissionState
+from common.summary_repo import NewSummary
+from extractive_summarizer import ExtractiveSummarizer
+from paragraph_summarizer import MODEL, build_summaries_request, paragraph_should_be_summarized, parse_summaries
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+
+# Batch job states after which the job will not change any more
+FINISHED_STATES = {"completed", "failed", "expired", "cancelled"}
+
+PARAGRAPH_MARKER_REGEX = re.compile(r'---PARAGRAPH \d+---\n')
+
+
+@dataclass
+class BatchStatus:
+    state: str
+    output_file_id: Optional[str] = None
+    error_file_id: Optional[str] = None
+
+
+class BatchProvider(ABC):
+    """Interface for a provider's batch-job API."""
+
+    @abstractmethod
+    def submit(self, requests_jsonl: bytes) -> str:
+        """Upload a file of requests, one JSON object per line, and start a job on it. Returns the job id."""
+
+    @abstractmethod
+    def status(self, job_id: str) -> BatchStatus:
+        """The job's state, and its output and error files once it has them."""
+
+    @abstractmethod
+    def download(self, file_id: str) -> bytes:
+        """The content of one of the provider's files, e.g. a job's output."""
+
+
+class OpenAIBatchProvider(BatchProvider):
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, requests_jsonl: bytes) -> str:
+        input_file = self.client.files.create(file=("summaries.jsonl", requests_jsonl), purpose="batch")
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT,
+                                           completion_window=COMPLETION_WINDOW)
+        return batch.id
+
+    def status(self, job_id: str) -> BatchStatus:
+        batch = self.client.batches.retrieve(job_id)
+        return BatchStatus(batch.status, batch.output_file_id, batch.error_file_id)
+
+    def download(self, file_id: str) -> bytes:
+        return self.client.files.content(file_id).read()
+
+
+def paragraphs_from_request(body: dict) -> List[str]:
+    """The paragraphs that a request built by build_summaries_request asks to summarize."""
+    user_message = body["messages"][-1]["content"]
+    parts = PARAGRAPH_MARKER_REGEX.split(user_message)[1:]
+    # The last paragraph is followed by the closing instructions
+    if parts:
+        parts[-1] = parts[-1].rsplit("\n\n---\n", 1)[0]
+    return [part.strip() for part in parts]
+
+
+def extractive_responder(summarizer: Optional[ExtractiveSummarizer] = None) -> Callable[[dict], dict]:
+    """Answer summary requests the way the API would, with extractive summaries."""
+    summarizer = summarizer or ExtractiveSummarizer()
+
+    def respond(body: dict) -> dict:
+        summaries = [
+            {"paragraph_number": j + 1, "summary": summarizer.summarize(paragraph)}
+            for j, paragraph in enumerate(paragraphs_from_request(body))
+        ]
+        return {"choices": [{"message": {"role": "assistant", "content": json.dumps({"summaries": summaries})}}]}
+
+    return respond
+
+
+class LocalBatchProvider(BatchProvider):
+    """
+    Stand-in for a provider's batch API, backed by files in a directory.
+
+    A job is answered by `respond` (a request body in, a chat completion out) when it is
+    polled for the `polls_until_done`-th time. The directory can be shared between the
+    process that submits jobs and the one that collects them.
+    """
+
+    def __init__(self, directory: str, respond: Optional[Callable[[dict], dict]] = None, polls_until_done: int = 1):
+        self.directory = directory
+        self.respond = respond or extractive_responder()
+        self.polls_until_done = polls_until_done
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def submit(self, requests_jsonl: bytes) -> str:
+        job_id = f"batch_{uuid.uuid4().hex}"
+        with open(self._path(f"{job_id}.input.jsonl"), 'wb') as file:
+            file.write(requests_jsonl)
+        self._save_state(job_id, {"polls": 0})
+        return job_id
+
+    def _save_state(self, job_id: str, state: dict) -> None:
+        with open(self._path(f"{job_id}.json"), 'w') as file:
+            json.dump(state, file)
+
+    def status(self, job_id: str) -> BatchStatus:
+        with open(self._path(f"{job_id}.json")) as file:
+            state = json.load(file)
+        if "output_file_id" not in state:
+            state["polls"] += 1
+            if state["polls"] >= self.polls_until_done:
+                state["output_file_id"] = self._run(job_id)
+            self._save_state(job_id, state)
+        if "output_file_id" in state:
+            return BatchStatus("completed", state["output_file_id"])
+        return BatchStatus("in_progress")
+
+    def _run(self, job_id: str) -> str:
+        output_file_id = f"{job_id}.output.jsonl"
+        with open(self._path(f"{job_id}.input.jsonl")) as requests_file, \
+                open(self._path(output_file_id), 'w') as output_file:
+            for line in requests_file:
+                request = json.loads(line)
+                try:
+                    result = {"response": {"status_code": 200, "body": self.respond(request["body"])}, "error": None}
+                except Exception as e:
+                    result = {"response": None, "error": {"code": "server_error", "message": str(e)}}
+                output_file.write(json.dumps({"custom_id": request["custom_id"], **result}) + "\n")
+        return output_file_id
+
+    def download(self, file_id: str) -> bytes:
+        with open(self._path(file_id), 'rb') as file:
+            return file.read()
+
+
+@dataclass
+class BatchRequestEntry:
+    """Which paragraphs of which submission one request of the job summarizes."""
+    user_id: str
+    submission_id: str
+    paragraph_numbers: List[int]
+    paragraph_starts: List[str]
+
+
+@dataclass
+class BulkJob:
+    """A submitted batch job, with what is needed to fan its results back out. Saved as JSON."""
+    job_id: str
+    requests: Dict[str, BatchRequestEntry]
+    # [user_id, submission_id] of every submission in the job
+    submissions: List[List[str]] = field(default_factory=list)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @staticmethod
+    def from_json(text: str) -> 'BulkJob':
+        data = json.loads(text)
+        requests = {custom_id: BatchRequestEntry(**entry) for custom_id, entry in data["requests"].items()}
+        return BulkJob(data["job_id"], requests, data.get("submissions", []))
+
+
+def paragraph_start(paragraph: str) -> str:
+    return ' '.join(paragraph.split()[:PARAGRAPH_INTRO_WORDS])
+
+
+class BulkSummarizer:
+    """
+    Accumulates the paragraphs of many submissions into one batch job, and saves its results.
+
+    Paragraphs too short to summarize are saved (as their own summaries) when they are added.
+    The others are checked against the submission's budget and the user's daily quota,
+    as interactive jobs are, and those over them are left out of the job.
+    """
+
+    def __init__(self, provider: BatchProvider, summary_repo, submission_repo, subject: str = "",
+                 budget_for: Optional[Callable[[str, str], SummaryBudget]] = None):
+        """
+        Args:
+            budget_for: Builds the budget of a (user_id, submission_id); None to not budget the
+                        requests, e.g. for a provider that does not bill them
+        """
+        self.provider = provider
+        self.summary_repo = summary_repo
+        self.submission_repo = submission_repo
+        self.subject = subject
+        self.budget_for = budget_for
+        self.lines: List[str] = []
+        self.requests: Dict[str, BatchRequestEntry] = {}
+        self.submissions: List[List[str]] = []
+
+    def add_submission(self, user_id: str, submission_id: str, paragraphs: List[str],
+                       skip: Set[int] = frozenset()) -> int:
+        """
+        Add a submission's paragraphs to the job, up to the per-submission limit.
+
+        Args:
+            skip: Paragraph numbers not to summarize, e.g. those that have summaries already
+
+        Returns:
+            The number of paragraphs added to the job; less than asked for if they are over the budget
+        """
+        numbers = [i for i in range(min(len(paragraphs), SUMMARIES_PER_SUBMISSION_LIMIT + 1)) if i not in skip]
+        short = [i for i in numbers if not paragraph_should_be_summarized(paragraphs[i])]
+        self.save(user_id, submission_id, short, summaries=[paragraphs[i] for i in short],
+                  paragraphs=[paragraphs[i] for i in short])
+        self.submissions.append([user_id, submission_id])
+
+        pending = [i for i in numbers if paragraph_should_be_summarized(paragraphs[i])]
+        limits = limits_for(MODEL)
+        if self.budget_for is not None and pending:
+            # Reserved at the interactive price; batch jobs are billed less, so this errs on the safe side
+            affordable = self.budget_for(user_id, submission_id).allow([paragraphs[i] for i in pending], limits)
+            if affordable < len(pending):
+                logger.warning(f"Leaving {len(pending) - affordable} paragraphs of submission {submission_id} "
+                               f"out of the batch job: over the submission's budget or the user's daily quota")
+            pending = pending[:affordable]
+        for positions in plan_batches([paragraphs[i] for i in pending], limits):
+            batch_numbers = [pending[p] for p in positions]
+            custom_id = f"request-{len(self.requests)}"
+            self.requests[custom_id] = BatchRequestEntry(
+                user_id, submission_id, batch_numbers, [paragraph_start(paragraphs[i]) for i in batch_numbers])
+            self.lines.append(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": build_summaries_request([paragraphs[i] for i in batch_numbers], self.subject),
+            }))
+        return len(pending)
+
+    def submit(self) -> BulkJob:
+        job_id = self.provider.submit(("\n".join(self.lines) + "\n").encode('utf-8') if self.lines else b"")
+        logger.info(f"Submitted batch job {job_id}: {len(self.lines)} requests from "
+                    f"{len(self.submissions)} submissions")
+        return BulkJob(job_id, self.requests, self.submissions)
+
+    def wait(self, job: BulkJob, poll_seconds: float = 60, sleep: Callable[[float], None] = time.sleep) -> BatchStatus:
+        """Poll the job until it is finished."""
+        while True:
+            status = self.provider.status(job.job_id)
+            if status.state in FINISHED_STATES:
+                logger.info(f"Batch job {job.job_id} {status.state}")
+                return status
+            logger.info(f"Batch job {job.job_id} is {status.state}; checking again in {poll_seconds}s")
+            sleep(poll_seconds)
+
+    def collect(self, job: BulkJob, status: BatchStatus) -> Dict[Tuple[str, str], List[int]]:
+        """
+        Save the summaries from a finished job, and mark the submissions that are now fully summarized.
+
+        Returns:
+            The paragraph numbers left without a summary, by (user_id, submission_id)
+        """
+        missing: Dict[Tuple[str, str], List[int]] = {}
+        answered: Set[str] = set()
+        output = self.provider.download(status.output_file_id).decode('utf-8') if status.output_file_id else ""
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            entry = job.requests.get(result["custom_id"])
+            if entry is None:
+                logger.error(f"Batch job {job.job_id} returned unknown request {result['custom_id']}")
+                continue
+            answered.add(result["custom_id"])
+            summary_map = self._summaries_from_result(result, len(entry.paragraph_numbers))
+
+            found = [j for j in range(len(entry.paragraph_numbers)) if j + 1 in summary_map]
+            self.save(entry.user_id, entry.submission_id,
+                      [entry.paragraph_numbers[j] for j in found],
+                      [summary_map[j + 1] for j in found],
+                      starts=[entry.paragraph_starts[j] for j in found])
+            for j in range(len(entry.paragraph_numbers)):
+                if j + 1 not in summary_map:
+                    missing.setdefault((entry.user_id, entry.submission_id), []).append(entry.paragraph_numbers[j])
+
+        # Requests that failed outright are only in the error file; either way they have no summaries
+        for custom_id, entry in job.requests.items():
+            if custom_id not in answered:
+                missing.setdefault((entry.user_id, entry.submission_id), []).extend(entry.paragraph_numbers)
+
+        for user_id, submission_id in job.submissions:
+            if (user_id, submission_id) not in missing:
+                self.mark_summarized(user_id, submission_id)
+        logger.info(f"Batch job {job.job_id}: {len(answered)} of {len(job.requests)} requests answered, "
+                    f"{sum(map(len, missing.values()))} paragraphs left without a summary")
+        return missing
+
+    def _summaries_from_result(self, result: dict, paragraph_count: int) -> Dict[int, str]:
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            logger.warning(f"Request {result['custom_id']} failed: {result.get('error') or response.get('status_code')}")
+            return {}
+        try:
+            content = response["body"]["choices"][0]["message"]["content"]
+            return parse_summaries(content, paragraph_count)
+        except (KeyError, IndexError, ValueError) as e:
+            logger.warning(f"Request {result['custom_id']} returned an invalid response: {e}")
+            return {}
+
+    def save(self, user_id: str, submission_id: str, paragraph_numbers: List[int], summaries: List[str],
+             paragraphs: Optional[List[str]] = None, starts: Optional[List[str]] = None) -> None:
+        """Save summaries of a submission's paragraphs, and record the progress."""
+        if not paragraph_numbers:
+            return
+        if starts is None:
+            starts = [paragraph_start(paragraph) for paragraph in paragraphs]
+        self.summary_repo.save_many([
+            NewSummary(user_id=user_id, submission_id=submission_id, paragraph_number=i,
+                       paragraph_start=start, summary=summary)
+            for i, start, summary in zip(paragraph_numbers, starts, summaries)
+        ])
+        self.submission_repo.mark_paragraphs_summarized(user_id, submission_id, paragraph_numbers)
+
+    def mark_summarized(self, user_id: str, submission_id: str) -> None:
+        submission = self.submission_repo.get_by_id(user_id, submission_id)
+        # The state is a set of flags that update_state adds to, so it must not be added twice
+        if submission and not int(submission.state) & SubmissionState.SUMMARIZED.value:
+            self.submission_repo.update_state(user_id, submission_id, SubmissionState.SUMMARIZED.value)
@@ -0,0 +1,102 @@
+"""
+Token-budget batch planning for summarization
+
+Packs paragraphs into API requests by estimated input and output tokens, rather than
+a fixed number of paragraphs: long paragraphs get small batches that stay clear of
+context and output limits, and short ones share a request instead of paying its
+overhead many times over.
+"""
+from dataclasses import dataclass
+from typing import Dict, List
+
+# Rough characters-per-token ratio for English text
+CHARS_PER_TOKEN = 4
+
+# Tokens for the "---PARAGRAPH X---" marker and separators around each paragraph
+PARAGRAPH_OVERHEAD_TOKENS = 8
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast estimate of the number of tokens in English text, without running a tokenizer."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@dataclass(frozen=True)
+class ModelLimits:
+    """Per-request budgets for one model."""
+    # Paragraph text sent in one request, not counting the prompt
+    max_input_tokens: int
+    # Summaries returned by one request
+    max_output_tokens: int
+    max_paragraphs: int
+    # Expected size of one summary, including its JSON wrapping
+    output_tokens_per_paragraph: int = 60
+
+
+# Well inside each model's context and output limits: long structured outputs
+# are where the model starts dropping or merging summaries
+MODEL_LIMITS: Dict[str, ModelLimits] = {
+    "gpt-4o-mini": ModelLimits(max_input_tokens=6000, max_output_tokens=3000, max_paragraphs=40),
+    "gpt-4o": ModelLimits(max_input_tokens=8000, max_output_tokens=4000, max_paragraphs=50),
+}
+
+DEFAULT_LIMITS = ModelLimits(max_input_tokens=4000, max_output_tokens=2000, max_paragraphs=20)
+
+
+def limits_for(model: str) -> ModelLimits:
+    return MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """USD per million tokens."""
+    input_per_million: float
+    output_per_million: float
+
+
+MODEL_PRICES: Dict[str, ModelPrice] = {
+    "gpt-4o-mini": ModelPrice(input_per_million=0.15, output_per_million=0.60),
+    "gpt-4o": ModelPrice(input_per_million=2.50, output_per_million=10.00),
+}
+
+
+def cost_usd(model: str, input_tokens: int, output_tokens: int) -> float:
+    """The price of a model's tokens; models without a known price (local ones) are free."""
+    price = MODEL_PRICES.get(model)
+    if price is None:
+        return 0.0
+    return (input_tokens * price.input_per_million + output_tokens * price.output_per_million) / 1_000_000
+
+
+def plan_batches(paragraphs: List[str], limits: ModelLimits) -> List[List[int]]:
+    """
+    Pack consecutive paragraphs into batches that fit the limits.
+
+    A paragraph that is over the input budget by itself gets a batch of its own.
+
+    Returns:
+        Batches of positions in `paragraphs`, in order
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    input_tokens = 0
+    output_tokens = 0
+    for position, paragraph in enumerate(paragraphs):
+        paragraph_tokens = estimate_tokens(paragraph) + PARAGRAPH_OVERHEAD_TOKENS
+        if current and (input_tokens + paragraph_tokens > limits.max_input_tokens
+                        or output_tokens + limits.output_tokens_per_paragraph > limits.max_output_tokens
+                        or len(current) >= limits.max_paragraphs):
+            batches.append(current)
+            current, input_tokens, output_tokens = [], 0, 0
+        current.append(position)
+        input_tokens += paragraph_tokens
+        output_tokens += limits.output_tokens_per_paragraph
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def plan_fixed_batches(paragraphs: List[str], batch_size: int) -> List[List[int]]:
+    """The old strategy: batch_size paragraphs per request, whatever their length."""
+    return [list(range(i, min(i + batch_size, len(paragraphs)))) for i in range(0, len(paragraphs), batch_size)]
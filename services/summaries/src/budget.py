@@ -0,0 +1,222 @@
+"""
+Summary budgets, enforced before any API call
+
+The tokens a request will use are estimated from the paragraphs it carries (see
+batch_planner), so a job can tell up front how many of its paragraphs it can afford:
+within the per-submission token budget, and within the user's daily token and cost
+quotas. The affordable paragraphs are reserved against both before they are sent;
+the rest are left unsummarized rather than paid for. If the job fails partway, what
+was reserved for the paragraphs it never delivered is given back.
+"""
+import logging
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional
+
+from batch_planner import PARAGRAPH_OVERHEAD_TOKENS, ModelLimits, cost_usd, estimate_tokens, plan_batches
+from common.submission_repo import SubmissionRepo
+from common.usage_repo import UsageQuota, UsageRepo, usage_day
+
+logger = logging.getLogger(__name__)
+
+# The system prompt, instructions and response schema sent with every request
+PROMPT_TOKENS_PER_REQUEST = 300
+
+# Reservations that lose a race with another worker are re-planned this many times
+MAX_RESERVE_ATTEMPTS = 5
+
+
+@dataclass(frozen=True)
+class TokenEstimate:
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # The estimated price; models without a known price are counted as free
+    cost_usd: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def __add__(self, other: 'TokenEstimate') -> 'TokenEstimate':
+        return TokenEstimate(self.input_tokens + other.input_tokens, self.output_tokens + other.output_tokens,
+                             self.cost_usd + other.cost_usd)
+
+    def __sub__(self, other: 'TokenEstimate') -> 'TokenEstimate':
+        return TokenEstimate(self.input_tokens - other.input_tokens, self.output_tokens - other.output_tokens,
+                             self.cost_usd - other.cost_usd)
+
+
+# Estimates the tokens and price of summarizing some paragraphs within the limits
+Estimator = Callable[[List[str], ModelLimits], TokenEstimate]
+
+
+@dataclass(frozen=True)
+class Reservation:
+    """Budget reserved for some paragraphs, on the usage day it was reserved"""
+    day: str
+    paragraphs: List[str]
+    limits: ModelLimits
+    estimate: TokenEstimate
+
+
+def estimate_summaries(paragraphs: List[str], limits: ModelLimits, model: Optional[str] = None) -> TokenEstimate:
+    """
+    Tokens to summarize the paragraphs, in the requests plan_batches would make for them.
+
+    The estimate is priced as the model's, if given.
+    """
+    if not paragraphs:
+        return TokenEstimate()
+    requests = len(plan_batches(paragraphs, limits))
+    input_tokens = (sum(estimate_tokens(p) + PARAGRAPH_OVERHEAD_TOKENS for p in paragraphs)
+                    + requests * PROMPT_TOKENS_PER_REQUEST)
+    output_tokens = len(paragraphs) * limits.output_tokens_per_paragraph
+    return TokenEstimate(input_tokens, output_tokens,
+                         cost_usd(model, input_tokens, output_tokens) if model is not None else 0.0)
+
+
+def affordable_count(paragraphs: List[str], limits: ModelLimits, fits: Callable[[TokenEstimate], bool],
+                     estimate: Estimator = estimate_summaries) -> int:
+    """
+    How many of the leading paragraphs fit.
+
+    The estimate only grows with each paragraph added, so this is a binary search.
+    """
+    low, high = 0, len(paragraphs)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(estimate(paragraphs[:middle], limits)):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class SummaryBudget:
+    """
+    What one job may spend on the summaries of one submission.
+
+    Paragraphs are afforded in document order, so a submission over budget gets its
+    beginning summarized. Usage is recorded by estimate, before the calls are made.
+    """
+
+    def __init__(self, estimate: Estimator, user_id: str, submission_id: str,
+                 submission_tokens: Optional[int] = None, submission_repo: Optional[SubmissionRepo] = None,
+                 quota: Optional[UsageQuota] = None, usage_repo: Optional[UsageRepo] = None):
+        """
+        Args:
+            estimate: Estimates the tokens and price of the summaries, e.g. the backend's estimate
+            submission_tokens: Tokens all jobs of the submission may use together; None for no limit
+            submission_repo: Where the submission's reservations are kept; required with submission_tokens
+            quota: The user's daily quota; defaults to none, with usage still recorded in usage_repo
+            usage_repo: Where users' daily usage is kept; None to not track it
+        """
+        self.estimate = estimate
+        self.user_id = user_id
+        self.submission_id = submission_id
+        self.submission_tokens = submission_tokens
+        self.submission_repo = submission_repo
+        self.quota = quota or UsageQuota()
+        self.usage_repo = usage_repo
+        self.reserved = TokenEstimate()
+        self.reservations: List[Reservation] = []
+        # Paragraphs whose summaries were delivered, by text
+        self._spent: Counter = Counter()
+
+    def allow(self, paragraphs: List[str], limits: ModelLimits) -> int:
+        """
+        Reserve the budget for as many of the leading paragraphs as it affords.
+
+        Returns:
+            How many of the paragraphs may be summarized
+        """
+        day = usage_day()
+        for _ in range(MAX_RESERVE_ATTEMPTS):
+            remaining_tokens = math.inf
+            remaining_cost = math.inf
+            if self.submission_tokens is not None:
+                remaining_tokens = self.submission_tokens - self.submission_repo.get_summary_tokens(
+                    self.user_id, self.submission_id)
+            if self.usage_repo is not None and not self.quota.unlimited:
+                usage = self.usage_repo.get(self.user_id, day)
+                if self.quota.daily_tokens is not None:
+                    remaining_tokens = min(remaining_tokens, self.quota.daily_tokens - usage.tokens)
+                if self.quota.daily_cost_usd is not None:
+                    remaining_cost = self.quota.daily_cost_usd - usage.cost_usd
+
+            count = affordable_count(paragraphs, limits, lambda estimate: (
+                estimate.total <= remaining_tokens and estimate.cost_usd <= remaining_cost), self.estimate)
+            if count == 0:
+                break
+            estimate = self.estimate(paragraphs[:count], limits)
+            if self._reserve(estimate, day):
+                self.reserved += estimate
+                self.reservations.append(Reservation(day, list(paragraphs[:count]), limits, estimate))
+                if count < len(paragraphs):
+                    logger.warning(f"Budget of submission {self.submission_id} affords {count} of "
+                                   f"{len(paragraphs)} paragraphs (~{estimate.total} tokens)")
+                return count
+            # Another job took some of the budget in the meantime; plan again with what is left
+
+        logger.warning(f"Budget of submission {self.submission_id} is used up; "
+                       f"leaving {len(paragraphs)} paragraphs unsummarized")
+        return 0
+
+    def spend(self, paragraphs: Iterable[str]) -> None:
+        """Record that the summaries of these paragraphs were delivered, so their budget stays used."""
+        self._spent.update(paragraphs)
+
+    def release_unspent(self) -> TokenEstimate:
+        """
+        Give back the budget reserved for paragraphs not spent, e.g. after the job failed partway.
+
+        The unspent paragraphs are estimated again, and what was reserved for them is
+        released from the user's usage and the submission's reservation.
+
+        Returns:
+            The tokens released
+        """
+        released = TokenEstimate()
+        for reservation in self.reservations:
+            unspent = []
+            for paragraph in reservation.paragraphs:
+                if self._spent[paragraph] > 0:
+                    self._spent[paragraph] -= 1
+                else:
+                    unspent.append(paragraph)
+            if not unspent:
+                continue
+            if len(unspent) == len(reservation.paragraphs):
+                estimate = reservation.estimate
+            else:
+                # Never give back more than the reservation took
+                unspent_estimate = self.estimate(unspent, reservation.limits)
+                estimate = TokenEstimate(min(unspent_estimate.input_tokens, reservation.estimate.input_tokens),
+                                         min(unspent_estimate.output_tokens, reservation.estimate.output_tokens),
+                                         min(unspent_estimate.cost_usd, reservation.estimate.cost_usd))
+            self._release(estimate, reservation.day)
+            released += estimate
+
+        self.reservations = []
+        self.reserved -= released
+        if released.total:
+            logger.info(f"Released ~{released.total} unspent tokens of submission {self.submission_id}")
+        return released
+
+    def _release(self, estimate: TokenEstimate, day: str) -> None:
+        if self.usage_repo is not None:
+            self.usage_repo.release(self.user_id, estimate.total, estimate.cost_usd, day)
+        if self.submission_tokens is not None:
+            self.submission_repo.release_summary_tokens(self.user_id, self.submission_id, estimate.total)
+
+    def _reserve(self, estimate: TokenEstimate, day: str) -> bool:
+        if self.usage_repo is not None and not self.usage_repo.reserve(
+                self.user_id, estimate.total, estimate.cost_usd, self.quota, day):
+            return False
+        if self.submission_tokens is not None and not self.submission_repo.reserve_summary_tokens(
+                self.user_id, self.submission_id, estimate.total, self.submission_tokens):
+            if self.usage_repo is not None:
+                self.usage_repo.release(self.user_id, estimate.total, estimate.cost_usd, day)
+            return False
+        return True
@@ -0,0 +1,143 @@
+"""
+Summarize many submissions at once through a provider batch job.
+
+Usage:
+    python bulk_summaries.py submit JOB_FILE (--user USER_ID | USER_ID/SUBMISSION_ID ...) [--redo]
+    python bulk_summaries.py collect JOB_FILE [--poll-seconds 60]
+
+`submit` writes the job to JOB_FILE, which `collect` reads back, waits on, and saves the results of.
+Paragraphs the job left without a summary are summarized interactively.
+
+Both count against the submission's token budget (SUBMISSION_TOKEN_BUDGET) and the user's
+daily quota, like the summaries job. Paragraphs the batch job leaves unsummarized keep
+what was reserved for them, so the interactive retry counts them a second time.
+
+SUMMARIES_BATCH_PROVIDER selects the provider: "openai" (the default), or "local" for the
+file-backed stand-in in SUMMARIES_BATCH_DIR, which answers with extractive summaries.
+"""
+###
+# Load environment variables before other code
+#
+# Do *NOT* load custom code before load_dotenv(), or else the env variables might not be loaded
+###
+from dotenv import load_dotenv
+load_dotenv()
+
+###
+# Load dependencies after this point
+###
+import argparse
+import json
+import sys
+
+import boto3
+from common.envvar import environment
+from common.logger import logger
+from common.submission_repo import submission_repo
+from common.summary_repo import summary_repo
+from common.usage_repo import UsageQuota, usage_repo
+from batch_jobs import BulkJob, BulkSummarizer, LocalBatchProvider, OpenAIBatchProvider
+from budget import SummaryBudget
+from paragraph_summarizer import OpenAIBackend, client, summarize_paragraphs
+
+PARAGRAPHS_BUCKET = environment.require('PARAGRAPHS_BUCKET')
+SUMMARIES_BATCH_PROVIDER = (environment.require('SUMMARIES_BATCH_PROVIDER')
+                            if environment.has('SUMMARIES_BATCH_PROVIDER') else 'openai')
+SUBMISSION_TOKEN_BUDGET = (int(environment.require('SUBMISSION_TOKEN_BUDGET'))
+                           if environment.has('SUBMISSION_TOKEN_BUDGET') else None)
+USAGE_QUOTA = UsageQuota.from_environment()
+
+s3 = boto3.client('s3')
+
+
+def batch_provider():
+    if SUMMARIES_BATCH_PROVIDER == 'local':
+        return LocalBatchProvider(environment.require('SUMMARIES_BATCH_DIR'))
+    return OpenAIBatchProvider(client)
+
+
+def summary_budget(user_id: str, submission_id: str) -> SummaryBudget:
+    """The budget of a submission's summaries from the OpenAI API, in batch jobs or not."""
+    return SummaryBudget(OpenAIBackend().estimate, user_id, submission_id,
+                         submission_tokens=SUBMISSION_TOKEN_BUDGET, submission_repo=submission_repo,
+                         quota=USAGE_QUOTA, usage_repo=usage_repo)
+
+
+def load_paragraphs(user_id: str, submission_id: str):
+    response = s3.get_object(Bucket=PARAGRAPHS_BUCKET, Key=f"uploads/{user_id}/{submission_id}.json")
+    return json.loads(response['Body'].read().decode('utf-8'))
+
+
+def submit(args, bulk: BulkSummarizer):
+    if args.user:
+        submissions = [(args.user, s.submission_id) for s in submission_repo.get_by_user(args.user)]
+    else:
+        submissions = [tuple(ref.split('/', 1)) for ref in args.submissions]
+
+    for user_id, submission_id in submissions:
+        skip = set() if args.redo else summary_repo.get_paragraph_numbers(user_id, submission_id)
+        added = bulk.add_submission(user_id, submission_id, load_paragraphs(user_id, submission_id), skip)
+        logger.info(f"Added {added} paragraphs of submission {submission_id}")
+
+    job = bulk.submit()
+    with open(args.job_file, 'w') as file:
+        file.write(job.to_json())
+    logger.info(f"Batch job {job.job_id} saved to {args.job_file}")
+
+
+def collect(args, bulk: BulkSummarizer):
+    with open(args.job_file) as file:
+        job = BulkJob.from_json(file.read())
+
+    status = bulk.wait(job, args.poll_seconds)
+    missing = bulk.collect(job, status)
+    for (user_id, submission_id), paragraph_numbers in missing.items():
+        logger.info(f"Summarizing {len(paragraph_numbers)} paragraphs of submission {submission_id} interactively")
+        paragraphs = load_paragraphs(user_id, submission_id)
+        budget = summary_budget(user_id, submission_id)
+
+        def save_summaries(positions, summaries):
+            batch_paragraphs = [paragraphs[paragraph_numbers[p]] for p in positions]
+            bulk.save(user_id, submission_id, [paragraph_numbers[p] for p in positions], summaries,
+                      paragraphs=batch_paragraphs)
+            budget.spend(batch_paragraphs)
+
+        try:
+            summarize_paragraphs([paragraphs[i] for i in paragraph_numbers], on_batch=save_summaries,
+                                 budget=budget.allow)
+        except Exception:
+            budget.release_unspent()
+            raise
+        bulk.mark_summarized(user_id, submission_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize submissions through a provider batch job")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    submit_parser = commands.add_parser('submit', help="Start a batch job")
+    submit_parser.add_argument('job_file')
+    submit_parser.add_argument('submissions', nargs='*', metavar='USER_ID/SUBMISSION_ID')
+    submit_parser.add_argument('--user', help="Every submission of this user")
+    submit_parser.add_argument('--redo', action='store_true',
+                               help="Summarize paragraphs again even if they have summaries, e.g. after a prompt change")
+
+    collect_parser = commands.add_parser('collect', help="Wait for a batch job and save its results")
+    collect_parser.add_argument('job_file')
+    collect_parser.add_argument('--poll-seconds', type=float, default=60)
+
+    args = parser.parse_args()
+    if args.command == 'submit' and not (args.user or args.submissions):
+        parser.error("Give --user or at least one USER_ID/SUBMISSION_ID")
+
+    # The local provider answers with extractive summaries, which cost nothing
+    bulk = BulkSummarizer(batch_provider(), summary_repo, submission_repo,
+                          budget_for=summary_budget if SUMMARIES_BATCH_PROVIDER != 'local' else None)
+    if args.command == 'submit':
+        submit(args, bulk)
+    else:
+        collect(args, bulk)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import os
+
+# The shared repos create their DynamoDB resources when they are imported
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from unittest.mock import MagicMock, patch
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from common.submission_repo import SubmissionRepo
+
+
+def create_table(dynamodb_resource, name, hash_key, range_key=None):
+    key_names = [hash_key] + ([range_key] if range_key else [])
+    return dynamodb_resource.create_table(
+        TableName=name,
+        KeySchema=[{'AttributeName': key, 'KeyType': key_type} for key, key_type in zip(key_names, ['HASH', 'RANGE'])],
+        AttributeDefinitions=[{'AttributeName': key, 'AttributeType': 'S'} for key in key_names],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+@pytest.fixture
+def dynamodb_resource():
+    """A mocked DynamoDB, empty for each test."""
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    with mock_aws():
+        yield boto3.resource('dynamodb', region_name='us-east-1')
+
+
+@pytest.fixture
+def submissions_table(dynamodb_resource):
+    return create_table(dynamodb_resource, 'submissions', 'user_id', 'submission_id')
+
+
+@pytest.fixture
+def submission_repo(submissions_table):
+    return SubmissionRepo(submissions_table)
+
+
+@pytest.fixture
+def summaries_table(dynamodb_resource):
+    return create_table(dynamodb_resource, 'summaries', 'user_id', 'submission_paragraph')
+
+
+@pytest.fixture
+def usage_table(dynamodb_resource):
+    return create_table(dynamodb_resource, 'usage', 'user_id', 'day')
+
+
+@pytest.fixture
+def rate_limit_table(dynamodb_resource):
+    return create_table(dynamodb_resource, 'rate_limits', 'bucket_key')
+
+
+@pytest.fixture
+def mock_openai_client():
+    """Fixture to mock the OpenAI client globally."""
+    with patch("paragraph_summarizer.client") as mock_client:
+        mock_chat = MagicMock()
+        mock_client.chat.completions.create = mock_chat
+        yield mock_chat
@@ -13,58 +13,158 @@ import json
 import signal
 import sys
 import boto3
-from common.constants import SUMMARIES_QUEUE, SUMMARIES_PER_SUBMISSION_LIMIT, PARAGRAPH_INTRO_WORDS
+from common.constants import SUMMARIES_QUEUE, SUMMARIES_PER_SUBMISSION_LIMIT, PARAGRAPH_INTRO_WORDS, \
+    SUMMARY_CACHE_TABLE, RATE_LIMIT_TABLE
 from common.envvar import environment
 from common.logger import logger
+from common.metrics import configure_metrics, count_items, stage
 from common.upload_notification import poll_sqs_for_s3_file_forever, S3Upload
 from common.sqs_client import sqs_client
 from common.summary_repo import NewSummary, summary_repo
 from common.submission_repo import submission_repo, SubmissionState
-from paragraph_summarizer import summarize_paragraphs
+from common.usage_repo import UsageQuota, usage_repo
+from budget import SummaryBudget
+from paragraph_summarizer import BACKENDS, RoutedBackend, summarize_paragraphs
+from rate_limiter import build_rate_limiter
+from summary_cache import build_summary_cache
 
 # Configuration
 PARAGRAPHS_BUCKET = environment.require('PARAGRAPHS_BUCKET')
+SUMMARY_CACHE_PATH = environment.require('SUMMARY_CACHE_PATH') if environment.has('SUMMARY_CACHE_PATH') else None
+SUMMARY_CACHE_SHARED = environment.has('SUMMARY_CACHE_SHARED')
+SUMMARY_CACHE_TTL_DAYS = int(environment.require('SUMMARY_CACHE_TTL_DAYS')) if environment.has('SUMMARY_CACHE_TTL_DAYS') else 30
+OPENAI_RPM = int(environment.require('OPENAI_RPM')) if environment.has('OPENAI_RPM') else None
+OPENAI_TPM = int(environment.require('OPENAI_TPM')) if environment.has('OPENAI_TPM') else None
+RATE_LIMIT_PATH = environment.require('RATE_LIMIT_PATH') if environment.has('RATE_LIMIT_PATH') else None
+RATE_LIMIT_SHARED = environment.has('RATE_LIMIT_SHARED')
+SUMMARIES_BACKEND = environment.require('SUMMARIES_BACKEND') if environment.has('SUMMARIES_BACKEND') else 'openai'
+if SUMMARIES_BACKEND not in BACKENDS:
+    raise ValueError(f"SUMMARIES_BACKEND must be one of {', '.join(BACKENDS)}, not {SUMMARIES_BACKEND}")
+SUBMISSION_TOKEN_BUDGET = (int(environment.require('SUBMISSION_TOKEN_BUDGET'))
+                           if environment.has('SUBMISSION_TOKEN_BUDGET') else None)
+USAGE_QUOTA = UsageQuota.from_environment()
 
 # AWS clients
 s3 = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
 queue_client = sqs_client.for_queue(SUMMARIES_QUEUE)
 
-def paragraph_should_be_summarized(paragraph: str) -> bool:
-    return len(paragraph.strip()) >= 300
+# Summary cache: a local SQLite file and/or the DynamoDB table shared by all workers
+summary_cache = build_summary_cache(
+    sqlite_path=SUMMARY_CACHE_PATH,
+    dynamodb_table=dynamodb.Table(SUMMARY_CACHE_TABLE) if SUMMARY_CACHE_SHARED else None,
+    ttl_seconds=SUMMARY_CACHE_TTL_DAYS * 24 * 60 * 60,
+)
+
+# Summaries come from the OpenAI API, the local extractive summarizer (e.g. for bulk backfills),
+# or a mix of model tiers picked per paragraph by routing rules
+summarizer_backend = BACKENDS[SUMMARIES_BACKEND]()
+
+# OpenAI rate limits, shared by the processes on this host (SQLite) or by all workers (DynamoDB)
+rate_limiter = build_rate_limiter(
+    requests_per_minute=OPENAI_RPM,
+    tokens_per_minute=OPENAI_TPM,
+    sqlite_path=RATE_LIMIT_PATH,
+    dynamodb_table=dynamodb.Table(RATE_LIMIT_TABLE) if RATE_LIMIT_SHARED else None,
+)
 
 def process_record(s3_upload: S3Upload):
     user_id = s3_upload.user_id
     submission_id = s3_upload.file_hash
-    with open(s3_upload.tmp_file_path, 'r', encoding='utf-8', errors='replace') as file:
+    chunk = s3_upload.chunk
+    if chunk is None and submission_repo.is_chunked(user_id, submission_id):
+        logger.info(f"Submission {submission_id} is processed in chunks; ignoring whole-file notification")
+        return
+
+    with open(s3_upload.tmp_file_path, 'r', encoding='utf-8', errors='replace') as file, stage('load_paragraphs'):
         paragraphs = json.load(file)
 
-    # Process each paragraph and save its summary immediately
+    if chunk is None:
+        start, end = 0, len(paragraphs)
+    else:
+        start, end = chunk.start, chunk.end
+    if end > SUMMARIES_PER_SUBMISSION_LIMIT + 1:
+        if start <= SUMMARIES_PER_SUBMISSION_LIMIT:
+            logger.error(f"Limiting submission {submission_id} to {SUMMARIES_PER_SUBMISSION_LIMIT} summaries")
+        # Chunks past the per-submission limit have nothing to summarize
+        end = max(start, SUMMARIES_PER_SUBMISSION_LIMIT + 1)
+
+    # A retried job resumes where the last attempt stopped
+    with stage('dynamodb_read'):
+        stored = summary_repo.get_paragraph_numbers(user_id, submission_id)
+    paragraph_numbers = [i for i in range(start, end) if i not in stored]
+    logger.info(f"Received {len(paragraphs)} paragraphs for submission {submission_id}, "
+                f"summarizing paragraphs {start}-{end} ({end - start - len(paragraph_numbers)} already saved)")
+
+    # Paragraphs are checked against the submission's token budget and the user's daily quota
+    # before any are sent, and the estimated usage is recorded
+    budget = SummaryBudget(summarizer_backend.estimate, user_id, submission_id,
+                           submission_tokens=SUBMISSION_TOKEN_BUDGET, submission_repo=submission_repo,
+                           quota=USAGE_QUOTA, usage_repo=usage_repo)
+
     summaries_count = 0
 
-    logger.info(f"Received {len(paragraphs)} paragraphs for submission {submission_id}")
-    summaries = summarize_paragraphs(paragraphs)
-    for i, summary_text in enumerate(summaries):
-        # Save each summary immediately instead of batching
-        new_summary = NewSummary(
-            user_id=user_id,
-            submission_id=submission_id,
-            paragraph_number=i,
-            paragraph_start=' '.join(paragraphs[i].split()[:PARAGRAPH_INTRO_WORDS]),
-            summary=summary_text,
+    def save_summaries(positions, summaries):
+        """Save each batch of summaries as soon as it is ready, and record the progress."""
+        nonlocal summaries_count
+        batch_numbers = [paragraph_numbers[p] for p in positions]
+        # Within summarize_paragraphs' own stage
+        with stage('dynamodb_write'):
+            summary_repo.save_many([
+                NewSummary(
+                    user_id=user_id,
+                    submission_id=submission_id,
+                    paragraph_number=i,
+                    paragraph_start=' '.join(paragraphs[i].split()[:PARAGRAPH_INTRO_WORDS]),
+                    summary=summary_text,
+                )
+                for i, summary_text in zip(batch_numbers, summaries)
+            ])
+            submission_repo.mark_paragraphs_summarized(user_id, submission_id, batch_numbers)
+        summaries_count += len(batch_numbers)
+        count_items('summarize_paragraphs', 'summaries', len(batch_numbers))
+        budget.spend(paragraphs[i] for i in batch_numbers)
+
+    retried = []
+    skipped = []
+    # The backend outlives the record, so its statistics are reported for this record only
+    tier_stats = summarizer_backend.report() if isinstance(summarizer_backend, RoutedBackend) else None
+    if paragraph_numbers:
+        try:
+            with stage('summarize_paragraphs'):
+                summarize_paragraphs([paragraphs[i] for i in paragraph_numbers], cache=summary_cache,
+                                     retried=retried, rate_limiter=rate_limiter, on_batch=save_summaries,
+                                     backend=summarizer_backend, budget=budget.allow, skipped=skipped)
+        except Exception:
+            # The retried job reserves again for the paragraphs this attempt did not deliver
+            budget.release_unspent()
+            raise
+        count_items('summarize_paragraphs', 'paragraphs', len(paragraph_numbers))
+        count_items('summarize_paragraphs', 'skipped', len(skipped))
+    if retried:
+        logger.warning(f"Summaries for paragraphs {[paragraph_numbers[p] for p in retried]} "
+                       f"of submission {submission_id} needed retries")
+    if skipped:
+        logger.warning(f"Left {len(skipped)} paragraphs of submission {submission_id} unsummarized: "
+                       f"over the submission's budget or the user's daily quota")
+    if budget.reserved.total:
+        logger.info(f"Reserved ~{budget.reserved.total} tokens "
+                    f"(~${budget.reserved.cost_usd:.4f}) for submission {submission_id}")
+    if isinstance(summarizer_backend, RoutedBackend):
+        summarizer_backend.log_report(since=tier_stats)
+
+    with stage('dynamodb_write'):
+        if chunk is not None and not submission_repo.mark_chunk_done(
+                user_id, submission_id, SubmissionState.SUMMARIZED, chunk):
+            logger.info(f"Saved {summaries_count} paragraph summaries for chunk {chunk.index} "
+                        f"of submission {submission_id}")
+            return
+
+        submission_repo.update_state(
+            s3_upload.user_id,
+            s3_upload.file_hash,
+            SubmissionState.SUMMARIZED.value
         )
-        summary_repo.create(new_summary)
-        summaries_count += 1
-
-        if summaries_count > SUMMARIES_PER_SUBMISSION_LIMIT:
-            logger.error(f"Limiting submission {s3_upload.file_hash} to {SUMMARIES_PER_SUBMISSION_LIMIT} summaries")
-            break
-
-    submission_repo.update_state(
-        s3_upload.user_id,
-        s3_upload.file_hash,
-        SubmissionState.SUMMARIZED.value
-    )
 
     logger.info(f"Successfully saved {summaries_count} paragraph summaries for submission {submission_id}")
 
@@ -82,10 +182,13 @@ def main():
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
 
+    configure_metrics('summaries')
+
     for s3_upload in poll_sqs_for_s3_file_forever(queue_client, 5):
         logger.info(f"Processing file from bucket {s3_upload.bucket} with key {s3_upload.key}...")
         try:
-            process_record(s3_upload)
+            with stage('process_record'):
+                process_record(s3_upload)
         except Exception as e:
             logger.error(f"Error processing file {s3_upload.key}: {e}", exc_info=True)
 
@@ -2,7 +2,21 @@ import openai
 import os
 import logging
 import json
-from typing import List
+import re
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, fields, replace
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from batch_planner import (PARAGRAPH_OVERHEAD_TOKENS, ModelLimits, cost_usd, estimate_tokens, limits_for,
+                           plan_batches)
+from extractive_summarizer import ExtractiveSummarizer
+from rate_limiter import RateLimiter
+from budget import TokenEstimate, estimate_summaries
+from summary_cache import SummaryCache, cache_key
 
 # Configure logging to write errors to a file instead of CLI
 LOG_FILE = "paragraph_summarizer_errors.log"
@@ -21,6 +35,14 @@ if not API_KEY:
 # Initialize OpenAI client
 client = openai.OpenAI(api_key=API_KEY)
 
+MODEL = "gpt-4o-mini"
+
+# Bump whenever the prompts change, so that cached summaries from the old prompts are not used
+PROMPT_VERSION = 1
+
+# How many batches of one submission may be waiting on the API at the same time
+MAX_CONCURRENT_BATCHES = int(os.getenv("SUMMARIES_MAX_CONCURRENT_BATCHES", "4"))
+
 # System prompt for contextualizing the AI's role
 SYSTEM_PROMPT_TEMPLATE = """
 You are a %(subject)s teacher in the US, with many immigrant and ESL students in your class.
@@ -134,25 +156,481 @@ def get_summaries_schema(paragraph_count: int) -> dict:
         }
     }
 
-def summarize_paragraphs(paragraphs: List[str], subject: str = "", batch_size: int = 20) -> List[str]:
+def build_summaries_request(paragraph_batch: List[str], subject: str = "", model: str = MODEL) -> dict:
+    """
+    The chat completion request that summarizes one batch of paragraphs.
+
+    Returns:
+        dict: The model, messages and response format, as keyword arguments for the API
+    """
+    batch_size_actual = len(paragraph_batch)
+
+    # Format paragraphs for the API request
+    template = "\n\n---PARAGRAPH {}---\n{}"
+    paragraphs_text = "\n\n".join([template.format(j+1, p) for j, p in enumerate(paragraph_batch)])
+    user_message = f"""
+Please summarize the following {batch_size_actual} paragraphs, each with a single sentence:
+---
+
+{paragraphs_text}
+
+---
+
+For each paragraph, provide a one-sentence summary that captures the key information.
+You MUST provide exactly {batch_size_actual} summaries, one for each paragraph.
+""".strip()
+
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT_TEMPLATE % {'subject': subject}},
+            {"role": "user", "content": user_message}
+        ],
+        # Get a schema that enforces exactly the right number of summaries
+        "response_format": get_summaries_schema(batch_size_actual),
+    }
+
+def parse_summaries(response_content: str, paragraph_count: int) -> Dict[int, str]:
+    """
+    Keep whichever summaries in a response are usable.
+
+    Returns:
+        The summaries by 1-indexed paragraph number, for the paragraph numbers that were
+        answered exactly once
+
+    Raises:
+        ValueError: If the response is not valid JSON.
+    """
+    try:
+        response_data = json.loads(response_content.strip())
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON parsing error: {e}")
+        raise ValueError(f"Failed to parse JSON response: {e}")
+
+    summaries = response_data.get("summaries", [])
+
+    # Map paragraph numbers to summaries. A number answered more than once is ambiguous,
+    # so neither answer is used.
+    summary_map = {}
+    duplicates = set()
+    for summary_item in summaries:
+        paragraph_number = summary_item.get("paragraph_number")
+        summary = summary_item.get("summary")
+
+        if paragraph_number and 1 <= paragraph_number <= paragraph_count and summary:
+            if paragraph_number in summary_map:
+                duplicates.add(paragraph_number)
+            summary_map[paragraph_number] = summary
+    for paragraph_number in duplicates:
+        del summary_map[paragraph_number]
+
+    return summary_map
+
+def request_summaries(paragraph_batch: List[str], subject: str = "",
+                      rate_limiter: Optional[RateLimiter] = None, model: str = MODEL,
+                      api_client: Optional[openai.OpenAI] = None) -> Dict[int, str]:
+    """
+    Makes the API call for one batch of paragraphs, and keeps whichever summaries are usable.
+
+    With a rate limiter, the call waits for capacity under its limits, and is retried on
+    rate-limit errors. The call goes to api_client if given, else to the module's client.
+
+    Returns:
+        The summaries by 1-indexed paragraph number, for the paragraph numbers that were
+        answered exactly once
+
+    Raises:
+        ValueError: If the response cannot be parsed at all.
+        openai.OpenAIError: If an API-related error occurs.
+    """
+    batch_size_actual = len(paragraph_batch)
+
+    try:
+        request = build_summaries_request(paragraph_batch, subject, model)
+
+        def create():
+            # Make the API call with the batch using structured output
+            return (api_client or client).chat.completions.create(**request)
+
+        logger.info(f"Sending a batch of {batch_size_actual} paragraphs to API...")
+        started = time.perf_counter()
+        if rate_limiter is None:
+            response = create()
+        else:
+            # Rate limits count the prompt plus the expected output
+            request_tokens = (sum(estimate_tokens(message["content"]) for message in request["messages"])
+                              + batch_size_actual * limits_for(model).output_tokens_per_paragraph)
+            # The API limits each model separately
+            response = rate_limiter.for_model(model).call(create, request_tokens,
+                                                          rate_limit_errors=(openai.RateLimitError,))
+        logger.info(f"Batch of {batch_size_actual} paragraphs took {time.perf_counter() - started:.2f}s")
+
+        # Ensure valid response structure
+        if not response or not response.choices:
+            raise ValueError("Invalid response structure received from OpenAI API.")
+
+        return parse_summaries(response.choices[0].message.content, batch_size_actual)
+
+    except openai.OpenAIError as e:
+        logger.error(f"OpenAI API error: {e}")
+        raise  # Reraise the OpenAI error to be handled by the caller
+    except Exception as e:
+        logger.error(f"Unexpected error while summarizing batch: {e}")
+        raise  # Reraise any other exception
+
+def paragraph_should_be_summarized(paragraph: str) -> bool:
+    """Very short paragraphs are their own summaries."""
+    return len(paragraph.strip()) >= 300
+
+class SummarizerBackend(ABC):
+    """Interface for summarizer backends, which summarize a batch of paragraphs at a time."""
+    # Together, identify the backend's summaries in the summary cache
+    model: str
+    version: int
+    # Whether summaries cost tokens, and so count against budgets
+    billed: bool = True
+
+    @abstractmethod
+    def summarize_batch(self, paragraph_batch: List[str], subject: str = "",
+                        rate_limiter: Optional[RateLimiter] = None) -> Dict[int, str]:
+        """
+        Returns:
+            The summaries by 1-indexed paragraph number. Paragraphs without a usable summary are left out.
+        """
+        raise NotImplementedError
+
+    def estimate(self, paragraphs: List[str], limits: ModelLimits) -> TokenEstimate:
+        """The tokens and price of summarizing the paragraphs, in batches within the limits; none if not billed."""
+        if not self.billed:
+            return TokenEstimate()
+        return estimate_summaries(paragraphs, limits, self.model)
+
+class OpenAIBackend(SummarizerBackend):
+    """Summaries written by the OpenAI API, by one model."""
+    version = PROMPT_VERSION
+
+    def __init__(self, model: str = MODEL, api_client: Optional[openai.OpenAI] = None):
+        self.model = model
+        self.api_client = api_client
+
+    def summarize_batch(self, paragraph_batch, subject="", rate_limiter=None):
+        return request_summaries(paragraph_batch, subject, rate_limiter, self.model, self.api_client)
+
+class ExtractiveBackend(SummarizerBackend):
+    """Each paragraph's most central sentence, picked locally (see extractive_summarizer)."""
+    model = "extractive-textrank"
+    version = 1
+    billed = False
+
+    def __init__(self, summarizer: Optional[ExtractiveSummarizer] = None):
+        self.summarizer = summarizer or ExtractiveSummarizer()
+
+    def summarize_batch(self, paragraph_batch, subject="", rate_limiter=None):
+        return {j + 1: self.summarizer.summarize(paragraph) for j, paragraph in enumerate(paragraph_batch)}
+
+# Model routing
+#
+# Each paragraph goes to a model tier, picked by the first routing rule it matches. Rules
+# look at the paragraph's length, and at its average sentence length, as a cheap proxy
+# for how hard it is to read. A tier that fails hands its paragraphs to its fallback tier.
+
+SENTENCE_END_REGEX = re.compile(r"[.!?]+(?:\s+|$)")
+
+def average_sentence_words(paragraph: str) -> float:
+    sentences = [s for s in SENTENCE_END_REGEX.split(paragraph) if s.strip()]
+    return len(paragraph.split()) / max(1, len(sentences))
+
+@dataclass(frozen=True)
+class RoutingRule:
+    """Sends paragraphs that meet all of its conditions to a tier. A rule without conditions matches all."""
+    tier: str
+    max_chars: Optional[int] = None
+    max_sentence_words: Optional[float] = None
+
+    def matches(self, paragraph: str) -> bool:
+        return ((self.max_chars is None or len(paragraph.strip()) <= self.max_chars)
+                and (self.max_sentence_words is None
+                     or average_sentence_words(paragraph) <= self.max_sentence_words))
+
+@dataclass(frozen=True)
+class ModelTier:
+    backend: SummarizerBackend
+    # Tier that gets the paragraphs if this one raises
+    fallback: Optional[str] = None
+
+@dataclass
+class TierStats:
+    calls: int = 0
+    paragraphs: int = 0
+    seconds: float = 0.0
+    # Estimated, for billed tiers
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+    errors: int = 0
+    # Paragraphs this tier summarized after another tier failed on them
+    fallback_paragraphs: int = 0
+
+    def since(self, earlier: 'TierStats') -> 'TierStats':
+        """What was recorded after `earlier` was taken, e.g. during one job."""
+        return TierStats(**{field.name: getattr(self, field.name) - getattr(earlier, field.name)
+                            for field in fields(self)})
+
+def default_tiers() -> Dict[str, ModelTier]:
+    return {
+        'local': ModelTier(ExtractiveBackend()),
+        'mini': ModelTier(OpenAIBackend("gpt-4o-mini"), fallback='local'),
+        'full': ModelTier(OpenAIBackend("gpt-4o"), fallback='mini'),
+    }
+
+# Paragraphs of a few sentences are summarized well enough by their most central sentence
+DEFAULT_ROUTES = [
+    RoutingRule('local', max_chars=400),
+    RoutingRule('mini'),
+]
+
+def parse_routes(routes_json: str) -> List[RoutingRule]:
+    """Routing rules from JSON, like [{"tier": "local", "max_chars": 400}, {"tier": "mini"}]."""
+    return [RoutingRule(**rule) for rule in json.loads(routes_json)]
+
+class RoutedBackend(SummarizerBackend):
+    """
+    Summaries from several model tiers, by routing rules.
+
+    Batches are planned within the limits of the tier of the last rule, which also gets
+    the paragraphs that match no rule, and are budgeted by the tier each paragraph is
+    routed to. Keeps latency, estimated cost and errors per tier.
+    """
+
+    def __init__(self, tiers: Dict[str, ModelTier], rules: List[RoutingRule]):
+        if not rules:
+            raise ValueError("At least one routing rule is needed")
+        for name in [rule.tier for rule in rules] + [t.fallback for t in tiers.values() if t.fallback]:
+            if name not in tiers:
+                raise ValueError(f"Unknown model tier {name}; tiers are {', '.join(tiers)}")
+        for name in tiers:
+            seen = {name}
+            while tiers[name].fallback is not None:
+                name = tiers[name].fallback
+                if name in seen:
+                    raise ValueError(f"Model tier fallbacks loop through {name}")
+                seen.add(name)
+
+        self.tiers = tiers
+        self.rules = rules
+        default = tiers[rules[-1].tier].backend
+        self.model = default.model
+        # Which model summarizes a paragraph depends on the routes, so they are part of the cache key
+        self.version = zlib.crc32(repr((
+            rules, sorted((name, t.backend.model, t.backend.version, t.fallback) for name, t in tiers.items())
+        )).encode())
+        self.billed = any(t.backend.billed for t in tiers.values())
+        self.stats = {name: TierStats() for name in tiers}
+        self._lock = threading.Lock()
+
+    def route(self, paragraph: str) -> str:
+        for rule in self.rules:
+            if rule.matches(paragraph):
+                return rule.tier
+        return self.rules[-1].tier
+
+    def summarize_batch(self, paragraph_batch, subject="", rate_limiter=None):
+        positions_by_tier: Dict[str, List[int]] = {}
+        for j, paragraph in enumerate(paragraph_batch):
+            positions_by_tier.setdefault(self.route(paragraph), []).append(j)
+
+        summaries = {}
+        for tier_name, positions in positions_by_tier.items():
+            tier_summaries = self._summarize_on_tier(tier_name, [paragraph_batch[j] for j in positions],
+                                                     subject, rate_limiter)
+            for k, j in enumerate(positions):
+                if k + 1 in tier_summaries:
+                    summaries[j + 1] = tier_summaries[k + 1]
+        return summaries
+
+    def estimate(self, paragraphs, limits):
+        """Each planned batch, estimated as the requests its paragraphs make to their tiers, before any fallback."""
+        estimate = TokenEstimate()
+        for positions in plan_batches(paragraphs, limits):
+            by_tier: Dict[str, List[str]] = {}
+            for p in positions:
+                by_tier.setdefault(self.route(paragraphs[p]), []).append(paragraphs[p])
+            for tier_name, tier_paragraphs in by_tier.items():
+                estimate += self.tiers[tier_name].backend.estimate(tier_paragraphs, limits)
+        return estimate
+
+    def _summarize_on_tier(self, tier_name: str, paragraphs: List[str], subject: str,
+                           rate_limiter: Optional[RateLimiter], is_fallback: bool = False) -> Dict[int, str]:
+        tier = self.tiers[tier_name]
+        started = time.perf_counter()
+        try:
+            summaries = tier.backend.summarize_batch(paragraphs, subject, rate_limiter)
+        except Exception as e:
+            self._record(tier_name, paragraphs, {}, time.perf_counter() - started, is_fallback, failed=True)
+            if tier.fallback is None:
+                raise
+            logger.warning(f"Model tier {tier_name} failed on {len(paragraphs)} paragraphs; "
+                           f"falling back to {tier.fallback}: {e}")
+            return self._summarize_on_tier(tier.fallback, paragraphs, subject, rate_limiter, is_fallback=True)
+        self._record(tier_name, paragraphs, summaries, time.perf_counter() - started, is_fallback)
+        return summaries
+
+    def _record(self, tier_name: str, paragraphs: List[str], summaries: Dict[int, str], seconds: float,
+                is_fallback: bool, failed: bool = False):
+        backend = self.tiers[tier_name].backend
+        input_tokens = output_tokens = 0
+        if backend.billed:
+            input_tokens = (estimate_tokens(SYSTEM_PROMPT_TEMPLATE)
+                            + sum(estimate_tokens(p) + PARAGRAPH_OVERHEAD_TOKENS for p in paragraphs))
+            output_tokens = sum(estimate_tokens(summary) for summary in summaries.values())
+        with self._lock:
+            stats = self.stats[tier_name]
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.cost_usd += cost_usd(backend.model, input_tokens, output_tokens)
+            if failed:
+                stats.errors += 1
+                return
+            stats.paragraphs += len(paragraphs)
+            if is_fallback:
+                stats.fallback_paragraphs += len(paragraphs)
+
+    def report(self) -> Dict[str, TierStats]:
+        """A snapshot of the statistics per tier, since the backend was created."""
+        with self._lock:
+            return {name: replace(stats) for name, stats in self.stats.items()}
+
+    def log_report(self, since: Optional[Dict[str, TierStats]] = None) -> None:
+        """Log the statistics per tier, or only those recorded after the `since` report was taken."""
+        for name, stats in self.report().items():
+            if since is not None:
+                stats = stats.since(since[name])
+            if not stats.calls:
+                continue
+            logger.info(f"Model tier {name} ({self.tiers[name].backend.model}): {stats.paragraphs} paragraphs "
+                        f"in {stats.calls} calls, {stats.seconds / stats.calls:.2f}s per call, "
+                        f"~{stats.input_tokens + stats.output_tokens} tokens (~${stats.cost_usd:.4f}), "
+                        f"{stats.errors} errors, {stats.fallback_paragraphs} paragraphs from fallbacks")
+
+def routed_backend_from_environment() -> RoutedBackend:
+    """The default tiers, routed by the rules in SUMMARIES_ROUTES (JSON) if set, else by DEFAULT_ROUTES."""
+    routes_json = os.getenv("SUMMARIES_ROUTES")
+    return RoutedBackend(default_tiers(), parse_routes(routes_json) if routes_json else DEFAULT_ROUTES)
+
+BACKENDS = {
+    'openai': OpenAIBackend,
+    'extractive': ExtractiveBackend,
+    'routed': routed_backend_from_environment,
+}
+
+def summarize_with_recovery(paragraph_batch: List[str], subject: str = "",
+                            rate_limiter: Optional[RateLimiter] = None,
+                            backend: Optional[SummarizerBackend] = None) -> tuple[List[str], List[int]]:
+    """
+    Summarizes one batch, recovering from partially invalid responses.
+
+    Summaries that validated are kept. The paragraphs left without one are requested again,
+    split in two halves, and so on down to single paragraphs.
+
+    Returns:
+        One summary per paragraph, in order, and the positions in paragraph_batch of the
+        paragraphs that needed a retry
+
+    Raises:
+        ValueError: If a single paragraph still gets no valid summary.
+        openai.OpenAIError: If an API-related error occurs.
+    """
+    backend = backend or OpenAIBackend()
+    summaries: Dict[int, str] = {}
+    retried: List[int] = []
+
+    def summarize_positions(positions: List[int]):
+        try:
+            summary_map = backend.summarize_batch([paragraph_batch[p] for p in positions], subject, rate_limiter)
+        except ValueError as e:
+            if len(positions) == 1:
+                raise
+            logger.warning(f"Invalid response for a batch of {len(positions)} paragraphs: {e}")
+            summary_map = {}
+        for j, position in enumerate(positions):
+            if j + 1 in summary_map:
+                summaries[position] = summary_map[j + 1]
+        missing = [p for p in positions if p not in summaries]
+        if not missing:
+            return
+        if len(positions) == 1:
+            raise ValueError(f"No valid summary for paragraph {positions[0] + 1} of the batch")
+
+        logger.warning(f"{len(missing)} of {len(positions)} summaries missing; retrying those paragraphs")
+        retried.extend(missing)
+        if len(missing) == 1:
+            summarize_positions(missing)
+        else:
+            half = len(missing) // 2
+            summarize_positions(missing[:half])
+            summarize_positions(missing[half:])
+
+    summarize_positions(list(range(len(paragraph_batch))))
+    return [summaries[p] for p in range(len(paragraph_batch))], sorted(set(retried))
+
+def summarize_paragraphs(paragraphs: List[str], subject: str = "", batch_size: Optional[int] = None,
+                         max_concurrency: int = MAX_CONCURRENT_BATCHES,
+                         cache: Optional[SummaryCache] = None,
+                         limits: Optional[ModelLimits] = None,
+                         retried: Optional[List[int]] = None,
+                         rate_limiter: Optional[RateLimiter] = None,
+                         on_batch: Optional[Callable[[List[int], List[str]], None]] = None,
+                         backend: Optional[SummarizerBackend] = None,
+                         budget: Optional[Callable[[List[str], ModelLimits], int]] = None,
+                         skipped: Optional[List[int]] = None) -> List[Optional[str]]:
     """
     Summarizes a list of paragraphs into single sentences, processing them in batches.
 
+    Paragraphs are packed into batches by estimated input and output tokens (see batch_planner).
+
     Args:
         paragraphs (List[str]): The list of paragraphs to be summarized.
         subject (str, optional): The subject matter of the text (e.g., "history", "science").
                                  Defaults to an empty string.
-        batch_size (int, optional): Number of paragraphs to process in each API call.
-                                   Defaults to 20.
+        batch_size (int, optional): Maximum number of paragraphs to process in each API call.
+                                   Defaults to the model's limit.
+        max_concurrency (int, optional): Maximum number of batches in flight at once.
+                                         1 sends batches one after another.
+                                         Defaults to MAX_CONCURRENT_BATCHES.
+        cache (SummaryCache, optional): Where to look summaries up before calling the API,
+                                        and to store new ones.
+        limits (ModelLimits, optional): Token budgets per request. Defaults to the model's limits.
+        retried (List[int], optional): If given, the indices of the paragraphs whose summaries
+                                       had to be requested again are appended to it.
+        rate_limiter (RateLimiter, optional): Schedules API calls under the provider's rate limits,
+                                              and retries rate-limited calls.
+        on_batch (Callable, optional): Called with (indices, summaries) as soon as the summaries of
+                                       some paragraphs are ready, so that they can be saved before the
+                                       rest are done. Every paragraph is passed to it exactly once,
+                                       from the calling thread.
+        backend (SummarizerBackend, optional): What writes the summaries. Defaults to the OpenAI API.
+        budget (Callable, optional): Called with the paragraphs that still need the API (neither short
+                                     nor cached) before any request, returns how many of the leading
+                                     ones may be sent (see budget.SummaryBudget.allow). Not used for
+                                     backends that are not billed.
+        skipped (List[int], optional): If given, the indices of the paragraphs left unsummarized
+                                       because they were over the budget are appended to it.
 
     Returns:
-        List[str]: A list of one-sentence summaries corresponding to each input paragraph.
+        List[str]: A list of one-sentence summaries corresponding to each input paragraph,
+                   with None for paragraphs over the budget.
 
     Raises:
-        ValueError: If an invalid response is received.
+        ValueError: If a paragraph gets no valid summary, even on its own.
         openai.OpenAIError: If an API-related error occurs.
         Exception: If any other unexpected issue happens.
+        With several batches in flight, the first batch to fail raises its error,
+        and batches that have not started yet are cancelled.
     """
+    backend = backend or OpenAIBackend()
+
     # Create a copy of the paragraphs list to avoid modifying the original
     results = paragraphs.copy()
 
@@ -161,99 +639,108 @@ def summarize_paragraphs(paragraphs: List[str], subject: str = "", batch_size: i
     indices_to_summarize = []
 
     for i, paragraph in enumerate(paragraphs):
-        if len(paragraph.strip()) < 300:
+        if not paragraph_should_be_summarized(paragraph):
             # Keep very short paragraphs as is
             continue
         else:
             to_summarize.append(paragraph)
             indices_to_summarize.append(i)
 
-    # Process paragraphs in batches
-    for i in range(0, len(to_summarize), batch_size):
-        paragraph_batch = to_summarize[i:i+batch_size]
-        batch_indices = indices_to_summarize[i:i+batch_size]
-        batch_size_actual = len(paragraph_batch)
-
-        try:
-            # Format paragraphs for the API request
-            template = "\n\n---PARAGRAPH {}---\n{}"
-            paragraphs_text = "\n\n".join([template.format(j+1, p) for j, p in enumerate(paragraph_batch)])
-            user_message = f"""
-Please summarize the following {batch_size_actual} paragraphs, each with a single sentence:
----
-
-{paragraphs_text}
-
----
-
-For each paragraph, provide a one-sentence summary that captures the key information.
-You MUST provide exactly {batch_size_actual} summaries, one for each paragraph.
-""".strip()
+    if cache is not None and to_summarize:
+        to_summarize, indices_to_summarize = apply_cached_summaries(
+            cache, to_summarize, indices_to_summarize, subject, results, backend)
+
+    if limits is None:
+        limits = limits_for(backend.model)
+    if batch_size is not None:
+        limits = replace(limits, max_paragraphs=batch_size)
+
+    if budget is not None and backend.billed and to_summarize:
+        # Paragraphs over the budget are dropped before anything is paid for them
+        affordable = budget(to_summarize, limits)
+        for i in indices_to_summarize[affordable:]:
+            results[i] = None
+        if skipped is not None:
+            skipped.extend(indices_to_summarize[affordable:])
+        to_summarize, indices_to_summarize = to_summarize[:affordable], indices_to_summarize[:affordable]
+
+    if on_batch is not None:
+        # Short paragraphs and cached summaries are ready straight away
+        pending = set(indices_to_summarize)
+        ready = [i for i in range(len(paragraphs)) if i not in pending and results[i] is not None]
+        if ready:
+            on_batch(ready, [results[i] for i in ready])
+    batches = [
+        ([to_summarize[p] for p in positions], [indices_to_summarize[p] for p in positions])
+        for positions in plan_batches(to_summarize, limits)
+    ]
+
+    def finish_batch(paragraph_batch: List[str], batch_indices: List[int],
+                     summaries: List[str], retried_positions: List[int]):
+        for batch_index, summary in zip(batch_indices, summaries):
+            results[batch_index] = summary
+        if retried is not None:
+            retried.extend(batch_indices[p] for p in retried_positions)
+        if cache is not None:
+            cache.put_many({
+                cache_key(paragraph, subject, backend.model, backend.version): summary
+                for paragraph, summary in zip(paragraph_batch, summaries)
+            })
+        if on_batch is not None:
+            on_batch(batch_indices, summaries)
+
+    if max_concurrency <= 1 or len(batches) <= 1:
+        for paragraph_batch, batch_indices in batches:
+            finish_batch(paragraph_batch, batch_indices,
+                         *summarize_with_recovery(paragraph_batch, subject, rate_limiter, backend))
+    else:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as executor:
+            futures = {
+                executor.submit(summarize_with_recovery, paragraph_batch, subject, rate_limiter, backend):
+                    (paragraph_batch, batch_indices)
+                for paragraph_batch, batch_indices in batches
+            }
+            try:
+                # Batches are finished (and passed to on_batch) in the order they complete
+                for future in as_completed(futures):
+                    finish_batch(*futures[future], *future.result())
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        logger.info(f"Summarized {len(batches)} batches, up to {max_concurrency} at a time, "
+                    f"in {time.perf_counter() - started:.2f}s")
 
-            # Get a schema that enforces exactly the right number of summaries
-            response_format = get_summaries_schema(batch_size_actual)
+    return results
 
-            # Create a properly typed response format object
-            # response_format = {
-            #     "type": "json_schema",
-            #     "json_schema": batch_schema
-            # }
+def apply_cached_summaries(cache: SummaryCache, to_summarize: List[str], indices_to_summarize: List[int],
+                           subject: str, results: List[str],
+                           backend: SummarizerBackend) -> tuple[List[str], List[int]]:
+    """
+    Fill results with cached summaries, and log the hit ratio and the tokens that saved.
 
-            logger.info(f"Sending a batch of {batch_size_actual} paragraphs to API...")
-            # Make the API call with the batch using structured output
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT_TEMPLATE % {'subject': subject}},
-                    {"role": "user", "content": user_message}
-                ],
-                response_format=response_format
-            )
-
-            # Ensure valid response structure
-            if not response or not response.choices:
-                raise ValueError("Invalid response structure received from OpenAI API.")
-
-            # Parse the JSON response
-            response_content = response.choices[0].message.content.strip()
-            response_data = json.loads(response_content)
-
-            # Verify we have the correct number of summaries
-            summaries = response_data.get("summaries", [])
-            if len(summaries) != batch_size_actual:
-                raise ValueError(f"Expected {batch_size_actual} summaries, but received {len(summaries)}")
-
-            # Create a mapping to ensure we have all paragraph numbers represented exactly once
-            summary_map = {}
-            for summary_item in summaries:
-                paragraph_number = summary_item.get("paragraph_number")
-                summary = summary_item.get("summary")
-
-                if paragraph_number and 1 <= paragraph_number <= batch_size_actual:
-                    summary_map[paragraph_number] = summary
-
-            # Verify all paragraph numbers are present
-            if len(summary_map) != batch_size_actual:
-                missing_numbers = set(range(1, batch_size_actual + 1)) - set(summary_map.keys())
-                raise ValueError(f"Missing summaries for paragraphs: {missing_numbers}")
-
-            # Update results using the verified mapping
-            for paragraph_number, summary in summary_map.items():
-                # Convert from 1-indexed (API response) to 0-indexed (batch array)
-                batch_index = paragraph_number - 1
-                results[batch_indices[batch_index]] = summary
-
-        except openai.OpenAIError as e:
-            logger.error(f"OpenAI API error: {e}")
-            raise  # Reraise the OpenAI error to be handled by the caller
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}")
-            raise ValueError(f"Failed to parse JSON response: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error while summarizing batch: {e}")
-            raise  # Reraise any other exception
+    Returns:
+        The paragraphs still to summarize, and their indices
+    """
+    keys = [cache_key(paragraph, subject, backend.model, backend.version) for paragraph in to_summarize]
+    hits = cache.get_many(keys)
+
+    misses: List[str] = []
+    miss_indices: List[int] = []
+    saved_tokens = 0
+    for paragraph, i, key in zip(to_summarize, indices_to_summarize, keys):
+        if key in hits:
+            results[i] = hits[key]
+            saved_tokens += estimate_tokens(paragraph) + estimate_tokens(hits[key])
+        else:
+            misses.append(paragraph)
+            miss_indices.append(i)
 
-    return results
+    hit_count = len(to_summarize) - len(misses)
+    logger.info(f"Summary cache: {hit_count} of {len(to_summarize)} paragraphs cached "
+                f"({hit_count / len(to_summarize):.0%}), ~{saved_tokens} tokens saved")
+    return misses, miss_indices
 
 def summarize_paragraph(paragraph: str, subject: str = "") -> str:
     """
@@ -0,0 +1,292 @@
+"""
+Rate limiting for OpenAI calls, shared by all summaries workers
+
+The provider limits requests per minute (RPM) and tokens per minute (TPM) per
+model of an account, so each model gets its own buckets (see RateLimiter.for_model),
+each with the configured limits. Each limit is a token bucket that refills continuously, and a request
+waits until both buckets hold enough for it, rather than being sent and failing
+with a 429. The buckets live in a store: in-process, a local SQLite file shared by
+the processes on one host, or a DynamoDB item shared by every host.
+
+When a 429 gets through anyway (other clients of the account, estimates that were
+too low), the retry-after hint pauses the shared bucket for everyone, and the
+request is retried after a jittered backoff.
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, replace
+from decimal import Decimal
+from typing import Callable, Dict, Optional, Tuple, Type, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Backoff after a rate-limit error without a retry-after hint: doubles per attempt, up to the maximum
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+MAX_RATE_LIMIT_RETRIES = 10
+
+# Random extra wait, so that workers woken by the same refill do not all fire at once
+JITTER_SECONDS = 0.25
+
+# Optimistic-locking attempts for a shared bucket before giving up
+MAX_UPDATE_ATTEMPTS = 20
+
+
+@dataclass(frozen=True)
+class BucketState:
+    requests: float
+    tokens: float
+    updated_at: float
+    # Set after a rate-limit error: nobody sends before this time
+    blocked_until: float = 0.0
+
+
+@dataclass(frozen=True)
+class RateLimits:
+    """Capacity per minute. None means unlimited."""
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+
+    def full_bucket(self, now: float) -> BucketState:
+        return BucketState(requests=float(self.requests_per_minute or 0),
+                           tokens=float(self.tokens_per_minute or 0), updated_at=now)
+
+    def take(self, state: Optional[BucketState], tokens: int, now: float) -> Tuple[BucketState, float]:
+        """
+        Refill the bucket up to now, and take one request and `tokens` tokens out of it if they are there.
+
+        Returns:
+            The new state, and 0 if the request may go, or else how long to wait before trying again
+        """
+        if state is None:
+            state = self.full_bucket(now)
+        elapsed = max(0.0, now - state.updated_at)
+        requests = self._refill(state.requests, self.requests_per_minute, elapsed)
+        available_tokens = self._refill(state.tokens, self.tokens_per_minute, elapsed)
+        state = replace(state, requests=requests, tokens=available_tokens, updated_at=now)
+
+        if state.blocked_until > now:
+            return state, state.blocked_until - now
+
+        # A request bigger than the whole bucket waits for a full bucket, not forever
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        wait = max(self._wait(requests, 1, self.requests_per_minute),
+                   self._wait(available_tokens, tokens, self.tokens_per_minute))
+        if wait > 0:
+            return state, wait
+
+        return replace(state,
+                       requests=requests - 1 if self.requests_per_minute else 0.0,
+                       tokens=available_tokens - tokens if self.tokens_per_minute else 0.0), 0.0
+
+    @staticmethod
+    def _refill(level: float, per_minute: Optional[int], elapsed: float) -> float:
+        if not per_minute:
+            return 0.0
+        return min(float(per_minute), level + elapsed * per_minute / 60)
+
+    @staticmethod
+    def _wait(level: float, cost: float, per_minute: Optional[int]) -> float:
+        if not per_minute or level >= cost:
+            return 0.0
+        return (cost - level) * 60 / per_minute
+
+
+class BucketStore(ABC):
+    """Interface for where bucket state is kept."""
+
+    @abstractmethod
+    def update(self, key: str, change: Callable[[Optional[BucketState]], Tuple[BucketState, T]]) -> T:
+        """Atomically replace the state under key with change(state)[0], and return change(state)[1]."""
+
+
+class LocalBucketStore(BucketStore):
+    """Buckets shared by the threads of one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states: Dict[str, BucketState] = {}
+
+    def update(self, key, change):
+        with self._lock:
+            self._states[key], result = change(self._states.get(key))
+            return result
+
+
+class SqliteBucketStore(BucketStore):
+    """Buckets shared by the processes on one host, through a local SQLite file."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        # Autocommit mode, so that transactions are only the ones begun explicitly below
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (bucket_key TEXT PRIMARY KEY, requests REAL NOT NULL, "
+            "tokens REAL NOT NULL, updated_at REAL NOT NULL, blocked_until REAL NOT NULL)"
+        )
+
+    def update(self, key, change):
+        with self._lock:
+            # Take the write lock up front, so no other process can update the bucket in between
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute(
+                    "SELECT requests, tokens, updated_at, blocked_until FROM buckets WHERE bucket_key = ?", (key,)
+                ).fetchone()
+                state, result = change(BucketState(*row) if row else None)
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO buckets (bucket_key, requests, tokens, updated_at, blocked_until) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, state.requests, state.tokens, state.updated_at, state.blocked_until)
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            return result
+
+
+class DynamoBucketStore(BucketStore):
+    """
+    Buckets shared by all workers, one DynamoDB item per bucket.
+
+    Updates are optimistic: each item has a version, and a write only succeeds
+    if nobody else has written since it was read.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def update(self, key, change):
+        client_errors = self.table.meta.client.exceptions
+        for _ in range(MAX_UPDATE_ATTEMPTS):
+            item = self.table.get_item(Key={'bucket_key': key}, ConsistentRead=True).get('Item')
+            state = None
+            version = 0
+            if item:
+                state = BucketState(float(item['requests']), float(item['tokens']),
+                                    float(item['updated_at']), float(item['blocked_until']))
+                version = int(item['version'])
+            new_state, result = change(state)
+            try:
+                self.table.put_item(
+                    Item={
+                        'bucket_key': key,
+                        'requests': Decimal(str(new_state.requests)),
+                        'tokens': Decimal(str(new_state.tokens)),
+                        'updated_at': Decimal(str(new_state.updated_at)),
+                        'blocked_until': Decimal(str(new_state.blocked_until)),
+                        'version': version + 1,
+                    },
+                    ConditionExpression='attribute_not_exists(bucket_key) OR version = :version',
+                    ExpressionAttributeValues={':version': version},
+                )
+                return result
+            except client_errors.ConditionalCheckFailedException:
+                continue
+        raise RuntimeError(f"Could not update rate limit bucket {key}: too much contention")
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """The retry-after hint of an HTTP error, if it has one."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    for header, scale in (('retry-after-ms', 0.001), ('retry-after', 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            # An HTTP date rather than a number of seconds
+            continue
+    return None
+
+
+class RateLimiter:
+    """
+    Schedules calls under RPM and TPM limits, retrying rate-limited calls.
+
+    Callers wait (sleep) for capacity instead of failing; thread-safe, and shared across
+    processes or hosts according to its store.
+    """
+
+    def __init__(self, limits: RateLimits, store: Optional[BucketStore] = None, key: str = 'openai',
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.time):
+        self.limits = limits
+        self.store = store or LocalBucketStore()
+        self.key = key
+        self.sleep = sleep
+        self.clock = clock
+
+    def for_model(self, model: str) -> 'RateLimiter':
+        """The limiter of one model's buckets, in the same store and with the same limits."""
+        return RateLimiter(self.limits, self.store, f"{self.key}:{model}", self.sleep, self.clock)
+
+    def acquire(self, tokens: int) -> float:
+        """
+        Wait until one request of `tokens` tokens fits under the limits, and take it.
+
+        Returns:
+            How long was spent waiting, in seconds
+        """
+        waited = 0.0
+        while True:
+            wait = self.store.update(self.key, lambda state: self.limits.take(state, tokens, self.clock()))
+            if wait <= 0:
+                return waited
+            wait += random.uniform(0, JITTER_SECONDS)
+            self.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller sharing the store for the given time."""
+        def block(state: Optional[BucketState]):
+            now = self.clock()
+            state = state or self.limits.full_bucket(now)
+            return replace(state, blocked_until=max(state.blocked_until, now + seconds)), None
+        self.store.update(self.key, block)
+
+    def call(self, fn: Callable[[], T], tokens: int, rate_limit_errors: Tuple[Type[Exception], ...],
+             max_retries: int = MAX_RATE_LIMIT_RETRIES) -> T:
+        """
+        Call fn once there is capacity for it, retrying it on rate-limit errors.
+
+        The retry-after hint is used when the error has one; otherwise the backoff doubles per attempt.
+        """
+        attempt = 0
+        while True:
+            waited = self.acquire(tokens)
+            if waited:
+                logger.info(f"Waited {waited:.2f}s for rate limit capacity")
+            try:
+                return fn()
+            except rate_limit_errors as e:
+                if attempt >= max_retries:
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    backoff = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+                    delay = backoff / 2 + random.uniform(0, backoff / 2)
+                attempt += 1
+                logger.warning(f"Rate limited (attempt {attempt}); pausing {delay:.2f}s: {e}")
+                self.pause(delay)
+
+
+def build_rate_limiter(requests_per_minute: Optional[int], tokens_per_minute: Optional[int],
+                       sqlite_path: Optional[str] = None, dynamodb_table=None) -> RateLimiter:
+    """Build a rate limiter on the most widely shared store configured."""
+    if dynamodb_table is not None:
+        store: BucketStore = DynamoBucketStore(dynamodb_table)
+    elif sqlite_path:
+        store = SqliteBucketStore(sqlite_path)
+    else:
+        store = LocalBucketStore()
+    return RateLimiter(RateLimits(requests_per_minute, tokens_per_minute), store)
@@ -0,0 +1,32 @@
+"""
+Paragraph-level summary cache
+
+The same paragraphs come up again and again: shared readings, re-uploads, excerpts
+from the same textbook. Summaries are cached under a hash of the normalized paragraph,
+the subject, the model and the prompt version, so a change to any of those is a miss.
+
+Two tiers are used: a local SQLite file, and a DynamoDB table shared by all workers
+(see common.tiered_cache). Both expire entries after a TTL.
+"""
+import hashlib
+import re
+from typing import Optional
+
+from common.tiered_cache import DEFAULT_TTL_SECONDS, KeyValueCache, build_tiered_cache
+
+WHITESPACE_REGEX = re.compile(r'\s+')
+
+# Summaries by cache_key
+SummaryCache = KeyValueCache
+
+
+def cache_key(paragraph: str, subject: str, model: str, prompt_version: int) -> str:
+    normalized = WHITESPACE_REGEX.sub(' ', paragraph).strip()
+    key_material = '\x1f'.join([normalized, subject, model, str(prompt_version)])
+    return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+
+
+def build_summary_cache(sqlite_path: Optional[str], dynamodb_table=None,
+                        ttl_seconds: int = DEFAULT_TTL_SECONDS) -> Optional[SummaryCache]:
+    """Build a tiered cache from whichever tiers are configured; None if there are none."""
+    return build_tiered_cache('Summary cache', 'summary', sqlite_path, 'summaries', dynamodb_table, ttl_seconds)
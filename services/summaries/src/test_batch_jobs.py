@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from batch_jobs import (BulkJob, BulkSummarizer, LocalBatchProvider, extractive_responder,
+                        paragraphs_from_request)
+from batch_planner import limits_for
+from budget import SummaryBudget, estimate_summaries
+from common.submission_repo import NewSubmission, SubmissionState
+from common.summary_repo import SummaryRepo
+from common.usage_repo import UsageQuota, UsageRepo
+from extractive_summarizer import ExtractiveSummarizer
+from paragraph_summarizer import MODEL, OpenAIBackend, build_summaries_request
+from testing_helpers import numbered_paragraphs, split_sentences
+
+
+@pytest.fixture
+def repos(summaries_table, submission_repo):
+    for submission_id in ('sub1', 'sub2'):
+        submission_repo.create(NewSubmission(user_id='u1', submission_id=submission_id,
+                                             state=SubmissionState.RECEIVED.value | SubmissionState.PARAGRAPHED.value))
+    return SummaryRepo(summaries_table), submission_repo
+
+
+def local_provider(tmp_path, respond=None, polls_until_done=1):
+    return LocalBatchProvider(str(tmp_path / "batches"),
+                              respond or extractive_responder(ExtractiveSummarizer(split_sentences)),
+                              polls_until_done)
+
+
+def test_paragraphs_from_request_round_trip():
+    paragraphs = ["First paragraph.\nWith two lines.", "Second ---- one.", "Third."]
+    assert paragraphs_from_request(build_summaries_request(paragraphs, "history")) == paragraphs
+
+
+def test_bulk_job_json_round_trip(tmp_path, repos):
+    bulk = BulkSummarizer(local_provider(tmp_path), *repos)
+    bulk.add_submission('u1', 'sub1', numbered_paragraphs(3))
+    job = bulk.submit()
+    assert BulkJob.from_json(job.to_json()) == job
+
+
+def test_bulk_flow_saves_every_submission(tmp_path, repos):
+    summary_repo, submission_repo = repos
+    provider = local_provider(tmp_path, polls_until_done=3)
+    bulk = BulkSummarizer(provider, summary_repo, submission_repo)
+
+    assert bulk.add_submission('u1', 'sub1', numbered_paragraphs(3) + ["Short."]) == 3
+    assert bulk.add_submission('u1', 'sub2', numbered_paragraphs(2), skip={0}) == 1
+    # Short paragraphs are saved straight away
+    assert summary_repo.get_paragraph_numbers('u1', 'sub1') == {3}
+
+    job = bulk.submit()
+    sleeps = []
+    status = bulk.wait(job, poll_seconds=5, sleep=sleeps.append)
+    assert status.state == "completed" and sleeps == [5, 5]
+
+    assert bulk.collect(job, status) == {}
+    assert summary_repo.get_paragraph_numbers('u1', 'sub1') == {0, 1, 2, 3}
+    assert summary_repo.get_paragraph_numbers('u1', 'sub2') == {1}
+    summaries = {s.paragraph_number: s for s in summary_repo.get_by_submission('u1', 'sub1')}
+    assert summaries[1].summary.startswith("Paragraph 1.")
+    assert summaries[1].paragraph_start.startswith("Paragraph 1. abcd")
+
+    for submission_id, count in (('sub1', 4), ('sub2', 1)):
+        submission = submission_repo.get_by_id('u1', submission_id)
+        assert int(submission.state) & SubmissionState.SUMMARIZED.value
+        assert submission.summarized_count == count
+
+
+def test_bulk_collect_reports_missing_paragraphs(tmp_path, repos):
+    summary_repo, submission_repo = repos
+    responder = extractive_responder(ExtractiveSummarizer(split_sentences))
+
+    def flaky(body):
+        paragraphs = paragraphs_from_request(body)
+        if any(p.startswith("Paragraph 3.") for p in paragraphs):
+            raise RuntimeError("model overloaded")
+        response = responder(body)
+        content = json.loads(response["choices"][0]["message"]["content"])
+        # Drop the summary of the second paragraph of each request
+        content["summaries"] = [s for s in content["summaries"] if s["paragraph_number"] != 2]
+        response["choices"][0]["message"]["content"] = json.dumps(content)
+        return response
+
+    bulk = BulkSummarizer(local_provider(tmp_path, flaky), summary_repo, submission_repo)
+    bulk.add_submission('u1', 'sub1', numbered_paragraphs(2))
+    bulk.add_submission('u1', 'sub2', numbered_paragraphs(4))
+    job = bulk.submit()
+
+    missing = bulk.collect(job, bulk.wait(job, sleep=lambda _: None))
+
+    assert missing == {('u1', 'sub1'): [1], ('u1', 'sub2'): [0, 1, 2, 3]}
+    assert summary_repo.get_paragraph_numbers('u1', 'sub1') == {0}
+    assert not int(submission_repo.get_by_id('u1', 'sub1').state) & SubmissionState.SUMMARIZED.value
+
+
+def test_bulk_requests_are_budgeted(tmp_path, repos, usage_table):
+    summary_repo, submission_repo = repos
+    usage_repo = UsageRepo(usage_table)
+    paragraphs = numbered_paragraphs(3)
+    # The user's quota affords two of the paragraphs
+    quota = UsageQuota(daily_tokens=estimate_summaries(paragraphs[:2], limits_for(MODEL)).total)
+
+    def budget_for(user_id, submission_id):
+        return SummaryBudget(OpenAIBackend().estimate, user_id, submission_id, quota=quota, usage_repo=usage_repo)
+
+    bulk = BulkSummarizer(local_provider(tmp_path), summary_repo, submission_repo, budget_for=budget_for)
+    assert bulk.add_submission('u1', 'sub1', paragraphs) == 2
+    assert bulk.add_submission('u1', 'sub2', paragraphs) == 0
+    assert usage_repo.get('u1').tokens == quota.daily_tokens
+    assert [entry.paragraph_numbers for entry in bulk.requests.values()] == [[0, 1]]
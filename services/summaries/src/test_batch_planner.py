@@ -0,0 +1,45 @@
+from batch_planner import ModelLimits, estimate_tokens, plan_batches, plan_fixed_batches
+from paragraph_summarizer import summarize_paragraphs
+from testing_helpers import echo_first_words, numbered_paragraphs
+
+LIMITS = ModelLimits(max_input_tokens=1000, max_output_tokens=600, max_paragraphs=8, output_tokens_per_paragraph=50)
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+def test_plan_batches_packs_short_paragraphs_up_to_max_paragraphs():
+    paragraphs = ["x" * 40] * 20
+    assert [len(b) for b in plan_batches(paragraphs, LIMITS)] == [8, 8, 4]
+
+def test_plan_batches_splits_long_paragraphs_by_input_budget():
+    # 500 + 8 tokens each: only one fits under 1000
+    paragraphs = ["x" * 2000] * 3
+    assert plan_batches(paragraphs, LIMITS) == [[0], [1], [2]]
+
+def test_plan_batches_respects_output_budget():
+    limits = ModelLimits(max_input_tokens=10000, max_output_tokens=120, max_paragraphs=50, output_tokens_per_paragraph=50)
+    assert [len(b) for b in plan_batches(["x" * 40] * 5, limits)] == [2, 2, 1]
+
+def test_plan_batches_gives_oversized_paragraph_its_own_batch():
+    paragraphs = ["x" * 40, "x" * 10000, "x" * 40]
+    assert plan_batches(paragraphs, LIMITS) == [[0], [1], [2]]
+
+def test_plan_batches_keeps_order_and_covers_everything():
+    paragraphs = [("x" * (i * 37 % 1500)) for i in range(100)]
+    batches = plan_batches(paragraphs, LIMITS)
+    assert [p for batch in batches for p in batch] == list(range(100))
+    assert plan_batches([], LIMITS) == []
+
+def test_plan_fixed_batches():
+    assert plan_fixed_batches(["a"] * 5, 2) == [[0, 1], [2, 3], [4]]
+
+def test_summarize_paragraphs_uses_token_budget(mock_openai_client):
+    mock_openai_client.side_effect = echo_first_words
+    paragraphs = numbered_paragraphs(20)  # ~130 tokens each
+
+    results = summarize_paragraphs(paragraphs, max_concurrency=1, limits=LIMITS)
+
+    assert results == [f"Paragraph {i}." for i in range(20)]
+    assert mock_openai_client.call_count == 3  # 7 + 7 + 6 under the 1000-token input budget
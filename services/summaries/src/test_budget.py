@@ -0,0 +1,120 @@
+from functools import partial
+
+import pytest
+
+from batch_planner import ModelLimits
+from budget import PROMPT_TOKENS_PER_REQUEST, SummaryBudget, TokenEstimate, affordable_count, estimate_summaries
+from common.submission_repo import NewSubmission, SubmissionState
+from common.usage_repo import UsageQuota, UsageRepo, usage_day
+
+MINI = partial(estimate_summaries, model="gpt-4o-mini")
+FULL = partial(estimate_summaries, model="gpt-4o")
+
+LIMITS = ModelLimits(max_input_tokens=1000, max_output_tokens=600, max_paragraphs=4, output_tokens_per_paragraph=50)
+
+# 100 tokens each, plus 8 for the paragraph marker
+PARAGRAPHS = ["x" * 400] * 10
+
+
+@pytest.fixture
+def repos(usage_table, submission_repo):
+    submission_repo.create(NewSubmission(user_id='u1', submission_id='sub1', state=SubmissionState.PARAGRAPHED.value))
+    return UsageRepo(usage_table), submission_repo
+
+
+def test_estimate_counts_prompt_per_request():
+    estimate = estimate_summaries(PARAGRAPHS[:6], LIMITS)
+    # Two requests of at most 4 paragraphs
+    assert estimate == TokenEstimate(input_tokens=6 * 108 + 2 * PROMPT_TOKENS_PER_REQUEST, output_tokens=300)
+    assert estimate_summaries(PARAGRAPHS[:6], LIMITS, "gpt-4o-mini").cost_usd == pytest.approx(
+        (1248 * 0.15 + 300 * 0.60) / 1_000_000)
+    assert estimate_summaries(PARAGRAPHS[:6], LIMITS, "extractive-textrank").cost_usd == 0.0
+
+
+def test_affordable_count_is_largest_fitting_prefix():
+    for budget in (0, 500, 1000, 2000, 10 ** 6):
+        count = affordable_count(PARAGRAPHS, LIMITS, lambda estimate: estimate.total <= budget)
+        assert count == max([n for n in range(11) if estimate_summaries(PARAGRAPHS[:n], LIMITS).total <= budget])
+
+
+def test_submission_budget_is_shared_by_jobs(repos):
+    usage_repo, submission_repo = repos
+    limit = estimate_summaries(PARAGRAPHS[:6], LIMITS).total
+
+    first = SummaryBudget(MINI, 'u1', 'sub1', submission_tokens=limit, submission_repo=submission_repo,
+                          usage_repo=usage_repo)
+    assert first.allow(PARAGRAPHS[:4], LIMITS) == 4
+    # The second job (another chunk) only gets what the first left
+    second = SummaryBudget(MINI, 'u1', 'sub1', submission_tokens=limit, submission_repo=submission_repo,
+                           usage_repo=usage_repo)
+    assert second.allow(PARAGRAPHS[:4], LIMITS) == 2
+
+    total = first.reserved.total + second.reserved.total
+    assert submission_repo.get_summary_tokens('u1', 'sub1') == total
+    # Usage is recorded even without a quota
+    assert usage_repo.get('u1').tokens == total
+
+
+def test_daily_quota_limits_tokens_and_cost(repos):
+    usage_repo, _ = repos
+    quota = UsageQuota(daily_tokens=estimate_summaries(PARAGRAPHS[:3], LIMITS).total)
+    budget = SummaryBudget(MINI, 'u1', 'sub1', quota=quota, usage_repo=usage_repo)
+    assert budget.allow(PARAGRAPHS, LIMITS) == 3
+    assert budget.allow(PARAGRAPHS, LIMITS) == 0
+    assert quota.exhausted(usage_repo.get('u1'))
+
+    cost_quota = UsageQuota(daily_cost_usd=FULL(PARAGRAPHS[:2], LIMITS).cost_usd)
+    assert SummaryBudget(FULL, 'u2', 'sub1', quota=cost_quota, usage_repo=usage_repo).allow(PARAGRAPHS, LIMITS) == 2
+
+
+def test_failed_submission_reservation_releases_user_usage(repos):
+    usage_repo, submission_repo = repos
+    budget = SummaryBudget(MINI, 'u1', 'sub1', submission_tokens=10 ** 6, submission_repo=submission_repo,
+                           usage_repo=usage_repo)
+    submission_repo.reserve_summary_tokens('u1', 'sub1', 10 ** 6, 10 ** 6)
+
+    assert budget.allow(PARAGRAPHS, LIMITS) == 0
+    assert usage_repo.get('u1', usage_day()).tokens == 0
+
+
+def test_reserve_refuses_over_quota(repos):
+    usage_repo, _ = repos
+    quota = UsageQuota(daily_tokens=100)
+    assert usage_repo.reserve('u1', 60, 0.0, quota)
+    assert not usage_repo.reserve('u1', 60, 0.0, quota)
+    assert usage_repo.reserve('u1', 40, 0.0, quota)
+    assert usage_repo.get('u1').tokens == 100
+
+
+def test_release_unspent_gives_back_undelivered_paragraphs(repos):
+    usage_repo, submission_repo = repos
+    budget = SummaryBudget(MINI, 'u1', 'sub1', submission_tokens=10 ** 6, submission_repo=submission_repo,
+                           usage_repo=usage_repo)
+    paragraphs = [f"{i} " + "x" * 400 for i in range(8)]
+    assert budget.allow(paragraphs, LIMITS) == 8
+    reserved = budget.reserved
+
+    # The first batch was delivered before the job failed
+    budget.spend(paragraphs[:4])
+    released = budget.release_unspent()
+
+    assert released == MINI(paragraphs[4:], LIMITS)
+    assert budget.reserved.total == reserved.total - released.total
+    assert submission_repo.get_summary_tokens('u1', 'sub1') == budget.reserved.total
+    assert usage_repo.get('u1').tokens == budget.reserved.total
+    assert usage_repo.get('u1').cost_usd == pytest.approx(budget.reserved.cost_usd)
+    # Released once
+    assert budget.release_unspent() == TokenEstimate()
+
+
+def test_release_unspent_with_nothing_delivered(repos):
+    usage_repo, submission_repo = repos
+    budget = SummaryBudget(MINI, 'u1', 'sub1', submission_tokens=10 ** 6, submission_repo=submission_repo,
+                           usage_repo=usage_repo)
+    budget.allow(PARAGRAPHS[:4], LIMITS)
+    budget.allow(PARAGRAPHS[4:], LIMITS)
+
+    budget.release_unspent()
+    assert budget.reserved == TokenEstimate()
+    assert submission_repo.get_summary_tokens('u1', 'sub1') == 0
+    assert usage_repo.get('u1').tokens == 0
@@ -0,0 +1,49 @@
+import numpy as np
+
+from extractive_summarizer import ExtractiveSummarizer, centrality, sentence_vectors
+from paragraph_summarizer import ExtractiveBackend, summarize_paragraphs
+from testing_helpers import split_sentences
+
+
+PARAGRAPH = (
+    "The Nile flooded every summer. "
+    "Every summer the Nile left rich soil, so farmers planted crops along the river. "
+    "Farmers watered their crops with canals. "
+    "Scribes kept records."
+)
+
+
+def test_sentence_vectors_are_normalized():
+    vectors = sentence_vectors(split_sentences(PARAGRAPH))
+    assert vectors.shape[0] == 4
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+
+
+def test_centrality_favours_connected_sentences():
+    scores = centrality(sentence_vectors(split_sentences(PARAGRAPH)))
+    assert np.isclose(scores.sum(), 1.0)
+    # "Scribes kept records." shares no words with the rest
+    assert scores.argmin() == 3
+
+
+def test_summarize_picks_most_central_sentence():
+    summarizer = ExtractiveSummarizer(split_sentences)
+    assert summarizer.summarize(PARAGRAPH) == \
+        "Every summer the Nile left rich soil, so farmers planted crops along the river."
+
+
+def test_summarize_single_sentence_and_empty():
+    summarizer = ExtractiveSummarizer(split_sentences)
+    assert summarizer.summarize("  Just one sentence here.  ") == "Just one sentence here."
+    assert summarizer.summarize("") == ""
+
+
+def test_summarize_paragraphs_with_extractive_backend(mock_openai_client):
+    backend = ExtractiveBackend(ExtractiveSummarizer(split_sentences))
+    paragraphs = [" ".join([PARAGRAPH] * 3), "Short."]
+
+    results = summarize_paragraphs(paragraphs, backend=backend)
+
+    assert results[0].startswith("Every summer the Nile")
+    assert results[1] == "Short."
+    mock_openai_client.assert_not_called()
@@ -0,0 +1,140 @@
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from batch_planner import limits_for
+from budget import estimate_summaries
+from extractive_summarizer import ExtractiveSummarizer
+from paragraph_summarizer import (ExtractiveBackend, ModelTier, OpenAIBackend, RoutedBackend, RoutingRule,
+                                  parse_routes, summarize_paragraphs)
+from testing_helpers import echo_first_words, split_sentences
+
+
+class StubClient:
+    """Stands in for openai.OpenAI: answers with each paragraph's first two words, or fails."""
+
+    def __init__(self, error=None):
+        self.requests = []
+        self.error = error
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if self.error:
+            raise self.error
+        return echo_first_words(**kwargs)
+
+
+# Over the 300 characters below which paragraphs are not summarized at all
+SHORT = "Rome was founded on seven hills. " * 10
+LONG = "The empire grew. " * 30
+# One sentence of 60 words
+HARD = "Notwithstanding " + "considerable " * 58 + "difficulties."
+
+
+def tiers(mini_client, full_client):
+    return {
+        'local': ModelTier(ExtractiveBackend(ExtractiveSummarizer(split_sentences))),
+        'mini': ModelTier(OpenAIBackend("gpt-4o-mini", mini_client), fallback='local'),
+        'full': ModelTier(OpenAIBackend("gpt-4o", full_client), fallback='mini'),
+    }
+
+
+RULES = [
+    RoutingRule('local', max_chars=400),
+    RoutingRule('mini', max_sentence_words=30),
+    RoutingRule('full'),
+]
+
+
+def test_paragraphs_are_routed_by_length_and_difficulty():
+    mini, full = StubClient(), StubClient()
+    backend = RoutedBackend(tiers(mini, full), RULES)
+
+    results = summarize_paragraphs([SHORT, LONG, HARD, LONG], backend=backend, max_concurrency=1)
+
+    assert results == ["Rome was founded on seven hills.", "The empire", "Notwithstanding considerable",
+                       "The empire"]
+    # Both long paragraphs went in one request, to the cheaper model
+    assert [r["model"] for r in mini.requests] == ["gpt-4o-mini"]
+    assert mini.requests[0]["messages"][1]["content"].count("---PARAGRAPH") == 2
+    assert [r["model"] for r in full.requests] == ["gpt-4o"]
+
+    report = backend.report()
+    assert (report['local'].paragraphs, report['mini'].paragraphs, report['full'].paragraphs) == (1, 2, 1)
+    assert report['local'].cost_usd == 0 and report['local'].input_tokens == 0
+    assert 0 < report['mini'].cost_usd < report['full'].cost_usd
+    assert all(stats.errors == 0 for stats in report.values())
+
+
+def test_estimate_prices_each_tier():
+    backend = RoutedBackend(tiers(StubClient(), StubClient()), RULES)
+    limits = limits_for(backend.model)
+
+    # One batch, split into a request to each billed tier; the local tier is free
+    assert backend.estimate([SHORT, LONG, HARD], limits) == (estimate_summaries([LONG], limits, "gpt-4o-mini")
+                                                             + estimate_summaries([HARD], limits, "gpt-4o"))
+
+
+def test_stats_since_earlier_report():
+    backend = RoutedBackend(tiers(StubClient(), StubClient()), RULES)
+    summarize_paragraphs([LONG, HARD], backend=backend, max_concurrency=1)
+    earlier = backend.report()
+    summarize_paragraphs([LONG + " More.", LONG + " Again."], backend=backend, max_concurrency=1)
+
+    report = backend.report()
+    assert report['mini'].paragraphs == 3
+    recent = {name: stats.since(earlier[name]) for name, stats in report.items()}
+    assert (recent['mini'].calls, recent['mini'].paragraphs, recent['full'].calls) == (1, 2, 0)
+    assert recent['mini'].cost_usd == pytest.approx(report['mini'].cost_usd - earlier['mini'].cost_usd)
+
+
+def test_failing_tier_falls_back():
+    mini, full = StubClient(), StubClient(error=openai.OpenAIError("model overloaded"))
+    backend = RoutedBackend(tiers(mini, full), RULES)
+
+    assert summarize_paragraphs([HARD], backend=backend) == ["Notwithstanding considerable"]
+
+    report = backend.report()
+    assert (report['full'].errors, report['full'].paragraphs) == (1, 0)
+    assert (report['mini'].paragraphs, report['mini'].fallback_paragraphs) == (1, 1)
+
+
+def test_fallback_chain_ends_in_local_tier():
+    failing = StubClient(error=openai.OpenAIError("outage"))
+    backend = RoutedBackend(tiers(failing, failing), RULES)
+
+    assert summarize_paragraphs([HARD, LONG], backend=backend) == [HARD, "The empire grew."]
+    report = backend.report()
+    assert (report['full'].errors, report['mini'].errors) == (1, 2)
+    assert report['local'].fallback_paragraphs == 2
+
+
+def test_tier_without_fallback_raises():
+    backend = RoutedBackend({'mini': ModelTier(OpenAIBackend("gpt-4o-mini", StubClient(error=ValueError("bad"))))},
+                            [RoutingRule('mini')])
+    with pytest.raises(ValueError):
+        summarize_paragraphs([LONG], backend=backend)
+    assert backend.report()['mini'].errors >= 1
+
+
+def test_routes_are_validated():
+    tiers_ = tiers(StubClient(), StubClient())
+    with pytest.raises(ValueError, match="Unknown model tier"):
+        RoutedBackend(tiers_, [RoutingRule('huge')])
+    looping = dict(tiers_, local=ModelTier(tiers_['local'].backend, fallback='full'))
+    with pytest.raises(ValueError, match="loop"):
+        RoutedBackend(looping, RULES)
+
+
+def test_cache_version_depends_on_routes():
+    tiers_ = tiers(StubClient(), StubClient())
+    assert RoutedBackend(tiers_, RULES).version == RoutedBackend(tiers_, list(RULES)).version
+    assert RoutedBackend(tiers_, RULES).version != RoutedBackend(tiers_, RULES[1:]).version
+    assert RoutedBackend(tiers_, RULES).model == "gpt-4o"
+
+
+def test_parse_routes():
+    assert parse_routes('[{"tier": "local", "max_chars": 400}, {"tier": "mini"}]') == [
+        RoutingRule('local', max_chars=400), RoutingRule('mini')]
@@ -1,24 +1,17 @@
+import json
+import threading
+import time
+
 import pytest
 import openai
-from unittest.mock import patch, MagicMock
-from summaries.paragraph_summarizer import summarize_paragraph
-
-@pytest.fixture
-def mock_openai_client():
-    """Fixture to mock the OpenAI client globally."""
-    with patch("paragraph_summarizer.client") as mock_client:
-        mock_chat = MagicMock()
-        mock_client.chat.completions.create = mock_chat
-        yield mock_chat
+from unittest.mock import MagicMock
+from paragraph_summarizer import summarize_paragraph, summarize_paragraphs
+from testing_helpers import echo_first_words, long_paragraph, numbered_paragraphs, summaries_response
 
-def long_paragraph():
-    return "abcd " * 100 # 500 characters
 
 def test_summarize_paragraph_success(mock_openai_client):
     """Test summarizing a paragraph successfully."""
-    mock_openai_client.return_value.choices = [
-        MagicMock(message=MagicMock(content="This is a summary."))
-    ]
+    mock_openai_client.return_value = summaries_response(["This is a summary."])
 
     summary = summarize_paragraph(long_paragraph(), subject="history")
 
@@ -53,3 +46,143 @@ def test_summarize_paragraph_unexpected_error(mock_openai_client):
 
     with pytest.raises(Exception, match="Unexpected issue"):
         summarize_paragraph(long_paragraph(), subject="history")
+
+def test_concurrent_batches_keep_order(mock_openai_client):
+    """Batches finishing out of order still fill the results in input order."""
+    def slow_first_batch(**kwargs):
+        if "Paragraph 0." in kwargs["messages"][1]["content"]:
+            time.sleep(0.1)
+        return echo_first_words(**kwargs)
+    mock_openai_client.side_effect = slow_first_batch
+
+    paragraphs = numbered_paragraphs(10) + ["Short one."]
+    results = summarize_paragraphs(paragraphs, batch_size=3, max_concurrency=4)
+
+    assert results == [f"Paragraph {i}." for i in range(10)] + ["Short one."]
+    assert mock_openai_client.call_count == 4
+
+def test_concurrency_limit(mock_openai_client):
+    """No more than max_concurrency batches are in flight at once."""
+    lock = threading.Lock()
+    in_flight = []
+    peak = []
+
+    def tracked(**kwargs):
+        with lock:
+            in_flight.append(1)
+            peak.append(len(in_flight))
+        time.sleep(0.02)
+        with lock:
+            in_flight.pop()
+        return echo_first_words(**kwargs)
+    mock_openai_client.side_effect = tracked
+
+    summarize_paragraphs(numbered_paragraphs(12), batch_size=1, max_concurrency=3)
+
+    assert max(peak) == 3
+
+def test_concurrent_batches_raise_first_error(mock_openai_client):
+    """An error in one batch is raised to the caller."""
+    def failing_batch(**kwargs):
+        if "Paragraph 4." in kwargs["messages"][1]["content"]:
+            raise openai.OpenAIError("API failure")
+        return echo_first_words(**kwargs)
+    mock_openai_client.side_effect = failing_batch
+
+    with pytest.raises(openai.OpenAIError, match="API failure"):
+        summarize_paragraphs(numbered_paragraphs(8), batch_size=2, max_concurrency=2)
+
+def test_partial_response_retries_only_missing_paragraphs(mock_openai_client):
+    """Summaries that validated are kept; the missing paragraphs are bisected and requested again."""
+    batch_sizes = []
+    def drop_some_summaries(**kwargs):
+        user_message = kwargs["messages"][1]["content"]
+        count = user_message.count("---PARAGRAPH ")
+        batch_sizes.append(count)
+        response = json.loads(echo_first_words(**kwargs).choices[0].message.content)
+        if count > 2:
+            # Only answer the odd-numbered paragraphs
+            response["summaries"] = response["summaries"][::2]
+        return MagicMock(choices=[MagicMock(message=MagicMock(content=json.dumps(response)))])
+    mock_openai_client.side_effect = drop_some_summaries
+
+    retried = []
+    results = summarize_paragraphs(numbered_paragraphs(8), max_concurrency=1, retried=retried)
+
+    assert results == [f"Paragraph {i}." for i in range(8)]
+    assert batch_sizes == [8, 2, 2]
+    assert retried == [1, 3, 5, 7]
+
+def test_duplicate_paragraph_numbers_are_retried(mock_openai_client):
+    """A paragraph number answered twice is ambiguous, so that paragraph is requested again."""
+    def duplicate_first(**kwargs):
+        response = json.loads(echo_first_words(**kwargs).choices[0].message.content)
+        if len(response["summaries"]) > 1:
+            response["summaries"][1]["paragraph_number"] = 1
+        return MagicMock(choices=[MagicMock(message=MagicMock(content=json.dumps(response)))])
+    mock_openai_client.side_effect = duplicate_first
+
+    retried = []
+    results = summarize_paragraphs(numbered_paragraphs(3), max_concurrency=1, retried=retried)
+
+    assert results == [f"Paragraph {i}." for i in range(3)]
+    assert retried == [0, 1]
+
+def test_single_paragraph_without_summary_raises(mock_openai_client):
+    """Recovery stops at single paragraphs."""
+    mock_openai_client.return_value = summaries_response([])
+
+    with pytest.raises(ValueError, match="No valid summary"):
+        summarize_paragraphs(numbered_paragraphs(4), max_concurrency=1)
+    # All 4, then the first 2, then the first paragraph on its own
+    assert mock_openai_client.call_count == 3
+
+def test_on_batch_receives_every_paragraph_once(mock_openai_client):
+    """Summaries are handed over batch by batch; short paragraphs come first."""
+    mock_openai_client.side_effect = echo_first_words
+    paragraphs = numbered_paragraphs(5) + ["Short one."]
+    delivered = []
+
+    results = summarize_paragraphs(paragraphs, batch_size=2, max_concurrency=2,
+                                   on_batch=lambda indices, summaries: delivered.append(dict(zip(indices, summaries))))
+
+    assert delivered[0] == {5: "Short one."}
+    assert sorted(len(batch) for batch in delivered[1:]) == [1, 2, 2]
+    merged = {i: summary for batch in delivered for i, summary in batch.items()}
+    assert [merged[i] for i in range(6)] == results
+
+def test_on_batch_keeps_finished_batches_when_a_later_one_fails(mock_openai_client):
+    def failing_last_batch(**kwargs):
+        if "Paragraph 4." in kwargs["messages"][1]["content"]:
+            raise openai.OpenAIError("API failure")
+        return echo_first_words(**kwargs)
+    mock_openai_client.side_effect = failing_last_batch
+    delivered = []
+
+    with pytest.raises(openai.OpenAIError):
+        summarize_paragraphs(numbered_paragraphs(5), batch_size=2, max_concurrency=1,
+                             on_batch=lambda indices, summaries: delivered.extend(indices))
+
+    assert delivered == [0, 1, 2, 3]
+
+def test_budget_limits_paragraphs_sent(mock_openai_client):
+    """Paragraphs beyond what the budget affords are never sent, nor handed to on_batch."""
+    mock_openai_client.side_effect = echo_first_words
+    paragraphs = numbered_paragraphs(5) + ["Short one."]
+    offered = []
+    delivered = []
+    skipped = []
+
+    def budget(to_summarize, limits):
+        offered.append(len(to_summarize))
+        return 3
+
+    results = summarize_paragraphs(paragraphs, batch_size=2, budget=budget, skipped=skipped,
+                                   on_batch=lambda indices, summaries: delivered.extend(indices))
+
+    assert offered == [5]
+    assert results[:3] == ["Paragraph 0.", "Paragraph 1.", "Paragraph 2."]
+    assert results[3:] == [None, None, "Short one."]
+    assert skipped == [3, 4]
+    assert sorted(delivered) == [0, 1, 2, 5]
+    assert mock_openai_client.call_count == 2
@@ -0,0 +1,184 @@
+import threading
+
+import openai
+import pytest
+from unittest.mock import MagicMock
+
+from paragraph_summarizer import summarize_paragraphs
+from rate_limiter import (DynamoBucketStore, LocalBucketStore, RateLimiter, RateLimits, SqliteBucketStore,
+                          retry_after_seconds)
+from testing_helpers import echo_first_words, numbered_paragraphs
+
+
+class FakeClock:
+    """A clock that only moves when something sleeps."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def fake_limiter(limits, store=None):
+    clock = FakeClock()
+    return RateLimiter(limits, store or LocalBucketStore(), sleep=clock.sleep, clock=clock), clock
+
+
+def rate_limit_error(headers=None):
+    response = MagicMock(status_code=429, headers=headers or {})
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_take_refills_and_waits():
+    limits = RateLimits(requests_per_minute=60, tokens_per_minute=600)
+    state, wait = limits.take(None, 500, now=0)
+    assert wait == 0 and state.tokens == 100 and state.requests == 59
+
+    # 400 more tokens are needed: 40s at 10 tokens/s
+    state, wait = limits.take(state, 500, now=0)
+    assert wait == pytest.approx(40)
+
+    state, wait = limits.take(state, 500, now=40)
+    assert wait == 0 and state.tokens == pytest.approx(0)
+
+
+def test_unlimited_never_waits():
+    limits = RateLimits()
+    state = None
+    for _ in range(1000):
+        state, wait = limits.take(state, 10 ** 6, now=0)
+        assert wait == 0
+
+
+def test_request_bigger_than_bucket_waits_for_full_bucket():
+    limits = RateLimits(tokens_per_minute=100)
+    state, wait = limits.take(None, 1000, now=0)
+    assert wait == 0
+    state, wait = limits.take(state, 1000, now=0)
+    assert wait == pytest.approx(60)
+
+
+def test_acquire_queues_under_rpm():
+    limiter, clock = fake_limiter(RateLimits(requests_per_minute=2))
+    for _ in range(4):
+        limiter.acquire(1)
+    # Two requests go at once; the next two wait about 30s each for a request to refill
+    assert len(clock.sleeps) == 2
+    assert all(29.5 <= s <= 30.5 for s in clock.sleeps)
+
+
+def test_models_have_their_own_buckets():
+    limiter, clock = fake_limiter(RateLimits(requests_per_minute=1))
+    mini, full = limiter.for_model("gpt-4o-mini"), limiter.for_model("gpt-4o")
+    mini.acquire(1)
+    full.acquire(1)
+    assert clock.sleeps == []
+    mini.acquire(1)
+    assert len(clock.sleeps) == 1
+
+
+def test_retry_after_hint():
+    assert retry_after_seconds(rate_limit_error({"retry-after": "3"})) == 3
+    assert retry_after_seconds(rate_limit_error({"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(rate_limit_error()) is None
+    assert retry_after_seconds(ValueError("no response")) is None
+
+
+def test_call_retries_after_hint_and_pauses_everyone():
+    store = LocalBucketStore()
+    limiter, clock = fake_limiter(RateLimits(), store)
+    attempts = []
+
+    def flaky():
+        attempts.append(clock.now)
+        if len(attempts) == 1:
+            raise rate_limit_error({"retry-after": "5"})
+        return "ok"
+
+    assert limiter.call(flaky, 10, rate_limit_errors=(openai.RateLimitError,)) == "ok"
+    assert attempts[1] - attempts[0] >= 5
+
+    # Another limiter on the same store sees the pause
+    other, other_clock = fake_limiter(RateLimits(), store)
+    other_clock.now = clock.now - 1
+    limiter.pause(2)
+    other.acquire(1)
+    assert other_clock.sleeps and other_clock.sleeps[0] >= 2
+
+
+def test_call_gives_up_after_max_retries():
+    limiter, clock = fake_limiter(RateLimits())
+
+    def always_limited():
+        raise rate_limit_error()
+
+    with pytest.raises(openai.RateLimitError):
+        limiter.call(always_limited, 10, rate_limit_errors=(openai.RateLimitError,), max_retries=3)
+    # Jittered exponential backoff: within [d/2, d] for d = 1, 2, 4
+    assert len(clock.sleeps) == 3
+    for sleep, backoff in zip(clock.sleeps, [1, 2, 4]):
+        assert backoff / 2 <= sleep <= backoff + 0.25
+
+
+def test_sqlite_store_is_shared(tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    limits = RateLimits(requests_per_minute=10)
+    first, second = SqliteBucketStore(path), SqliteBucketStore(path)
+
+    waits = [store.update('openai', lambda state: limits.take(state, 1, now=0)) for store in [first, second] * 5]
+    assert waits == [0] * 10
+    assert second.update('openai', lambda state: limits.take(state, 1, now=0)) == pytest.approx(6)
+
+
+def test_sqlite_store_under_concurrency(tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    limits = RateLimits(requests_per_minute=50)
+    stores = [SqliteBucketStore(path) for _ in range(4)]
+    granted = []
+
+    def take_many(store):
+        for _ in range(20):
+            if store.update('openai', lambda state: limits.take(state, 1, now=0)) == 0:
+                granted.append(1)
+
+    threads = [threading.Thread(target=take_many, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(granted) == 50
+
+
+def test_dynamo_store(rate_limit_table):
+    table = rate_limit_table
+    limits = RateLimits(requests_per_minute=3, tokens_per_minute=1000)
+    store = DynamoBucketStore(table)
+
+    waits = [store.update('openai', lambda state: limits.take(state, 100, now=0)) for _ in range(4)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] == pytest.approx(20)
+    item = table.get_item(Key={'bucket_key': 'openai'})['Item']
+    assert item['version'] == 4 and float(item['tokens']) == pytest.approx(700)
+
+
+def test_summarize_paragraphs_retries_rate_limited_batches(mock_openai_client):
+    calls = []
+    def limited_once(**kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise rate_limit_error({"retry-after-ms": "10"})
+        return echo_first_words(**kwargs)
+    mock_openai_client.side_effect = limited_once
+    limiter, clock = fake_limiter(RateLimits(requests_per_minute=100, tokens_per_minute=100000))
+
+    results = summarize_paragraphs(numbered_paragraphs(4), batch_size=2, max_concurrency=1, rate_limiter=limiter)
+
+    assert results == [f"Paragraph {i}." for i in range(4)]
+    assert len(calls) == 3
+    assert clock.sleeps and clock.sleeps[0] >= 0.01
@@ -0,0 +1,45 @@
+import pytest
+
+from paragraph_summarizer import summarize_paragraphs, MODEL, PROMPT_VERSION
+from summary_cache import build_summary_cache, cache_key
+from testing_helpers import echo_first_words, numbered_paragraphs
+
+
+@pytest.fixture
+def mock_openai_client(mock_openai_client):
+    mock_openai_client.side_effect = echo_first_words
+    return mock_openai_client
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    return build_summary_cache(str(tmp_path / "cache.sqlite3"))
+
+
+def test_cache_key_normalizes_whitespace_only():
+    key = cache_key("A  paragraph\nof text.", "history", MODEL, PROMPT_VERSION)
+    assert key == cache_key(" A paragraph of text. ", "history", MODEL, PROMPT_VERSION)
+    assert key != cache_key("A paragraph of text.", "science", MODEL, PROMPT_VERSION)
+    assert key != cache_key("A paragraph of text.", "history", MODEL, PROMPT_VERSION + 1)
+
+
+def test_summarize_paragraphs_only_sends_misses(mock_openai_client, sqlite_cache):
+    paragraphs = numbered_paragraphs(4)
+    assert summarize_paragraphs(paragraphs[:2], cache=sqlite_cache) == ["Paragraph 0.", "Paragraph 1."]
+    mock_openai_client.reset_mock()
+
+    results = summarize_paragraphs(paragraphs, cache=sqlite_cache)
+
+    assert results == [f"Paragraph {i}." for i in range(4)]
+    mock_openai_client.assert_called_once()
+    user_message = mock_openai_client.call_args.kwargs["messages"][1]["content"]
+    assert "Paragraph 0." not in user_message and "Paragraph 2." in user_message
+
+
+def test_summarize_paragraphs_all_cached(mock_openai_client, sqlite_cache):
+    paragraphs = numbered_paragraphs(2)
+    summarize_paragraphs(paragraphs, subject="history", cache=sqlite_cache)
+    mock_openai_client.reset_mock()
+
+    assert summarize_paragraphs(paragraphs, subject="history", cache=sqlite_cache) == ["Paragraph 0.", "Paragraph 1."]
+    mock_openai_client.assert_not_called()
@@ -0,0 +1,32 @@
+"""Fake paragraphs and API responses shared by the tests."""
+import json
+import re
+from unittest.mock import MagicMock
+
+
+def long_paragraph():
+    return "abcd " * 100 # 500 characters
+
+
+def summaries_response(summaries):
+    """A chat completion response with the given summaries, numbered from 1."""
+    content = json.dumps({"summaries": [
+        {"paragraph_number": i + 1, "summary": summary} for i, summary in enumerate(summaries)
+    ]})
+    return MagicMock(choices=[MagicMock(message=MagicMock(content=content))])
+
+
+def numbered_paragraphs(count):
+    return [f"Paragraph {i}. " + long_paragraph() for i in range(count)]
+
+
+def echo_first_words(**kwargs):
+    """Fake API call: each paragraph's summary is its first two words."""
+    user_message = kwargs["messages"][1]["content"]
+    paragraphs = [part.split("\n", 1)[1] for part in user_message.split("---PARAGRAPH ")[1:]]
+    return summaries_response([" ".join(p.split()[:2]) for p in paragraphs])
+
+
+def split_sentences(text):
+    """Splits on sentence punctuation, so tests do not depend on NLTK's trained models."""
+    return re.split(r'(?<=[.!?])\s+', text)
@@ -0,0 +1,52 @@
+"""
+Per-job setup time and resident memory of WordProcessor, before and after the shared lexicon.
+
+"per-job set" rebuilds the valid-word set for every job, as WordProcessor used to
+(the NLTK resource probe it also ran per job is not counted); "shared lexicon"
+builds WordProcessors the way they are built now.
+
+Usage:
+    PYTHONPATH=src poetry run python benchmarks/lexicon_setup.py [jobs]
+"""
+import gc
+import sys
+import time
+
+from nltk.corpus import words
+
+from lexicon import get_lexicon, resident_memory_mb
+from nlp_word_extraction import Language, WordProcessor
+
+PARAGRAPHS = ["The astronaut walked on the moon.", "The scientist discovered a new element."]
+
+
+def report(name: str, jobs: int, make_processor):
+    gc.collect()
+    memory_before = resident_memory_mb()
+    processors = []
+    started = time.perf_counter()
+    for _ in range(jobs):
+        # Jobs of a worker overlap with the garbage of earlier ones, so keep the last few alive
+        processors = (processors + [make_processor()])[-4:]
+    seconds = time.perf_counter() - started
+    print(f"{name:<16} {seconds / jobs * 1000:8.1f} ms/job  "
+          f"resident memory {memory_before:6.0f} -> {resident_memory_mb():6.0f} MB")
+
+
+def per_job_set():
+    processor = WordProcessor(PARAGRAPHS, Language('en', 0.00002))
+    processor.valid_words = set(words.words())
+    return processor
+
+
+def main():
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    started = time.perf_counter()
+    get_lexicon()
+    print(f"lexicon load     {(time.perf_counter() - started) * 1000:8.1f} ms, once per process")
+    report("shared lexicon", jobs, lambda: WordProcessor(PARAGRAPHS, Language('en', 0.00002)))
+    report("per-job set", jobs, per_job_set)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Speedup of sharded vocabulary extraction by number of worker processes.
+
+The Tell-Tale Heart fixture is repeated to make a long document, then parsed
+serially and on pools of 2, 4, ... processes up to the number of cores. Every
+run must give exactly the serial result.
+
+It measures what the defaults of parallel_extraction are to be chosen from:
+  - the speedup by workers, for each of 1, 2 and 4 shards per worker (SHARDS_PER_WORKER)
+  - the shortest document the largest pool is faster on than serial parsing
+    (MIN_PARALLEL_PARAGRAPHS)
+and prints them as lines to record in the VOCABULARY_WORKERS entry of .env.EXAMPLE.
+It needs the NLTK data, and a host with as many cores as the workers measured. (Named
+apart from parallel_extraction, which a script of that name would shadow.)
+
+Usage:
+    PYTHONPATH=src poetry run python benchmarks/parallel_speedup.py [repeats] [path/to/text.txt]
+"""
+import os
+import re
+import sys
+import time
+
+import parallel_extraction
+from lexicon import get_lexicon
+from nlp_word_extraction import parse_paragraphs
+from parallel_extraction import get_pool, parse_paragraphs_parallel
+
+here = os.path.dirname(__file__)
+DEFAULT_FIXTURE = f"{here}/../../paragraphs/tests/fixtures/the-tell-tale-heart.txt"
+
+SHARDS_PER_WORKER_CHOICES = (1, 2, 4)
+# Document lengths, in paragraphs, tried for the shortest one worth a pool
+CROSSOVER_LENGTHS = (10, 20, 40, 80, 160, 320)
+ROUNDS = 3
+
+
+def load_paragraphs(path: str):
+    with open(path, encoding='utf-8') as file:
+        paragraphs = [re.sub(r'\s+', ' ', p).strip() for p in re.split(r'\n\s*\n', file.read())]
+    return [p for p in paragraphs if p]
+
+
+def summary(words):
+    return [(w.word, w.count, w.first_sentence, w.first_paragraph, w.language_frequency) for w in words]
+
+
+def timed(fn, *args, **kwargs):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def worker_counts(cores: int):
+    workers = 2
+    while workers <= cores:
+        yield workers
+        workers *= 2
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_FIXTURE
+    paragraphs = load_paragraphs(path) * repeats
+    cores = os.cpu_count() or 1
+    print(f"{len(paragraphs)} paragraphs, {cores} cores")
+    if cores < 2:
+        print("Only one core: there is no speedup to measure")
+        return
+
+    get_lexicon()
+    parse_paragraphs(paragraphs[:1])
+    serial_seconds, serial_result = timed(parse_paragraphs, paragraphs)
+    expected = summary(serial_result)
+    print(f"serial      {serial_seconds:7.2f} s")
+
+    # Always shard, whatever the length, while measuring
+    parallel_extraction.MIN_PARALLEL_PARAGRAPHS = 0
+    speedups = {}
+    for workers in worker_counts(cores):
+        # Start (and warm) the pool before timing, as the service does once per process
+        get_pool(workers)
+        parse_paragraphs_parallel(paragraphs[:workers * 40], workers=workers)
+        for shards_per_worker in SHARDS_PER_WORKER_CHOICES:
+            parallel_extraction.SHARDS_PER_WORKER = shards_per_worker
+            seconds, result = timed(parse_paragraphs_parallel, paragraphs, workers=workers)
+            assert summary(result) == expected, f"Results with {workers} workers differ from serial results"
+            speedups[workers, shards_per_worker] = serial_seconds / seconds
+            print(f"{workers:2d} workers, {shards_per_worker} shards each  {seconds:7.2f} s  "
+                  f"({speedups[workers, shards_per_worker]:.2f}x)")
+
+    largest = max(workers for workers, _ in speedups)
+    best_shards = max(SHARDS_PER_WORKER_CHOICES, key=lambda shards: speedups[largest, shards])
+    parallel_extraction.SHARDS_PER_WORKER = best_shards
+    crossover = None
+    for length in CROSSOVER_LENGTHS:
+        serial, _ = timed(parse_paragraphs, paragraphs[:length])
+        parallel, _ = timed(parse_paragraphs_parallel, paragraphs[:length], workers=largest)
+        print(f"{length:4d} paragraphs: serial {serial * 1000:7.1f} ms, {largest} workers {parallel * 1000:7.1f} ms")
+        if crossover is None and parallel < serial:
+            crossover = length
+
+    print("\nTo record:")
+    for workers in sorted({workers for workers, _ in speedups}):
+        print(f"#   {workers} workers: {speedups[workers, best_shards]:.2f}x")
+    print(f"#   SHARDS_PER_WORKER={best_shards}, "
+          f"MIN_PARALLEL_PARAGRAPHS={crossover if crossover is not None else f'>{CROSSOVER_LENGTHS[-1]}'} "
+          f"({cores} cores)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Word extraction on the Tell-Tale Heart fixture: batched POS tagging against per-sentence tagging.
+
+"per sentence" is the pipeline as it was, tokenizing and tagging each sentence with
+its own calls; "batched" is parse_paragraphs, which tags the whole document at once.
+The two must find exactly the same words, counts, first sentences and paragraphs.
+
+Usage:
+    PYTHONPATH=src poetry run python benchmarks/pos_tagging.py [path/to/text.txt]
+"""
+import os
+import re
+import sys
+import time
+
+import nltk
+from nltk.tokenize import sent_tokenize, word_tokenize
+
+from lexicon import get_lexicon
+from nlp_word_extraction import (PROPER_NOUN_TAGS, Config, Language, WordFromText, WordProcessor, expand_tokens,
+                                 parse_paragraphs)
+
+here = os.path.dirname(__file__)
+DEFAULT_FIXTURE = f"{here}/../../paragraphs/tests/fixtures/the-tell-tale-heart.txt"
+ROUNDS = 5
+
+
+def load_paragraphs(path: str):
+    with open(path, encoding='utf-8') as file:
+        paragraphs = [re.sub(r'\s+', ' ', p).strip() for p in re.split(r'\n\s*\n', file.read())]
+    return [p for p in paragraphs if p]
+
+
+def parse_per_sentence(paragraphs):
+    """The old pipeline: each sentence tagged, lemmatized and looked up on its own."""
+    processor = WordProcessor(paragraphs, Language('en', Config.COMMON_THRESHOLD))
+    for i, paragraph in enumerate(paragraphs):
+        for sentence in sent_tokenize(paragraph):
+            pos_tags = nltk.pos_tag(expand_tokens(word_tokenize(sentence)))
+            for word, tag in pos_tags:
+                if tag in PROPER_NOUN_TAGS:
+                    continue
+                cleaned = re.sub(r'\W+', '', word).lower()
+                if not cleaned:
+                    continue
+                lemma_word = processor.lemmatize_word(cleaned, tag)
+                if not processor.is_uncommon_word(lemma_word) or not processor.is_valid_word(lemma_word):
+                    continue
+                if lemma_word not in processor.word_info:
+                    processor.word_info[lemma_word] = WordFromText(
+                        lemma_word, sentence, i, processor.get_word_frequency(lemma_word))
+                else:
+                    processor.word_info[lemma_word].increment()
+    return sorted(processor.word_info.values(), key=lambda item: item.language_frequency, reverse=True)
+
+
+def summary(words):
+    return [(w.word, w.count, w.first_sentence, w.first_paragraph, w.language_frequency) for w in words]
+
+
+def timed(fn, paragraphs):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        result = fn(paragraphs)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FIXTURE
+    paragraphs = load_paragraphs(path)
+    sentence_count = sum(len(sent_tokenize(p)) for p in paragraphs)
+    print(f"{len(paragraphs)} paragraphs, {sentence_count} sentences")
+    # Load the lexicon and the tagger up front, so neither run pays for them
+    get_lexicon()
+    parse_paragraphs(paragraphs[:1])
+
+    per_sentence_seconds, expected = timed(parse_per_sentence, paragraphs)
+    batched_seconds, actual = timed(parse_paragraphs, paragraphs)
+    print(f"per sentence {per_sentence_seconds * 1000:8.1f} ms")
+    print(f"batched      {batched_seconds * 1000:8.1f} ms  ({per_sentence_seconds / batched_seconds:.2f}x)")
+    assert summary(actual) == summary(expected), "Batched results differ from per-sentence results"
+    print(f"identical results: {len(actual)} words")
+
+
+if __name__ == "__main__":
+    main()
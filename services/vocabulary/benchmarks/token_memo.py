@@ -0,0 +1,59 @@
+"""
+Word extraction on the Tell-Tale Heart fixture, with and without the process-wide token memos.
+
+"unmemoized" lemmatizes and looks up every token occurrence; "cold" is the first job
+of a worker, which fills the memos; "warm" is a later job on a similar document, which
+should find nearly every token memoized. All must find exactly the same words.
+
+Usage:
+    PYTHONPATH=src poetry run python benchmarks/token_memo.py [path/to/text.txt]
+"""
+import os
+import re
+import sys
+import time
+
+from lexicon import Lexicon, get_lexicon
+from nlp_word_extraction import Config, Language, WordProcessor
+
+here = os.path.dirname(__file__)
+DEFAULT_FIXTURE = f"{here}/../../paragraphs/tests/fixtures/the-tell-tale-heart.txt"
+
+
+def load_paragraphs(path: str):
+    with open(path, encoding='utf-8') as file:
+        paragraphs = [re.sub(r'\s+', ' ', p).strip() for p in re.split(r'\n\s*\n', file.read())]
+    return [p for p in paragraphs if p]
+
+
+def run(paragraphs, lexicon: Lexicon, memoized: bool):
+    processor = WordProcessor(paragraphs, Language('en', Config.COMMON_THRESHOLD), lexicon)
+    if not memoized:
+        processor.lemma_memo = processor.token_memo = None
+    started = time.perf_counter()
+    words = processor.parse_text()
+    return time.perf_counter() - started, [(w.word, w.count, w.first_sentence, w.first_paragraph) for w in words]
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FIXTURE
+    paragraphs = load_paragraphs(path)
+    shared = get_lexicon()
+    # Fresh memos, so the cold run starts empty
+    lexicon = Lexicon(shared.valid_words, shared.lemmatizer, shared.frequencies)
+    run(paragraphs[:1], Lexicon(shared.valid_words, shared.lemmatizer, shared.frequencies), True)
+
+    unmemoized_seconds, expected = run(paragraphs, lexicon, False)
+    cold_seconds, cold = run(paragraphs, lexicon, True)
+    cold_stats = lexicon.token_memo.stats()
+    warm_seconds, warm = run(paragraphs, lexicon, True)
+    warm_stats = lexicon.token_memo.stats().since(cold_stats)
+    print(f"unmemoized {unmemoized_seconds * 1000:8.1f} ms")
+    print(f"cold       {cold_seconds * 1000:8.1f} ms  token memo {cold_stats}")
+    print(f"warm       {warm_seconds * 1000:8.1f} ms  token memo {warm_stats}")
+    assert cold == expected and warm == expected, "Memoized results differ"
+    print(f"identical results: {len(expected)} words")
+
+
+if __name__ == "__main__":
+    main()
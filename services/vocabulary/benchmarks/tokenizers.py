@@ -0,0 +1,74 @@
+"""
+Word extraction on the Tell-Tale Heart fixture with each tokenizer: Treebank against letter runs.
+
+Reports how many tokens and extracted words differ between the two, and how long
+each takes. The token comparison needs no NLTK data; word extraction needs the
+tagger and the lexicon.
+
+Usage:
+    PYTHONPATH=src poetry run python benchmarks/tokenizers.py [path/to/text.txt]
+"""
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from nltk.tokenize import word_tokenize
+
+from nlp_word_extraction import expand_tokens, letter_runs, parse_paragraphs
+
+here = os.path.dirname(__file__)
+DEFAULT_FIXTURE = f"{here}/../../paragraphs/tests/fixtures/the-tell-tale-heart.txt"
+ROUNDS = 5
+
+
+def load_paragraphs(path: str):
+    with open(path, encoding='utf-8') as file:
+        paragraphs = [re.sub(r'\s+', ' ', p).strip() for p in re.split(r'\n\s*\n', file.read())]
+    return [p for p in paragraphs if p]
+
+
+def timed(fn, *args):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def treebank_words(paragraphs):
+    # preserve_line, so as not to need the sentence tokenizer's data
+    return Counter(re.sub(r'\W+', '', token).lower() for p in paragraphs
+                   for token in expand_tokens(word_tokenize(p, preserve_line=True)))
+
+
+def letter_run_words(paragraphs):
+    return Counter(run.word for p in paragraphs for run in letter_runs(p))
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FIXTURE
+    paragraphs = load_paragraphs(path)
+
+    treebank_seconds, treebank = timed(treebank_words, paragraphs)
+    letters_seconds, letters = timed(letter_run_words, paragraphs)
+    differing = (treebank - letters) + (letters - treebank)
+    print(f"tokenizing: treebank {treebank_seconds * 1000:.1f} ms, letters {letters_seconds * 1000:.1f} ms")
+    print(f"tokens: {sum(differing.values())} of {sum(treebank.values())} differ "
+          f"({sum(differing.values()) / sum(treebank.values()):.2%}): {differing.most_common(10)}")
+
+    parse_paragraphs(paragraphs[:1])
+    treebank_seconds, treebank_result = timed(parse_paragraphs, paragraphs, 0.00002, 'treebank')
+    letters_seconds, letters_result = timed(parse_paragraphs, paragraphs, 0.00002, 'letters')
+    treebank_counts = Counter({w.word: w.count for w in treebank_result})
+    letters_counts = Counter({w.word: w.count for w in letters_result})
+    differing = (treebank_counts - letters_counts) + (letters_counts - treebank_counts)
+    print(f"extraction: treebank {treebank_seconds * 1000:.1f} ms, letters {letters_seconds * 1000:.1f} ms")
+    print(f"uncommon word occurrences: {sum(differing.values())} of {sum(treebank_counts.values())} differ: "
+          f"{differing.most_common(10)}")
+
+
+if __name__ == "__main__":
+    main()
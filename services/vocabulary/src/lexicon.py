@@ -0,0 +1,169 @@
+"""
+Process-wide lexicon for word extraction
+
+The set of valid English words (about 236k entries from NLTK's `words` corpus), their
+language frequencies, the lemmatizer, and the NLTK resources they depend on are loaded
+once per process and shared by reference by every WordProcessor, instead of being
+rebuilt for each job.
+"""
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from array import array
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+import nltk
+from nltk.corpus import wordnet, words
+from nltk.stem import WordNetLemmatizer
+from wordfreq import get_frequency_dict, word_frequency
+
+from memo import BoundedMemo
+
+logger = logging.getLogger(__name__)
+
+# The language of the valid-word list
+LEXICON_LANG = 'en'
+
+# Entries of the memos shared by all jobs of a process. A textbook has some thousands of
+# distinct tokens, so these hold the working set of many submissions
+LEMMA_MEMO_SIZE = int(os.getenv('LEMMA_MEMO_SIZE', '100000'))
+TOKEN_MEMO_SIZE = int(os.getenv('TOKEN_MEMO_SIZE', '200000'))
+
+# NLTK resources required, with where each is found in the NLTK data path
+REQUIRED_NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+    'averaged_perceptron_tagger_eng': 'taggers/averaged_perceptron_tagger_eng',
+    'wordnet': 'corpora/wordnet',
+    'words': 'corpora/words',
+    'omw-1.4': 'corpora/omw-1.4',
+}
+
+
+def missing_nltk_resources() -> List[str]:
+    missing = []
+    for resource_name, path in REQUIRED_NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(resource_name)
+    return missing
+
+
+def ensure_nltk_resources() -> None:
+    """Download required NLTK resources if not already available."""
+    for resource_name in missing_nltk_resources():
+        try:
+            logger.info(f"Downloading NLTK resource: {resource_name}")
+            nltk.download(resource_name, quiet=True)
+        except Exception as e:
+            logger.error(f"Failed to download NLTK resource '{resource_name}': {e}")
+            raise
+
+
+def resident_memory_mb() -> float:
+    """The process's resident memory; its peak, where the current size cannot be read."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        # There is no /proc on macOS, where ru_maxrss is in bytes; elsewhere it is in kilobytes
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class FrequencyIndex:
+    """
+    wordfreq frequencies of a set of words, precomputed.
+
+    wordfreq rounds frequencies to three significant digits, so there are only some
+    hundreds of distinct values: they are kept in an array, and each word maps to its
+    position in it. Words of the set that wordfreq does not know have frequency 0 and
+    take no space. Lookups of other words go to wordfreq itself.
+    """
+
+    def __init__(self, words_: Iterable[str], lang: str):
+        self.lang = lang
+        # A frozenset given here is shared, not copied
+        self.words = frozenset(words_)
+        known = get_frequency_dict(lang)
+        # word_frequency tokenizes the word and rounds its listed frequency. For a plain ASCII
+        # word, the only token is the word in lower case, so the result only depends on the
+        # listed frequency: it is computed once per distinct value, for the first word that has it.
+        rounded: Dict[float, float] = {}
+        frequencies = {}
+        for word in self.words:
+            if word.isascii() and word.isalpha():
+                listed = known.get(word.lower())
+                if listed is None:
+                    continue
+                if listed not in rounded:
+                    rounded[listed] = word_frequency(word, lang)
+                frequency = rounded[listed]
+            else:
+                frequency = word_frequency(word, lang)
+            if frequency:
+                frequencies[word] = frequency
+        self.levels = array('d', sorted(set(frequencies.values())))
+        positions = {frequency: position for position, frequency in enumerate(self.levels)}
+        self.level_of: Dict[str, int] = {word: positions[frequency] for word, frequency in frequencies.items()}
+
+    def frequency(self, word: str) -> float:
+        """Same as wordfreq.word_frequency(word, lang)."""
+        position = self.level_of.get(word)
+        if position is not None:
+            return self.levels[position]
+        if word in self.words:
+            return 0.0
+        return word_frequency(word, self.lang)
+
+
+class Lexicon:
+    """The lookup structures shared by all word processing in the process. Read-only once loaded."""
+
+    def __init__(self, valid_words: FrozenSet[str], lemmatizer: WordNetLemmatizer,
+                 frequencies: Optional[FrequencyIndex] = None):
+        self.valid_words = valid_words
+        self.lemmatizer = lemmatizer
+        # None to look frequencies up in wordfreq as they are needed
+        self.frequencies = frequencies
+        # (word, WordNet POS) -> lemma, by this lexicon's lemmatizer
+        self.lemma_memo: BoundedMemo = BoundedMemo(LEMMA_MEMO_SIZE)
+        # (token, tag, language) -> the lemma the token counts as and its frequency, or None if it is not kept
+        self.token_memo: BoundedMemo = BoundedMemo(TOKEN_MEMO_SIZE)
+
+    @staticmethod
+    def load() -> 'Lexicon':
+        started = time.perf_counter()
+        memory_before = resident_memory_mb()
+        ensure_nltk_resources()
+        valid_words = frozenset(words.words())
+        lexicon = Lexicon(valid_words, WordNetLemmatizer(), FrequencyIndex(valid_words, LEXICON_LANG))
+        # WordNet loads lazily on first use; load it now rather than in the middle of the first job
+        wordnet.ensure_loaded()
+        logger.info(f"Loaded lexicon of {len(lexicon.valid_words)} words "
+                    f"({len(lexicon.frequencies.level_of)} with a language frequency) in "
+                    f"{time.perf_counter() - started:.2f}s, "
+                    f"resident memory {memory_before:.0f} -> {resident_memory_mb():.0f} MB")
+        return lexicon
+
+    def is_valid_word(self, word: str) -> bool:
+        return word in self.valid_words
+
+
+_lexicon: Optional[Lexicon] = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon() -> Lexicon:
+    """The process's lexicon, loaded on first use."""
+    global _lexicon
+    if _lexicon is None:
+        with _lexicon_lock:
+            if _lexicon is None:
+                _lexicon = Lexicon.load()
+    return _lexicon
@@ -13,51 +13,102 @@ import json
 import signal
 import sys
 import boto3
-from common.constants import VOCABULARY_QUEUE
+from common.constants import VOCABULARY_QUEUE, VOCABULARY_STORED_THRESHOLD, VOCABULARY_CACHE_TABLE
 from common.envvar import environment
 from common.logger import logger
+from common.metrics import configure_metrics, count_items, stage
 from common.upload_notification import poll_sqs_for_s3_file_forever, S3Upload
 from common.sqs_client import sqs_client
 from common.vocabulary_word_repo import NewVocabularyWord, vocabulary_word_repo
 from common.submission_repo import submission_repo, SubmissionState
-from nlp_word_extraction import parse_paragraphs
+from lexicon import get_lexicon
+from nlp_word_extraction import TOKENIZERS, Config
+from paragraph_cap import cap_per_paragraph
+from parallel_extraction import parse_paragraphs_parallel
+from vocabulary_cache import build_vocabulary_cache
 
 # Configuration
 PARAGRAPHS_BUCKET = environment.require('PARAGRAPHS_BUCKET')
+# Processes to parse long documents in; 1 parses in this process
+VOCABULARY_WORKERS = int(environment.require('VOCABULARY_WORKERS')) if environment.has('VOCABULARY_WORKERS') else 1
+# How sentences are split into words: 'treebank', or 'letters' for throughput
+VOCABULARY_TOKENIZER = (environment.require('VOCABULARY_TOKENIZER') if environment.has('VOCABULARY_TOKENIZER')
+                        else Config.TOKENIZER)
+if VOCABULARY_TOKENIZER not in TOKENIZERS:
+    raise ValueError(f"VOCABULARY_TOKENIZER must be one of {sorted(TOKENIZERS)}, not '{VOCABULARY_TOKENIZER}'")
+VOCABULARY_CACHE_PATH = environment.require('VOCABULARY_CACHE_PATH') if environment.has('VOCABULARY_CACHE_PATH') else None
+VOCABULARY_CACHE_SHARED = environment.has('VOCABULARY_CACHE_SHARED')
+VOCABULARY_CACHE_TTL_DAYS = (int(environment.require('VOCABULARY_CACHE_TTL_DAYS'))
+                             if environment.has('VOCABULARY_CACHE_TTL_DAYS') else 30)
+# Most words saved one by one per paragraph; the rest go in the paragraph's compact "more" list.
+# 0 for no cap
+VOCABULARY_WORDS_PER_PARAGRAPH = (int(environment.require('VOCABULARY_WORDS_PER_PARAGRAPH'))
+                                  if environment.has('VOCABULARY_WORDS_PER_PARAGRAPH') else 50)
 
 # AWS clients
 s3 = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
 queue_client = sqs_client.for_queue(VOCABULARY_QUEUE)
 
-def process_record(s3_upload: S3Upload):
-    with open(s3_upload.tmp_file_path, 'r', encoding='utf-8', errors='replace') as file:
-        paragraphs = json.load(file)
+# Words of paragraphs already parsed: a local SQLite file and/or the DynamoDB table shared by all workers
+vocabulary_cache = build_vocabulary_cache(
+    sqlite_path=VOCABULARY_CACHE_PATH,
+    dynamodb_table=dynamodb.Table(VOCABULARY_CACHE_TABLE) if VOCABULARY_CACHE_SHARED else None,
+    ttl_seconds=VOCABULARY_CACHE_TTL_DAYS * 24 * 60 * 60,
+)
 
-    words = parse_paragraphs(paragraphs)
+def process_record(s3_upload: S3Upload):
     user_id = s3_upload.user_id
     submission_id = s3_upload.file_hash
+    chunk = s3_upload.chunk
+    if chunk is None and submission_repo.is_chunked(user_id, submission_id):
+        logger.info(f"Submission {submission_id} is processed in chunks; ignoring whole-file notification")
+        return
+
+    with open(s3_upload.tmp_file_path, 'r', encoding='utf-8', errors='replace') as file, stage('load_paragraphs'):
+        paragraphs = json.load(file)
+
+    start, end = (chunk.start, chunk.end) if chunk else (0, len(paragraphs))
+    # Every word the API may show is saved, with its frequency, so that it can filter by any threshold
+    with stage('extract_vocabulary'):
+        words = parse_paragraphs_parallel(paragraphs[start:end], VOCABULARY_STORED_THRESHOLD,
+                                          workers=VOCABULARY_WORKERS, tokenizer=VOCABULARY_TOKENIZER,
+                                          cache=vocabulary_cache)
+    count_items('extract_vocabulary', 'paragraphs', end - start)
+    count_items('extract_vocabulary', 'words', len(words))
 
-    logger.info(f"Processing {len(words)} vocabulary words for submission {submission_id}")
+    kept_words, more_words = cap_per_paragraph(words, VOCABULARY_WORDS_PER_PARAGRAPH or None)
 
-    # Prepare batch write items
-    new_vocabulary_words = []
-    for word_obj in words:
-        record = NewVocabularyWord(
+    logger.info(f"Processing {len(words)} vocabulary words for submission {submission_id} "
+                f"paragraphs {start}-{end}, {len(more_words)} of them past their paragraph's cap")
+
+    def record(word_obj):
+        return NewVocabularyWord(
             user_id=user_id,
             submission_id=submission_id,
-            paragraph_number=word_obj.first_paragraph,
+            paragraph_number=start + word_obj.first_paragraph,
             word=word_obj.word,
+            language_frequency=word_obj.language_frequency,
+            count=word_obj.count,
         )
-        new_vocabulary_words.append(record)
-
-    vocabulary_word_repo.create_many(new_vocabulary_words)
 
-    submission_repo.update_state(
-        s3_upload.user_id,
-        s3_upload.file_hash,
-        SubmissionState.VOCABULARIZED.value
-    )
+    with stage('dynamodb_write'):
+        vocabulary_word_repo.create_many([record(w) for w in kept_words], more_words=[record(w) for w in more_words])
+
+    with stage('dynamodb_write'):
+        if chunk is not None:
+            if not submission_repo.mark_chunk_done(user_id, submission_id, SubmissionState.VOCABULARIZED, chunk):
+                logger.info(f"Saved {len(words)} vocabulary words for chunk {chunk.index} "
+                            f"of submission {submission_id}")
+                return
+            # Every chunk is in: each word should only be listed where it first appears in the whole document
+            vocabulary_word_repo.keep_first_occurrences(user_id, submission_id)
+
+        submission_repo.update_state(
+            s3_upload.user_id,
+            s3_upload.file_hash,
+            SubmissionState.VOCABULARIZED.value
+        )
 
     logger.info(f"Successfully saved {len(words)} vocabulary words for submission {submission_id}")
 
@@ -75,10 +126,16 @@ def main():
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
 
+    configure_metrics('vocabulary')
+
+    # Load the lexicon before any worker processes are forked, so that they share it
+    get_lexicon()
+
     for s3_upload in poll_sqs_for_s3_file_forever(queue_client, 5):
         logger.info(f"Processing file from bucket {s3_upload.bucket} with key {s3_upload.key}...")
         try:
-            process_record(s3_upload)
+            with stage('process_record'):
+                process_record(s3_upload)
         except Exception as e:
             logger.error(f"Error processing file {s3_upload.key}: {e}", exc_info=True)
 
@@ -0,0 +1,71 @@
+"""
+Bounded memos for the word-processing hot loop
+
+A document repeats the same tokens thousands of times, and a long-lived worker sees
+the same words across submissions, so the results of lemmatizing and judging a token
+are kept, up to a fixed number of entries, evicting the least recently used.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Generic, Hashable, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+@dataclass(frozen=True)
+class MemoStats:
+    hits: int
+    misses: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def since(self, earlier: 'MemoStats') -> 'MemoStats':
+        """The lookups made after `earlier` was taken, e.g. during one job."""
+        return MemoStats(self.hits - earlier.hits, self.misses - earlier.misses, self.size)
+
+    def __str__(self) -> str:
+        return f"{self.hit_rate:.1%} hits of {self.hits + self.misses} lookups, {self.size} entries"
+
+
+class BoundedMemo(Generic[K, V]):
+    """A least-recently-used memo of at most maxsize entries, counting hits and misses. Thread-safe."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[K, V]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: K, compute: Callable[[], V]) -> V:
+        """The value memoized for key, or else compute() (called outside the lock), memoized."""
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                pass
+            else:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return value
+
+        value = compute()
+        with self._lock:
+            self._misses += 1
+            self._entries[key] = value
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self) -> MemoStats:
+        with self._lock:
+            return MemoStats(self._hits, self._misses, len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
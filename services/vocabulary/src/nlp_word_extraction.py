@@ -7,14 +7,17 @@ It uses NLTK for NLP tasks and wordfreq for language frequency analysis.
 import re
 import functools
 import logging
-from typing import Dict, List, Any, Set
+import time
+from typing import Callable, Dict, List, Any, NamedTuple, Optional, Set, Tuple
 
 import nltk
 from nltk.tokenize import sent_tokenize, word_tokenize
-from nltk.stem import WordNetLemmatizer
-from nltk.corpus import wordnet, words
+from nltk.corpus import wordnet
 from wordfreq import word_frequency
 
+from lexicon import Lexicon, get_lexicon, resident_memory_mb
+from memo import BoundedMemo
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,35 +25,23 @@ logger = logging.getLogger(__name__)
 # Regular expression to filter non-letter characters
 LETTERS_REGEX = re.compile(r'[^a-zA-ZÀ-ÿ]')
 
+# Runs of the letters that LETTERS_REGEX keeps
+LETTER_RUNS_REGEX = re.compile(r'[a-zA-ZÀ-ÿ]+')
+
+# Runs of those letters, and runs of anything else but whitespace (punctuation, mostly)
+LETTER_RUN_TOKENS_REGEX = re.compile(r'[a-zA-ZÀ-ÿ]+|[^\sa-zA-ZÀ-ÿ]+')
+
 # Set of POS tags for proper nouns (to be filtered out)
 PROPER_NOUN_TAGS: Set[str] = {'NNP', 'NNPS'}
 
-# NLTK resources required
-REQUIRED_NLTK_RESOURCES: List[str] = [
-    'punkt', 'punkt_tab',
-    'averaged_perceptron_tagger', 'averaged_perceptron_tagger_eng',
-    'wordnet', 'words', 'omw-1.4'
-]
-
 class Config:
     """Configuration settings for word extraction."""
     # Threshold for what is considered "common" in the language
     COMMON_THRESHOLD: float = 0.00002
+    # How sentences are split into words; see TOKENIZERS
+    TOKENIZER: str = 'treebank'
 
 
-def ensure_nltk_resources() -> None:
-    """Download required NLTK resources if not already available."""
-    for resource in REQUIRED_NLTK_RESOURCES:
-        try:
-            nltk.data.find(f'tokenizers/{resource}')
-        except LookupError:
-            try:
-                logger.info(f"Downloading NLTK resource: {resource}")
-                nltk.download(resource, quiet=True)
-            except Exception as e:
-                logger.error(f"Failed to download NLTK resource '{resource}': {e}")
-                raise
-
 @functools.lru_cache(maxsize=1024)
 def get_wordnet_pos(nltk_tag: str) -> Any:
     """
@@ -93,6 +84,58 @@ def expand_tokens(tokens: List[str]) -> List[str]:
     return expanded
 
 
+class LetterRun(NamedTuple):
+    word: str  # In lower case
+    start: int
+    end: int
+
+
+def letter_runs(text: str) -> List[LetterRun]:
+    """
+    Find the runs of letters in a text, with their offsets in it.
+
+    One regular expression pass that stands for word_tokenize, expand_tokens and the
+    cleaning of tokens: those split the Treebank tokens on non-letters again anyway.
+
+    Args:
+        text: The text to split
+
+    Returns:
+        The runs of letters, in lower case, in order
+    """
+    return [LetterRun(match.group().lower(), match.start(), match.end())
+            for match in LETTER_RUNS_REGEX.finditer(text)]
+
+
+def treebank_tokens(sentence: str) -> List[str]:
+    """The words of a sentence, as tokenized by NLTK and split on non-letters."""
+    return expand_tokens(word_tokenize(sentence))
+
+
+def letter_run_tokens(sentence: str) -> List[str]:
+    """
+    The letter runs of a sentence, as written: the tagger relies on case to tell proper nouns.
+
+    The runs of punctuation between them are kept as tokens of their own, since the
+    tagger was trained on sentences with their punctuation and uses it as context; they
+    are dropped once tagged (see accept_token).
+
+    The words differ from treebank_tokens only where Treebank splits inside a run of
+    letters, as in "cannot" (can, not) and "don't" (do, n, t rather than don, t). On the
+    Tell-Tale Heart fixture, 3 of 2165 words differ (0.14%), and tokenizing takes a fifth to
+    a tenth of the time; see benchmarks/tokenizers.py, which also compares the words
+    extracted with each tokenizer, tags included.
+    """
+    return LETTER_RUN_TOKENS_REGEX.findall(sentence)
+
+
+# Tokenizers by name, selected per deployment with VOCABULARY_TOKENIZER
+TOKENIZERS: Dict[str, Callable[[str], List[str]]] = {
+    'treebank': treebank_tokens,
+    'letters': letter_run_tokens,
+}
+
+
 class Language:
     """
     Represents the language and standards for processing text.
@@ -100,7 +143,7 @@ class Language:
     def __init__(self, lang: str, frequency_threshold: float):
         self.lang = lang
         self.frequency_threshold = frequency_threshold
-        self.lemmatizer = WordNetLemmatizer()
+        self.lemmatizer = get_lexicon().lemmatizer
 
 class WordFromText:
     """
@@ -141,27 +184,44 @@ class WordProcessor:
     lemmatization, and frequency analysis.
     """
 
-    def __init__(self, paragraphs: List[str], language: Language):
+    def __init__(self, paragraphs: List[str], language: Language, lexicon: Optional[Lexicon] = None,
+                 tokenizer: str = Config.TOKENIZER):
         """
         Initialize the WordProcessor with multiple paragraphs.
 
         Args:
             paragraphs: List of text paragraphs to analyze
             language: The Language object according to which we will process the text
+            lexicon: The valid words; defaults to the lexicon shared by the process
+            tokenizer: The name of the tokenizer that splits sentences into words, in TOKENIZERS
         """
+        if tokenizer not in TOKENIZERS:
+            raise ValueError(f"Unknown tokenizer '{tokenizer}', expected one of {sorted(TOKENIZERS)}")
+        started = time.perf_counter()
+        self.tokenize = TOKENIZERS[tokenizer]
         self.paragraphs = paragraphs  # Store paragraphs as a list
         self.lang = language.lang
         self.frequency_threshold = language.frequency_threshold
         self.lemmatizer = language.lemmatizer
-        self.valid_words = set(words.words())
+        # Shared, not copied: the lexicon is loaded once per process
+        lexicon = lexicon or get_lexicon()
+        self.valid_words = lexicon.valid_words
+        self.frequencies = (lexicon.frequencies
+                            if lexicon.frequencies is not None and lexicon.frequencies.lang == self.lang else None)
+        # The lexicon's memos outlive the job, so they hold for the lexicon's own lemmatizer only
+        memoized = self.lemmatizer is lexicon.lemmatizer
+        self.lemma_memo: Optional[BoundedMemo] = lexicon.lemma_memo if memoized else None
+        self.token_memo: Optional[BoundedMemo] = lexicon.token_memo if memoized else None
         self.word_info: Dict[str, WordFromText] = {}
+        # The words of each paragraph on its own, when parsed with parse_paragraph_words
+        self.paragraph_words: Dict[int, Dict[str, WordFromText]] = {}
 
-        ensure_nltk_resources()
+        logger.info(f"Word processor set up in {(time.perf_counter() - started) * 1000:.1f} ms, "
+                    f"resident memory {resident_memory_mb():.0f} MB")
 
-    @functools.lru_cache(maxsize=1024)
     def get_word_frequency(self, lemma_word: str) -> float:
         """
-        Get (and cache) the frequency of a word in the specified language.
+        Get the frequency of a word in the specified language, from the lexicon's index if it has one.
 
         Args:
             lemma_word: The word to check
@@ -169,6 +229,8 @@ class WordProcessor:
         Returns:
             The word frequency as a float
         """
+        if self.frequencies is not None:
+            return self.frequencies.frequency(lemma_word)
         return word_frequency(lemma_word, self.lang)
 
     def lemmatize_word(self, word: str, pos_tag: str) -> str:
@@ -182,7 +244,40 @@ class WordProcessor:
         Returns:
             The lemmatized word
         """
-        return self.lemmatizer.lemmatize(word, pos=get_wordnet_pos(pos_tag))
+        pos = get_wordnet_pos(pos_tag)
+        if self.lemma_memo is None:
+            return self.lemmatizer.lemmatize(word, pos=pos)
+        return self.lemma_memo.get((word, pos), lambda: self.lemmatizer.lemmatize(word, pos=pos))
+
+    def accept_token(self, token: str, tag: str) -> Optional[Tuple[str, float]]:
+        """
+        Decide what a tagged token counts as, remembering the decision for the process.
+
+        Args:
+            token: The token as tokenized
+            tag: Its POS tag from NLTK
+
+        Returns:
+            The token's lemma and its language frequency, or None if the token is not a
+            word to keep: a proper noun, punctuation, or outside the lexicon
+        """
+        if self.token_memo is None:
+            return self._accept_token(token, tag)
+        return self.token_memo.get((token, tag, self.lang), lambda: self._accept_token(token, tag))
+
+    def _accept_token(self, token: str, tag: str) -> Optional[Tuple[str, float]]:
+        if tag in PROPER_NOUN_TAGS:
+            return None
+
+        cleaned = re.sub(r'\W+', '', token).lower()
+        if not cleaned:
+            return None
+
+        lemma_word = self.lemmatize_word(cleaned, tag)
+        # Checked first, as it is the cheaper check, and words outside the lexicon are never kept
+        if not self.is_valid_word(lemma_word):
+            return None
+        return lemma_word, self.get_word_frequency(lemma_word)
 
     def is_uncommon_word(self, lemma_word: str) -> bool:
         """
@@ -207,32 +302,60 @@ class WordProcessor:
             sentence: The sentence to process
             paragraph_index: The index of the paragraph this sentence belongs to
         """
-        tokens = word_tokenize(sentence)
-        expanded_tokens = expand_tokens(tokens)
-        pos_tags = nltk.pos_tag(expanded_tokens)
+        self.process_sentences([sentence], [paragraph_index])
 
-        for word, tag in pos_tags:
-            if tag in PROPER_NOUN_TAGS:
-                continue
-
-            cleaned = re.sub(r'\W+', '', word).lower()
-            if not cleaned:
-                continue
-
-            lemma_word = self.lemmatize_word(cleaned, tag)
+    def process_sentences(self, sentences: List[str], paragraph_indices: List[int],
+                          by_paragraph: bool = False) -> None:
+        """
+        Process many sentences at once, in order, to extract and analyze words.
 
-            if not self.is_uncommon_word(lemma_word) or not self.is_valid_word(lemma_word):
-                continue
+        The sentences are tokenized and then POS-tagged in one call, so that the per-call
+        costs of the tagger are paid once rather than per sentence. What each tagged token
+        counts as is memoized for the process (see accept_token), so repeated tokens are
+        not lemmatized or looked up again.
 
-            if lemma_word not in self.word_info:
-                self.word_info[lemma_word] = WordFromText(
-                    lemma_word,
-                    sentence,
-                    paragraph_index,
-                    self.get_word_frequency(lemma_word)
-                )
-            else:
-                self.word_info[lemma_word].increment()
+        Args:
+            sentences: The sentences to process
+            paragraph_indices: The index of the paragraph each sentence belongs to
+            by_paragraph: Collect the words of each paragraph separately, in paragraph_words,
+                rather than those of all paragraphs together in word_info
+        """
+        token_lists = [self.tokenize(sentence) for sentence in sentences]
+        tagged_sentences = nltk.pos_tag_sents(token_lists)
+
+        for sentence_index, pos_tags in enumerate(tagged_sentences):
+            word_info = (self.paragraph_words.setdefault(paragraph_indices[sentence_index], {}) if by_paragraph
+                         else self.word_info)
+            for token, tag in pos_tags:
+                accepted = self.accept_token(token, tag)
+                if accepted is None:
+                    continue
+                lemma_word, frequency = accepted
+                if frequency >= self.frequency_threshold:
+                    continue
+
+                if lemma_word not in word_info:
+                    word_info[lemma_word] = WordFromText(
+                        lemma_word,
+                        sentences[sentence_index],
+                        paragraph_indices[sentence_index],
+                        frequency
+                    )
+                else:
+                    word_info[lemma_word].increment()
+
+    def _process_paragraphs(self, by_paragraph: bool) -> None:
+        memo_stats = (self.token_memo.stats(), self.lemma_memo.stats()) if self.token_memo is not None else None
+        sentences: List[str] = []
+        paragraph_indices: List[int] = []
+        for i in range(len(self.paragraphs)):
+            for sentence in sent_tokenize(self.paragraphs[i]):
+                sentences.append(sentence)
+                paragraph_indices.append(i)
+        self.process_sentences(sentences, paragraph_indices, by_paragraph)
+        if memo_stats is not None:
+            logger.info(f"Token memo: {self.token_memo.stats().since(memo_stats[0])}; "
+                        f"lemma memo: {self.lemma_memo.stats().since(memo_stats[1])}")
 
     def parse_text(self) -> List[WordFromText]:
         """
@@ -242,9 +365,7 @@ class WordProcessor:
             List of tuples containing lemmas and their information,
             sorted by language frequency (highest first)
         """
-        for i in range(len(self.paragraphs)):
-            for sentence in sent_tokenize(self.paragraphs[i]):
-                self.process_sentence(sentence, i)
+        self._process_paragraphs(by_paragraph=False)
 
         sorted_words = sorted(
             self.word_info.values(),
@@ -254,21 +375,36 @@ class WordProcessor:
 
         return sorted_words
 
+    def parse_paragraph_words(self) -> List[List[WordFromText]]:
+        """
+        Parse the paragraphs to extract the uncommon words of each on its own, e.g. to cache them.
+
+        Merging these in paragraph order, keeping the first occurrence of each word and summing
+        its counts, gives the words parse_text finds.
+
+        Returns:
+            The words of each paragraph, in order of first occurrence in it
+        """
+        self._process_paragraphs(by_paragraph=True)
+        return [list(self.paragraph_words.get(i, {}).values()) for i in range(len(self.paragraphs))]
+
 
-def parse_paragraphs(paragraphs: List[str], common_threshold=Config.COMMON_THRESHOLD) -> List[WordFromText]:
+def parse_paragraphs(paragraphs: List[str], common_threshold=Config.COMMON_THRESHOLD,
+                     tokenizer: str = Config.TOKENIZER) -> List[WordFromText]:
     """
     Parse paragraphs to extract uncommon words.
 
     Args:
         paragraphs: List of text paragraphs
         common_threshold: Words more frequent than this in their language will be ignored
+        tokenizer: The name of the tokenizer that splits sentences into words, in TOKENIZERS
 
     Returns:
         List of tuples containing lemmas and their information,
         sorted by language frequency (highest first)
     """
     language = Language('en', common_threshold)
-    return WordProcessor(paragraphs, language).parse_text()
+    return WordProcessor(paragraphs, language, tokenizer=tokenizer).parse_text()
 
 def parse_text(text: str, common_threshold = Config.COMMON_THRESHOLD) -> List[WordFromText]:
     """
@@ -0,0 +1,58 @@
+"""
+Per-paragraph vocabulary cap
+
+Dense academic texts can have hundreds of uncommon words in a paragraph, every one of
+which would be saved and sent to the browser. Each paragraph keeps its best words, up
+to a cap, ranked by rarity and by how often they come up in the document; the others
+are saved as the paragraph's compact "more" list.
+"""
+import heapq
+import math
+from typing import Dict, List, Optional, Tuple
+
+from nlp_word_extraction import WordFromText
+
+# Frequencies are ranked as at least this: wordfreq lists no word rarer, and gives 0 for words it does not know
+MIN_RANKED_FREQUENCY = 1e-9
+
+
+def word_score(word: WordFromText) -> float:
+    """
+    How much a word is worth showing: its rarity (the negative log of its frequency),
+    weighted up, logarithmically, by its occurrences in the document.
+    """
+    rarity = -math.log10(max(word.language_frequency, MIN_RANKED_FREQUENCY))
+    return rarity * (1 + math.log(word.count))
+
+
+def cap_per_paragraph(words: List[WordFromText],
+                      limit: Optional[int]) -> Tuple[List[WordFromText], List[WordFromText]]:
+    """
+    Split words into the best `limit` of each paragraph (where each first occurs) and the rest.
+
+    The best are picked with a heap, in O(n log limit). Among words of equal score, the
+    earlier ones are kept.
+
+    Args:
+        words: The words of a document
+        limit: Most words to keep per paragraph; None for no cap
+
+    Returns:
+        The words kept and the others, each in the order they were given
+    """
+    if limit is None:
+        return list(words), []
+
+    by_paragraph: Dict[int, List[WordFromText]] = {}
+    for word in words:
+        by_paragraph.setdefault(word.first_paragraph, []).append(word)
+
+    kept_ids = set()
+    for paragraph_words in by_paragraph.values():
+        best = paragraph_words if len(paragraph_words) <= limit else heapq.nlargest(
+            limit, paragraph_words, key=word_score)
+        kept_ids.update(id(word) for word in best)
+
+    kept = [word for word in words if id(word) in kept_ids]
+    more = [word for word in words if id(word) not in kept_ids]
+    return kept, more
@@ -0,0 +1,192 @@
+"""
+Parallel vocabulary extraction
+
+Long documents are split into shards of consecutive paragraphs, which are parsed
+on a pool of worker processes. Sentences never cross paragraphs, so each shard
+finds exactly the words the serial path finds in those paragraphs. The partial
+results are merged in paragraph order: a word's first occurrence comes from the
+earliest shard that has it, and its counts are summed, so that the merged result
+is the same as the serial one, down to the order of words of equal frequency.
+
+The pool is created once per process, and its workers load the lexicon and the
+NLTK models when they start, rather than in the middle of a job.
+
+With a vocabulary cache, only the paragraphs not cached are parsed, each on its own,
+and the words of the document are merged from those of all its paragraphs alike.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import nltk
+
+from lexicon import get_lexicon
+from nlp_word_extraction import Config, Language, WordFromText, WordProcessor, parse_paragraphs
+from vocabulary_cache import VocabularyCache, cache_key, dump_words, load_words
+
+logger = logging.getLogger(__name__)
+
+# Not yet measured on a multi-core host: benchmarks/parallel_speedup.py measures both,
+# and its results are to be recorded with VOCABULARY_WORKERS in .env.EXAMPLE
+
+# Shards per worker: more than one, so a worker that finishes early can take another
+SHARDS_PER_WORKER = 2
+
+# Documents shorter than this are parsed serially, as the pool would cost more than it saves
+MIN_PARALLEL_PARAGRAPHS = 40
+
+
+def warm_up_worker() -> None:
+    """Load the lexicon, tokenizers and tagger in a new worker process."""
+    get_lexicon()
+    nltk.pos_tag_sents([nltk.word_tokenize(sentence) for sentence in nltk.sent_tokenize("Warm up. The models.")])
+
+
+def parse_shard(paragraphs: List[str], first_paragraph: int, lang: str,
+                common_threshold: float, tokenizer: str = Config.TOKENIZER) -> List[WordFromText]:
+    """
+    The words of one shard, in order of first occurrence.
+
+    Paragraph indices are shifted by first_paragraph, to be indices in the whole document.
+    """
+    processor = WordProcessor(paragraphs, Language(lang, common_threshold), tokenizer=tokenizer)
+    processor.parse_text()
+    words = list(processor.word_info.values())
+    for word in words:
+        word.first_paragraph += first_paragraph
+    return words
+
+
+def parse_shard_paragraphs(paragraphs: List[str], lang: str, common_threshold: float,
+                           tokenizer: str = Config.TOKENIZER) -> List[List[WordFromText]]:
+    """The words of each paragraph of a shard, on its own."""
+    processor = WordProcessor(paragraphs, Language(lang, common_threshold), tokenizer=tokenizer)
+    return processor.parse_paragraph_words()
+
+
+def plan_shards(paragraphs: List[str], shard_count: int) -> List[Tuple[int, int]]:
+    """Split paragraphs into up to shard_count ranges of consecutive paragraphs, of similar total length."""
+    total = sum(len(p) for p in paragraphs)
+    shards = []
+    start = 0
+    length = 0
+    for i, paragraph in enumerate(paragraphs):
+        length += len(paragraph)
+        # Close the shard once it has its share of the text
+        if length * shard_count >= total * (len(shards) + 1) and i + 1 < len(paragraphs):
+            shards.append((start, i + 1))
+            start = i + 1
+    shards.append((start, len(paragraphs)))
+    return shards
+
+
+def merge_words(shards: List[List[WordFromText]]) -> Dict[str, WordFromText]:
+    """
+    Merge the words of shards, given in document order.
+
+    The first shard that has a word gives its first sentence and paragraph; counts are summed.
+    """
+    merged: Dict[str, WordFromText] = {}
+    for shard_words in shards:
+        for word in shard_words:
+            existing = merged.get(word.word)
+            if existing is None:
+                merged[word.word] = word
+            else:
+                existing.count += word.count
+    return merged
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """The process's worker pool, created on first use."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+            # Forked workers start with whatever this process has loaded already
+            context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods()
+                                                  else None)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=warm_up_worker)
+            _pool_workers = workers
+        return _pool
+
+
+def parse_paragraph_words_parallel(paragraphs: List[str], common_threshold: float, workers: int = 1,
+                                   tokenizer: str = Config.TOKENIZER) -> List[List[WordFromText]]:
+    """The words of each paragraph on its own, as WordProcessor.parse_paragraph_words, sharded."""
+    if workers <= 1 or len(paragraphs) < MIN_PARALLEL_PARAGRAPHS:
+        return parse_shard_paragraphs(paragraphs, 'en', common_threshold, tokenizer)
+
+    pool = get_pool(workers)
+    futures = [pool.submit(parse_shard_paragraphs, paragraphs[start:end], 'en', common_threshold, tokenizer)
+               for start, end in plan_shards(paragraphs, workers * SHARDS_PER_WORKER)]
+    return [words for future in futures for words in future.result()]
+
+
+def parse_paragraphs_cached(paragraphs: List[str], cache: VocabularyCache, common_threshold: float,
+                            workers: int = 1, tokenizer: str = Config.TOKENIZER) -> List[WordFromText]:
+    """
+    Parse only the paragraphs whose words are not cached, and merge the words of all paragraphs.
+
+    Same results as parse_paragraphs.
+    """
+    keys = [cache_key(paragraph, 'en', common_threshold, tokenizer) for paragraph in paragraphs]
+    cached = cache.get_many(set(keys))
+    missing = {}
+    for i, key in enumerate(keys):
+        if key not in cached and key not in missing:
+            missing[key] = i
+
+    if missing:
+        parsed = parse_paragraph_words_parallel([paragraphs[i] for i in missing.values()], common_threshold,
+                                                workers, tokenizer)
+        new_entries = {key: dump_words(words) for key, words in zip(missing, parsed)}
+        cache.put_many(new_entries)
+        cached.update(new_entries)
+    logger.info(f"Vocabulary cache: parsed {len(missing)} of {len(set(keys))} distinct paragraphs")
+
+    # Cached and newly parsed words alike are loaded from their cached form, so both merge the same way
+    merged = merge_words([load_words(cached[key], i) for i, key in enumerate(keys)])
+    return sorted(merged.values(), key=lambda item: item.language_frequency, reverse=True)
+
+
+def parse_paragraphs_parallel(paragraphs: List[str], common_threshold: float = Config.COMMON_THRESHOLD,
+                              workers: int = 1, tokenizer: str = Config.TOKENIZER,
+                              cache: Optional[VocabularyCache] = None) -> List[WordFromText]:
+    """
+    Parse paragraphs to extract uncommon words, sharded across worker processes.
+
+    Same results as parse_paragraphs, which is used for one worker or short documents.
+
+    Args:
+        paragraphs: List of text paragraphs
+        common_threshold: Words more frequent than this in their language will be ignored
+        workers: How many processes to parse in
+        tokenizer: The name of the tokenizer that splits sentences into words
+        cache: Where to look the words of paragraphs up before parsing them, and keep them after
+
+    Returns:
+        List of words and their information,
+        sorted by language frequency (highest first)
+    """
+    if cache is not None:
+        return parse_paragraphs_cached(paragraphs, cache, common_threshold, workers, tokenizer)
+    if workers <= 1 or len(paragraphs) < MIN_PARALLEL_PARAGRAPHS:
+        return parse_paragraphs(paragraphs, common_threshold, tokenizer)
+
+    shards = plan_shards(paragraphs, workers * SHARDS_PER_WORKER)
+    pool = get_pool(workers)
+    futures = [pool.submit(parse_shard, paragraphs[start:end], start, 'en', common_threshold, tokenizer)
+               for start, end in shards]
+    merged = merge_words([future.result() for future in futures])
+    logger.info(f"Parsed {len(paragraphs)} paragraphs in {len(shards)} shards on {workers} processes")
+
+    return sorted(merged.values(), key=lambda item: item.language_frequency, reverse=True)
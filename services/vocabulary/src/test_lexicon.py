@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from wordfreq import word_frequency
+
+from lexicon import FrequencyIndex, resident_memory_mb
+
+WORDS = frozenset({"the", "element", "astronaut", "antidisestablishmentarianism", "naïve", "co-op",
+                   "xyzqq", "zzzzzzzzzzzzzz"})
+
+
+def test_frequency_index_matches_wordfreq():
+    index = FrequencyIndex(WORDS, 'en')
+    for word in WORDS | {"moon", "qwxzv", "well-known"}:
+        assert index.frequency(word) == word_frequency(word, 'en'), word
+
+
+def test_frequency_index_stores_only_known_words():
+    index = FrequencyIndex(WORDS, 'en')
+    assert "xyzqq" not in index.level_of and index.frequency("xyzqq") == 0.0
+    assert len(index.levels) <= len(index.level_of) == 6
+    # The index shares the word set it was given
+    assert index.words is WORDS
+
+
+@pytest.mark.parametrize("platform, max_rss", [("linux", 512 * 2 ** 10), ("darwin", 512 * 2 ** 20)])
+def test_resident_memory_falls_back_to_peak_in_platform_units(platform, max_rss):
+    with patch("lexicon.open", side_effect=OSError), patch("lexicon.sys.platform", platform), \
+            patch("lexicon.resource.getrusage", return_value=SimpleNamespace(ru_maxrss=max_rss)):
+        assert resident_memory_mb() == 512
@@ -0,0 +1,43 @@
+from memo import BoundedMemo
+
+
+def test_memo_computes_each_key_once():
+    memo = BoundedMemo(10)
+    calls = []
+
+    def compute(key):
+        calls.append(key)
+        return key.upper()
+
+    assert [memo.get(key, lambda: compute(key)) for key in ["a", "b", "a", "a"]] == ["A", "B", "A", "A"]
+    assert calls == ["a", "b"]
+    stats = memo.stats()
+    assert (stats.hits, stats.misses, stats.size) == (2, 2, 2)
+    assert stats.hit_rate == 0.5
+
+
+def test_memo_keeps_none():
+    memo = BoundedMemo(10)
+    memo.get("rejected", lambda: None)
+    assert memo.get("rejected", lambda: "computed again") is None
+
+
+def test_memo_evicts_least_recently_used():
+    memo = BoundedMemo(2)
+    memo.get("a", lambda: 1)
+    memo.get("b", lambda: 2)
+    memo.get("a", lambda: 1)
+    memo.get("c", lambda: 3)
+    assert len(memo) == 2
+    assert memo.get("a", lambda: "evicted") == 1
+    assert memo.get("b", lambda: "evicted") == "evicted"
+
+
+def test_stats_since():
+    memo = BoundedMemo(10)
+    memo.get("a", lambda: 1)
+    before = memo.stats()
+    memo.get("a", lambda: 1)
+    memo.get("b", lambda: 2)
+    job = memo.stats().since(before)
+    assert (job.hits, job.misses, job.size) == (1, 1, 2)
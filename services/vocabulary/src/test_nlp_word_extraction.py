@@ -1,8 +1,9 @@
 import pytest
 import nltk
 from vocabulary.nlp_word_extraction import (
-    expand_tokens, get_wordnet_pos, WordProcessor, Language, parse_paragraphs
+    expand_tokens, get_wordnet_pos, WordProcessor, Language, parse_paragraphs, letter_runs, letter_run_tokens
 )
+from lexicon import Lexicon, get_lexicon
 from unittest.mock import patch, MagicMock
 
 def test_expand_tokens():
@@ -10,6 +11,19 @@ def test_expand_tokens():
     assert expand_tokens(["hello", "world"]) == ["hello", "world"]
     assert expand_tokens(["co-op", "e-mail"]) == ["co", "op", "e", "mail"]
 
+def test_letter_runs():
+    text = "Well-known, naïve co-op."
+    runs = letter_runs(text)
+    assert [run.word for run in runs] == ["well", "known", "naïve", "co", "op"]
+    assert all(text[run.start:run.end].lower() == run.word for run in runs)
+    # The tagger gets the words as written, and the punctuation between them
+    assert letter_run_tokens("Poe wrote it.") == ["Poe", "wrote", "it", "."]
+    assert letter_run_tokens(text) == ["Well", "-", "known", ",", "naïve", "co", "-", "op", "."]
+
+def test_unknown_tokenizer(language):
+    with pytest.raises(ValueError):
+        WordProcessor([], language, tokenizer="whitespace")
+
 def test_get_wordnet_pos():
     assert get_wordnet_pos("JJ") == nltk.corpus.wordnet.ADJ
     assert get_wordnet_pos("VB") == nltk.corpus.wordnet.VERB
@@ -39,14 +53,21 @@ def word_processor(language):
     return WordProcessor(paragraphs, language)
 
 @patch("nlp_word_extraction.word_frequency", return_value=0.00001)
-def test_is_uncommon_word(_mock_word_frequency, word_processor):
+def test_is_uncommon_word(_mock_word_frequency, language):
+    # Without a frequency index, frequencies come from wordfreq as needed
+    word_processor = WordProcessor([], language, Lexicon(frozenset({"test"}), language.lemmatizer))
     assert word_processor.is_uncommon_word("test") is True
 
-@patch("nlp_word_extraction.words.words", return_value={"test", "sentence", "simple"})
-def test_is_valid_word(_mock_words, word_processor):
+def test_is_valid_word(language):
+    lexicon = Lexicon(frozenset({"test", "sentence", "simple"}), language.lemmatizer)
+    word_processor = WordProcessor([], language, lexicon)
     assert word_processor.is_valid_word("test") is True
     assert word_processor.is_valid_word("xyzabc") is False
 
+def test_word_processors_share_lexicon(language):
+    assert WordProcessor([], language).valid_words is WordProcessor([], language).valid_words
+    assert WordProcessor([], language).valid_words is get_lexicon().valid_words
+
 def test_lemmatize_word(word_processor):
     assert word_processor.lemmatize_word("running", "VB") == "run"  # Mocked
     assert word_processor.lemmatize_word("better", "JJ") == "better"  # Mocked generically
@@ -67,3 +88,42 @@ def test_parse_text():
     assert all(isinstance(entry, tuple) and len(entry) == 2 for entry in results)
     assert all("count" in entry[1] for entry in results)
     assert all("first_paragraph" in entry[1] for entry in results)  # Ensure first paragraph is recorded
+
+def test_batched_tagging_matches_sentence_by_sentence():
+    paragraphs = [
+        "The astronaut walked on the moon. Her expedition was perilous.",
+        "The scientist discovered a new element. The element was unstable and perilous.",
+    ]
+    language = Language("en", 0.00002)
+    batched = WordProcessor(paragraphs, language)
+    batched.parse_text()
+    one_by_one = WordProcessor(paragraphs, language)
+    for i, paragraph in enumerate(paragraphs):
+        for sentence in nltk.sent_tokenize(paragraph):
+            one_by_one.process_sentence(sentence, i)
+
+    def summary(processor):
+        return {word: (info.count, info.first_sentence, info.first_paragraph)
+                for word, info in processor.word_info.items()}
+    assert summary(batched) == summary(one_by_one)
+
+
+def test_token_decisions_are_memoized(language, mock_lemmatizer):
+    lexicon = Lexicon(frozenset({"run", "element"}), mock_lemmatizer)
+    word_processor = WordProcessor([], language, lexicon)
+    with patch.object(word_processor, "get_word_frequency", return_value=0.00001):
+        for _ in range(3):
+            assert word_processor.accept_token("Running", "VBG") == ("run", 0.00001)
+            assert word_processor.accept_token("xyzabc", "NN") is None
+            assert word_processor.accept_token("Paris", "NNP") is None
+    # Shared by the next processor of the same lexicon, as with the next job of a worker
+    assert WordProcessor([], language, lexicon).accept_token("Running", "VBG") == ("run", 0.00001)
+    assert mock_lemmatizer.lemmatize.call_count == 2
+    assert lexicon.token_memo.stats().hits == 7
+
+def test_letter_tokenizer_finds_the_same_words():
+    paragraphs = ["The astronaut walked on the moon. Her expedition was perilous and well-known."]
+    language = Language("en", 0.00002)
+    treebank = WordProcessor(paragraphs, language, tokenizer="treebank").parse_text()
+    letters = WordProcessor(paragraphs, language, tokenizer="letters").parse_text()
+    assert [(w.word, w.count) for w in letters] == [(w.word, w.count) for w in treebank]
@@ -0,0 +1,28 @@
+from paragraph_cap import cap_per_paragraph, word_score
+from testing_helpers import word
+
+
+def test_rarer_and_more_frequent_words_score_higher():
+    assert word_score(word("arcane", "", 0, frequency=1e-7)) > word_score(word("harbor", "", 0, frequency=1e-5))
+    assert word_score(word("harbor", "", 0, count=5, frequency=1e-5)) > word_score(
+        word("harbor", "", 0, count=1, frequency=1e-5))
+    # wordfreq gives 0 for words it does not know
+    assert word_score(word("zyzzyva", "", 0, frequency=0.0)) > 0
+
+
+def test_cap_keeps_best_words_of_each_paragraph():
+    words = [
+        word("harbor", "", 0, frequency=5e-5),
+        word("market", "", 0, count=9, frequency=5e-5),
+        word("arcane", "", 0, frequency=1e-7),
+        word("summit", "", 1, frequency=5e-5),
+    ]
+    kept, more = cap_per_paragraph(words, 2)
+    # In the order given, as sorted by the extraction
+    assert [w.word for w in kept] == ["market", "arcane", "summit"]
+    assert [w.word for w in more] == ["harbor"]
+
+
+def test_no_cap():
+    words = [word("harbor", "", 0), word("market", "", 0)]
+    assert cap_per_paragraph(words, None) == (words, [])
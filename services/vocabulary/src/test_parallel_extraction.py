@@ -0,0 +1,40 @@
+from nlp_word_extraction import parse_paragraphs
+from parallel_extraction import merge_words, parse_paragraphs_parallel, plan_shards
+from testing_helpers import word
+
+
+def test_plan_shards_covers_paragraphs_in_order():
+    paragraphs = ["a" * 100] * 7 + ["b" * 700]
+    shards = plan_shards(paragraphs, 4)
+    assert shards[0][0] == 0 and shards[-1][1] == len(paragraphs)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(shards, shards[1:]))
+    assert len(shards) <= 4
+    # The long paragraph is a shard of its own
+    assert shards[-1] == (7, 8)
+
+
+def test_plan_shards_with_fewer_paragraphs_than_shards():
+    assert plan_shards(["one", "two"], 8) == [(0, 1), (1, 2)]
+
+
+def test_merge_keeps_earliest_occurrence_and_sums_counts():
+    shards = [
+        [word("perilous", "A perilous climb.", 0, count=2), word("summit", "The summit.", 1)],
+        [word("abyss", "An abyss.", 2), word("perilous", "Perilous again.", 3, count=3)],
+    ]
+    merged = merge_words(shards)
+    assert list(merged) == ["perilous", "summit", "abyss"]
+    assert (merged["perilous"].count, merged["perilous"].first_sentence, merged["perilous"].first_paragraph) == (
+        5, "A perilous climb.", 0)
+
+
+def test_parallel_matches_serial():
+    paragraphs = [
+        "The astronaut walked on the moon. Her expedition was perilous.",
+        "The scientist discovered a new element. The element was unstable.",
+        "A perilous journey across the tundra followed the expedition.",
+    ] * 20
+
+    def summary(words):
+        return [(w.word, w.count, w.first_sentence, w.first_paragraph, w.language_frequency) for w in words]
+    assert summary(parse_paragraphs_parallel(paragraphs, workers=2)) == summary(parse_paragraphs(paragraphs))
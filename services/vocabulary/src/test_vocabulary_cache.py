@@ -0,0 +1,69 @@
+import pytest
+from unittest.mock import patch
+
+from nlp_word_extraction import parse_paragraphs
+from parallel_extraction import parse_paragraphs_cached
+from testing_helpers import word
+from vocabulary_cache import build_vocabulary_cache, cache_key, dump_words, load_words
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    return build_vocabulary_cache(str(tmp_path / "cache.sqlite3"))
+
+
+def test_cache_key_covers_extractor_config():
+    key = cache_key("A perilous climb.", "en", 0.0001, "treebank")
+    assert key == cache_key("A perilous climb.", "en", 0.0001, "treebank")
+    assert key != cache_key("A perilous  climb.", "en", 0.0001, "treebank")
+    assert key != cache_key("A perilous climb.", "en", 0.00002, "treebank")
+    assert key != cache_key("A perilous climb.", "en", 0.0001, "letters")
+
+
+def test_words_round_trip():
+    words = [word("perilous", "A naïve, perilous climb.", 0, count=2, frequency=3.02e-06), word("summit", "Up.", 0)]
+    loaded = load_words(dump_words(words), 7)
+    assert [(w.word, w.count, w.first_sentence, w.first_paragraph, w.language_frequency) for w in loaded] == [
+        ("perilous", 2, "A naïve, perilous climb.", 7, 3.02e-06), ("summit", 1, "Up.", 7, 1e-06)]
+
+
+def fake_parse(paragraphs, common_threshold, workers, tokenizer):
+    """Each distinct word of a paragraph, with the paragraph as its first sentence."""
+    parsed = []
+    for paragraph in paragraphs:
+        words = {}
+        for text in paragraph.split():
+            if text in words:
+                words[text].count += 1
+            else:
+                words[text] = word(text, paragraph, 0, frequency=len(text) * 1e-6)
+        parsed.append(list(words.values()))
+    return parsed
+
+
+def test_only_new_paragraphs_are_parsed(sqlite_cache):
+    with patch("parallel_extraction.parse_paragraph_words_parallel", side_effect=fake_parse) as parse:
+        first = parse_paragraphs_cached(["abyss summit", "summit ridge", "abyss"], sqlite_cache, 0.0001)
+        edited = parse_paragraphs_cached(["abyss summit", "glacier summit", "abyss", "abyss"], sqlite_cache, 0.0001)
+
+    assert [call.args[0] for call in parse.call_args_list] == [["abyss summit", "summit ridge", "abyss"],
+                                                                ["glacier summit"]]
+    assert [(w.word, w.count, w.first_paragraph) for w in first] == [
+        ("summit", 2, 0), ("abyss", 2, 0), ("ridge", 1, 1)]
+    assert [(w.word, w.count, w.first_sentence, w.first_paragraph) for w in edited] == [
+        ("glacier", 1, "glacier summit", 1), ("summit", 2, "abyss summit", 0), ("abyss", 3, "abyss summit", 0)]
+
+
+def test_cached_matches_serial(sqlite_cache):
+    paragraphs = [
+        "The astronaut walked on the moon. Her expedition was perilous.",
+        "The scientist discovered a new element. The element was unstable.",
+        "A perilous journey across the tundra followed the expedition.",
+    ]
+
+    def summary(words):
+        return [(w.word, w.count, w.first_sentence, w.first_paragraph, w.language_frequency) for w in words]
+    expected = summary(parse_paragraphs(paragraphs))
+    assert summary(parse_paragraphs_cached(paragraphs, sqlite_cache, 0.00002)) == expected
+    assert summary(parse_paragraphs_cached(paragraphs[::-1], sqlite_cache, 0.00002)) == summary(
+        parse_paragraphs(paragraphs[::-1]))
@@ -0,0 +1,8 @@
+"""Words built by hand, shared by the tests."""
+from nlp_word_extraction import WordFromText
+
+
+def word(text, first_sentence, first_paragraph, count=1, frequency=1e-6):
+    result = WordFromText(text, first_sentence, first_paragraph, frequency)
+    result.count = count
+    return result
@@ -0,0 +1,52 @@
+"""
+Paragraph-level vocabulary cache
+
+An edited document re-submitted mostly has the same paragraphs as before, and so do
+shared readings. The uncommon words of each paragraph are cached under a hash of the
+paragraph and of the extractor's configuration, so only new or changed paragraphs go
+through NLP; the words of the document are merged from those of its paragraphs.
+
+Two tiers are used: a local SQLite file, and a DynamoDB table shared by all workers
+(see common.tiered_cache). Both expire entries after a TTL.
+"""
+import hashlib
+import json
+from typing import List, Optional
+
+from common.tiered_cache import DEFAULT_TTL_SECONDS, KeyValueCache, build_tiered_cache
+from nlp_word_extraction import WordFromText
+
+# Bump whenever extraction changes (tokenizing, tagging, lemmatizing, the lexicon), so that
+# words cached by the old extractor are not used
+EXTRACTOR_VERSION = 1
+
+# Paragraphs' words, as dumped by dump_words, by cache_key
+VocabularyCache = KeyValueCache
+
+
+def cache_key(paragraph: str, lang: str, common_threshold: float, tokenizer: str) -> str:
+    # Not normalized: the first sentences of the words are quoted from the paragraph as it is
+    key_material = '\x1f'.join([paragraph, lang, repr(common_threshold), tokenizer, str(EXTRACTOR_VERSION)])
+    return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+
+
+def dump_words(words: List[WordFromText]) -> str:
+    """The words of one paragraph, in order, as cached. Their paragraph is where they are used."""
+    return json.dumps([[w.word, w.count, w.first_sentence, w.language_frequency] for w in words],
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+def load_words(cached: str, paragraph_index: int) -> List[WordFromText]:
+    words = []
+    for word, count, first_sentence, language_frequency in json.loads(cached):
+        word_from_text = WordFromText(word, first_sentence, paragraph_index, language_frequency)
+        word_from_text.count = count
+        words.append(word_from_text)
+    return words
+
+
+def build_vocabulary_cache(sqlite_path: Optional[str], dynamodb_table=None,
+                           ttl_seconds: int = DEFAULT_TTL_SECONDS) -> Optional[VocabularyCache]:
+    """Build a tiered cache from whichever tiers are configured; None if there are none."""
+    return build_tiered_cache('Vocabulary cache', 'words', sqlite_path, 'paragraph_words', dynamodb_table,
+                              ttl_seconds)